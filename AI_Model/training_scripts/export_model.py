@@ -0,0 +1,305 @@
+"""
+Export and Benchmark Script
+Export trained YOLOv8 weights to ONNX / OpenVINO IR for fast CPU inference,
+and compare latency + mAP of each backend against PyTorch on the test split
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+import yaml
+
+# Reuse the streaming server's backends so the benchmark measures what it runs
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+from inference_backends import CLASS_NAMES, create_inference_backend  # noqa: E402
+
+DEFAULT_WEIGHTS = PROJECT_ROOT / "AI_Model" / "weights" / "best.pt"
+DEFAULT_DATA = PROJECT_ROOT / "Dataset" / "dataset.yaml"
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp"}
+
+
+def export_model(model_path, formats=('onnx',), img_size=640, dynamic=True):
+    """
+    Export trained weights for CPU inference backends
+
+    Args:
+        model_path: Path to trained .pt model
+        formats: Export formats ('onnx', 'openvino')
+        img_size: Export image size
+        dynamic: Dynamic batch/image size (needed for batched predict and imgsz changes)
+
+    Returns:
+        Dict of format -> exported artifact path
+    """
+    from ultralytics import YOLO
+
+    print("="*50)
+    print("Exporting model for CPU inference")
+    print("="*50)
+
+    model = YOLO(str(model_path))
+    exported = {}
+
+    for fmt in formats:
+        print(f"Exporting {fmt}...")
+        if fmt == 'onnx':
+            path = model.export(format='onnx', imgsz=img_size, dynamic=dynamic, simplify=True)
+        else:
+            path = model.export(format=fmt, imgsz=img_size, dynamic=dynamic)
+        exported[fmt] = Path(path)
+        print(f"{fmt} model saved to: {path}")
+
+    print("="*50)
+    return exported
+
+
+def load_test_split(data_yaml, split='test'):
+    """Return (image_path, label_path) pairs for a dataset split"""
+    with open(data_yaml) as f:
+        data_config = yaml.safe_load(f)
+
+    dataset_root = Path(data_config.get('path', Path(data_yaml).parent))
+    if not dataset_root.is_absolute():
+        dataset_root = Path(data_yaml).parent / dataset_root
+    image_dir = dataset_root / data_config[split]
+    label_dir = Path(str(image_dir).replace('images', 'labels'))
+
+    images = sorted(p for p in image_dir.iterdir() if p.suffix.lower() in IMAGE_SUFFIXES)
+    return [(img, label_dir / f"{img.stem}.txt") for img in images]
+
+
+def load_labels(label_path, width, height):
+    """Read YOLO-format labels as (class_id, [x1, y1, x2, y2]) in pixels"""
+    labels = []
+    if not label_path.exists():
+        return labels
+
+    for line in label_path.read_text().splitlines():
+        parts = line.split()
+        if len(parts) < 5:
+            continue
+        cls, cx, cy, w, h = int(parts[0]), *map(float, parts[1:5])
+        labels.append((cls, [
+            (cx - w / 2) * width, (cy - h / 2) * height,
+            (cx + w / 2) * width, (cy + h / 2) * height
+        ]))
+    return labels
+
+
+def box_iou(boxes_a, boxes_b):
+    """IoU matrix between two (N, 4) / (M, 4) xyxy arrays"""
+    boxes_a = np.asarray(boxes_a, dtype=np.float32).reshape(-1, 4)
+    boxes_b = np.asarray(boxes_b, dtype=np.float32).reshape(-1, 4)
+    top_left = np.maximum(boxes_a[:, None, :2], boxes_b[None, :, :2])
+    bottom_right = np.minimum(boxes_a[:, None, 2:], boxes_b[None, :, 2:])
+    intersection = np.clip(bottom_right - top_left, 0, None).prod(axis=2)
+    area_a = (boxes_a[:, 2:] - boxes_a[:, :2]).prod(axis=1)
+    area_b = (boxes_b[:, 2:] - boxes_b[:, :2]).prod(axis=1)
+    return intersection / (area_a[:, None] + area_b[None, :] - intersection + 1e-9)
+
+
+def average_precision(recall, precision):
+    """101-point interpolated AP (same method as Ultralytics val)"""
+    recall = np.concatenate(([0.0], recall, [1.0]))
+    precision = np.concatenate(([1.0], precision, [0.0]))
+    precision = np.flip(np.maximum.accumulate(np.flip(precision)))
+    points = np.linspace(0, 1, 101)
+    curve = np.interp(points, recall, precision)
+    return float(((curve[1:] + curve[:-1]) / 2 * np.diff(points)).sum())
+
+
+def evaluate_backend(backend, samples, img_size=640, conf=0.001, iou=0.7, warmup=3):
+    """
+    Measure latency and mAP of one backend on the given test samples
+
+    Returns:
+        Dict with latency stats (ms) and mAP50 / mAP50-95
+    """
+    iou_thresholds = np.linspace(0.5, 0.95, 10)
+    class_ids = {name: cls for cls, name in CLASS_NAMES.items()}
+    records = []  # (class_id, confidence, tp[10]) per prediction
+    gt_counts = {cls: 0 for cls in CLASS_NAMES}
+    latencies = []
+
+    for index, (image_path, label_path) in enumerate(samples):
+        frame = cv2.imread(str(image_path))
+        if frame is None:
+            continue
+        height, width = frame.shape[:2]
+
+        start = time.perf_counter()
+        detections = backend.predict([frame], conf=conf, iou=iou, imgsz=img_size)[0]
+        elapsed = time.perf_counter() - start
+        if index >= warmup:
+            latencies.append(elapsed * 1000.0)
+
+        labels = load_labels(label_path, width, height)
+        for cls, _ in labels:
+            gt_counts[cls] = gt_counts.get(cls, 0) + 1
+
+        # Greedy matching per class, highest confidence first
+        for cls in gt_counts:
+            preds = sorted(
+                (d for d in detections if class_ids.get(d["class"]) == cls),
+                key=lambda d: d["confidence"], reverse=True
+            )
+            gts = [box for label_cls, box in labels if label_cls == cls]
+            if not preds:
+                continue
+
+            ious = box_iou([d["bbox"] for d in preds], gts) if gts else np.zeros((len(preds), 0))
+            tp = np.zeros((len(preds), len(iou_thresholds)), dtype=bool)
+            for t, threshold in enumerate(iou_thresholds):
+                matched = set()
+                for p in range(len(preds)):
+                    if not gts:
+                        break
+                    candidates = [(ious[p, g], g) for g in range(len(gts)) if g not in matched and ious[p, g] >= threshold]
+                    if candidates:
+                        matched.add(max(candidates)[1])
+                        tp[p, t] = True
+
+            for p, det in enumerate(preds):
+                records.append((cls, det["confidence"], tp[p]))
+
+    # AP per class and IoU threshold
+    ap = np.zeros((len(gt_counts), len(iou_thresholds)))
+    for row, cls in enumerate(gt_counts):
+        class_records = sorted((r for r in records if r[0] == cls), key=lambda r: r[1], reverse=True)
+        if not class_records or gt_counts[cls] == 0:
+            continue
+        tp = np.array([r[2] for r in class_records], dtype=float)
+        tp_cumsum = tp.cumsum(axis=0)
+        fp_cumsum = (1 - tp).cumsum(axis=0)
+        recall = tp_cumsum / gt_counts[cls]
+        precision = tp_cumsum / (tp_cumsum + fp_cumsum)
+        for t in range(len(iou_thresholds)):
+            ap[row, t] = average_precision(recall[:, t], precision[:, t])
+
+    latencies = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        "images": len(samples),
+        "mean_ms": float(latencies.mean()),
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p95_ms": float(np.percentile(latencies, 95)),
+        "fps": float(1000.0 / latencies.mean()) if latencies.mean() > 0 else 0.0,
+        "map50": float(ap[:, 0].mean()),
+        "map50_95": float(ap.mean()),
+        "per_class_map50": {CLASS_NAMES.get(cls, str(cls)): float(ap[row, 0]) for row, cls in enumerate(gt_counts)}
+    }
+
+
+def benchmark_backends(artifacts, data_yaml, img_size=640, threads=4, split='test',
+                       max_images=None, report_path=None):
+    """
+    Compare exported backends against PyTorch on the dataset test split
+
+    Args:
+        artifacts: Dict of backend name -> model path (e.g. {'pytorch': best.pt, 'onnx': best.onnx})
+        data_yaml: Dataset YAML (uses its test split)
+        img_size: Inference image size
+        threads: CPU threads per backend
+        split: Dataset split to evaluate
+        max_images: Limit number of images (None = all)
+        report_path: Where to write the Markdown report
+    """
+    print("="*50)
+    print("Benchmarking inference backends")
+    print("="*50)
+
+    samples = load_test_split(data_yaml, split)
+    if max_images:
+        samples = samples[:max_images]
+    print(f"Evaluating on {len(samples)} {split} images, imgsz={img_size}, threads={threads}")
+
+    results = {}
+    for name, path in artifacts.items():
+        print(f"\n▶ {name}: {path}")
+        backend = create_inference_backend(name, path, threads)
+        results[name] = evaluate_backend(backend, samples, img_size)
+        r = results[name]
+        print(f"  latency {r['mean_ms']:.1f} ms (p95 {r['p95_ms']:.1f}), "
+              f"mAP50 {r['map50']:.3f}, mAP50-95 {r['map50_95']:.3f}")
+
+    baseline = results.get('pytorch')
+    lines = [
+        "# Inference Backend Comparison",
+        "",
+        f"- Dataset: `{data_yaml}` ({split} split, {len(samples)} images)",
+        f"- Image size: {img_size}, CPU threads: {threads}, batch size: 1",
+        "",
+        "| Backend | Model | Mean (ms) | P95 (ms) | FPS | Speedup | mAP50 | mAP50-95 | ΔmAP50 |",
+        "|---------|-------|-----------|----------|-----|---------|-------|----------|--------|"
+    ]
+    for name, r in results.items():
+        speedup = baseline["mean_ms"] / r["mean_ms"] if baseline and r["mean_ms"] > 0 else 1.0
+        delta = r["map50"] - baseline["map50"] if baseline else 0.0
+        lines.append(
+            f"| {name} | `{Path(artifacts[name]).name}` | {r['mean_ms']:.1f} | {r['p95_ms']:.1f} | "
+            f"{r['fps']:.1f} | {speedup:.2f}x | {r['map50']:.3f} | {r['map50_95']:.3f} | {delta:+.3f} |"
+        )
+    report = "\n".join(lines) + "\n"
+
+    print("\n" + report)
+    if report_path:
+        Path(report_path).parent.mkdir(parents=True, exist_ok=True)
+        Path(report_path).write_text(report)
+        print(f"Report saved to: {report_path}")
+    print("="*50)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export model for CPU inference and benchmark backends')
+    parser.add_argument('--weights', type=str, default=str(DEFAULT_WEIGHTS),
+                       help='Path to trained best.pt')
+    parser.add_argument('--formats', nargs='+', default=['onnx'], choices=['onnx', 'openvino'],
+                       help='Export formats (default: onnx)')
+    parser.add_argument('--img-size', type=int, default=640,
+                       help='Image size')
+    parser.add_argument('--static', action='store_true',
+                       help='Export with static input shape (disables batching / imgsz changes)')
+    parser.add_argument('--skip-export', action='store_true',
+                       help='Benchmark existing artifacts without re-exporting')
+    parser.add_argument('--benchmark', action='store_true',
+                       help='Compare latency and mAP against PyTorch on the test split')
+    parser.add_argument('--data', type=str, default=str(DEFAULT_DATA),
+                       help='Dataset YAML for --benchmark')
+    parser.add_argument('--threads', type=int, default=4,
+                       help='CPU threads per backend for --benchmark')
+    parser.add_argument('--max-images', type=int, default=None,
+                       help='Limit number of test images for --benchmark')
+    parser.add_argument('--report', type=str, default=None,
+                       help='Markdown report path (default: next to weights)')
+
+    args = parser.parse_args()
+    weights = Path(args.weights)
+
+    if not weights.exists():
+        print(f"Model not found at {weights}")
+        return
+
+    # Artifact paths follow Ultralytics naming (best.onnx, best_openvino_model/)
+    artifacts = {
+        'onnx': weights.with_suffix('.onnx'),
+        'openvino': weights.parent / f"{weights.stem}_openvino_model"
+    }
+    if not args.skip_export:
+        artifacts.update(export_model(weights, args.formats, args.img_size, dynamic=not args.static))
+
+    if args.benchmark:
+        to_compare = {'pytorch': weights}
+        to_compare.update({fmt: artifacts[fmt] for fmt in args.formats})
+        report_path = args.report or weights.parent / 'backend_comparison.md'
+        benchmark_backends(to_compare, args.data, args.img_size, args.threads,
+                           max_images=args.max_images, report_path=report_path)
+
+
+if __name__ == '__main__':
+    main()
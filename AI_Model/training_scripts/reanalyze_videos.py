@@ -0,0 +1,360 @@
+"""
+Offline Re-analysis of Recorded Videos
+Re-run the detector over every clip in recorded_videos/ (or any directory)
+after a model update, in parallel:
+- One model instance per worker process (ProcessPoolExecutor)
+- Frame striding: only every Nth frame is decoded to pixels and analysed
+  (skipped frames are grab()bed, never retrieved or inferred)
+- Batched predict per worker
+Writes per-clip interaction timelines and peak-confidence frames, plus a
+highlights index of the strongest cat+human interactions across all clips.
+"""
+
+import argparse
+import heapq
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import cv2
+
+# Reuse the streaming server's backends so results match what runs live
+PROJECT_ROOT = Path(__file__).resolve().parent.parent.parent
+sys.path.insert(0, str(PROJECT_ROOT / "backend"))
+from inference_backends import create_inference_backend  # noqa: E402
+
+DEFAULT_WEIGHTS = PROJECT_ROOT / "AI_Model" / "weights" / "best.pt"
+DEFAULT_VIDEOS = PROJECT_ROOT / "recorded_videos"
+DEFAULT_OUTPUT = PROJECT_ROOT / "reanalysis"  # Not inside the videos dir the server catalogs and prunes
+VIDEO_SUFFIXES = {".mp4", ".avi", ".mov", ".mkv"}
+CLASS_COLORS = {"human": (255, 128, 0), "cat": (0, 200, 255)}
+
+# Set in each worker process by init_worker
+worker_backend = None
+worker_settings = None
+
+
+def init_worker(backend_name, weights, threads, settings):
+    """Load the model once per worker process"""
+    global worker_backend, worker_settings
+    cv2.setNumThreads(1)  # Parallelism comes from the process pool
+    worker_backend = create_inference_backend(backend_name, weights, threads)
+    worker_settings = settings
+
+
+def frame_score(detections):
+    """(interaction, score): interaction frames score min(best human, best cat) confidence"""
+    best = {"human": 0.0, "cat": 0.0}
+    for det in detections:
+        best[det["class"]] = max(best.get(det["class"], 0.0), det["confidence"])
+    interaction = best["human"] > 0 and best["cat"] > 0
+    return interaction, min(best["human"], best["cat"]) if interaction else 0.0
+
+
+def merge_intervals(samples, max_gap):
+    """
+    Group analysed frames with both classes into interaction intervals
+
+    Args:
+        samples: [(time_s, interaction, score)] in time order
+        max_gap: Interaction frames closer than this (seconds) join one interval
+
+    Returns:
+        [{"start", "end", "frames", "peak_confidence", "peak_time"}]
+    """
+    intervals = []
+    current = None
+    for t, interaction, score in samples:
+        if not interaction:
+            continue
+        if current is not None and t - current["end"] <= max_gap:
+            current["end"] = t
+            current["frames"] += 1
+            if score > current["peak_confidence"]:
+                current["peak_confidence"], current["peak_time"] = score, t
+        else:
+            current = {"start": t, "end": t, "frames": 1, "peak_confidence": score, "peak_time": t}
+            intervals.append(current)
+    for interval in intervals:
+        interval["duration"] = round(interval["end"] - interval["start"], 2)
+        interval["peak_confidence"] = round(interval["peak_confidence"], 3)
+    return intervals
+
+
+def draw_boxes(frame, detections):
+    """Copy of the frame with detection boxes"""
+    image = frame.copy()
+    for det in detections:
+        x1, y1, x2, y2 = (int(v) for v in det["bbox"])
+        color = CLASS_COLORS.get(det["class"], (0, 255, 0))
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, 2)
+        cv2.putText(image, f"{det['class']} {det['confidence']:.2f}", (x1, max(y1 - 5, 12)),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1, cv2.LINE_AA)
+    return image
+
+
+def analyze_clip(video_path):
+    """
+    Run the worker's model over one clip (called in a worker process)
+
+    Returns:
+        Per-clip result dict (timeline, interactions, peak frames)
+    """
+    settings = worker_settings
+    stride = settings["stride"]
+    start = time.time()
+
+    capture = cv2.VideoCapture(str(video_path))
+    if not capture.isOpened():
+        return {"video": Path(video_path).name, "error": "Could not open video"}
+    fps = capture.get(cv2.CAP_PROP_FPS) or 0.0
+    frames_total = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+
+    samples = []  # (time_s, interaction, score)
+    timeline = []
+    peaks = []  # Min-heap of (score, index, time_s, frame, detections) - top_k only
+    batch = []  # (index, time_s, frame)
+    index = 0
+
+    def run_batch():
+        results = worker_backend.predict(
+            [frame for _, _, frame in batch],
+            conf=settings["conf"], iou=0.45, imgsz=settings["imgsz"]
+        )
+        for (frame_index, t, frame), detections in zip(batch, results):
+            interaction, score = frame_score(detections)
+            samples.append((t, interaction, score))
+            timeline.append({
+                "t": round(t, 3),
+                "humans": sum(1 for d in detections if d["class"] == "human"),
+                "cats": sum(1 for d in detections if d["class"] == "cat"),
+                "score": round(score, 3)
+            })
+            if interaction:
+                entry = (score, frame_index, t, frame, detections)
+                if len(peaks) < settings["top_k"]:
+                    heapq.heappush(peaks, entry)
+                elif score > peaks[0][0]:
+                    heapq.heapreplace(peaks, entry)
+        batch.clear()
+
+    while capture.grab():
+        if index % stride == 0:
+            # Container timestamp (correct for variable frame rate clips)
+            t = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if t <= 0 and index > 0 and fps > 0:
+                t = index / fps
+            ok, frame = capture.retrieve()
+            if ok:
+                batch.append((index, t, frame))
+                if len(batch) >= settings["batch_size"]:
+                    run_batch()
+        index += 1
+    if batch:
+        run_batch()
+    capture.release()
+
+    duration = samples[-1][0] if samples else 0.0
+    sample_interval = (duration / max(len(samples) - 1, 1)) if samples else 0.0
+    interactions = merge_intervals(samples, max(settings["max_gap"], sample_interval * 1.5))
+
+    peak_frames = []
+    for score, frame_index, t, frame, detections in sorted(peaks, key=lambda p: p[0], reverse=True):
+        peak = {"frame": frame_index, "t": round(t, 3), "score": round(score, 3), "detections": detections}
+        if settings["peaks_dir"]:
+            image_path = Path(settings["peaks_dir"]) / f"{Path(video_path).stem}_{frame_index:06d}.jpg"
+            cv2.imwrite(str(image_path), draw_boxes(frame, detections), [cv2.IMWRITE_JPEG_QUALITY, 85])
+            peak["image"] = image_path.name
+        peak_frames.append(peak)
+
+    return {
+        "video": Path(video_path).name,
+        "video_mtime": Path(video_path).stat().st_mtime,
+        "frames_total": frames_total or index,
+        "frames_analyzed": len(samples),
+        "stride": stride,
+        "fps": round(fps, 3),
+        "duration": round(duration, 2),
+        "interaction_seconds": round(sum(i["duration"] for i in interactions), 2),
+        "interactions": interactions,
+        "peaks": peak_frames,
+        "timeline": timeline,
+        "analysis_seconds": round(time.time() - start, 2)
+    }
+
+
+def find_videos(videos_dir):
+    """Video files in a directory, largest first (keeps the pool busy until the end)"""
+    videos = [p for p in Path(videos_dir).iterdir() if p.is_file() and p.suffix.lower() in VIDEO_SUFFIXES]
+    return sorted(videos, key=lambda p: p.stat().st_size, reverse=True)
+
+
+def build_highlights(results, model_info):
+    """All interactions across clips, strongest first"""
+    highlights = []
+    for result in results:
+        peak_images = {p["t"]: p.get("image") for p in result.get("peaks", [])}
+        for interval in result.get("interactions", []):
+            highlights.append({
+                "video": result["video"],
+                "start": interval["start"],
+                "end": interval["end"],
+                "duration": interval["duration"],
+                "peak_confidence": interval["peak_confidence"],
+                "peak_time": interval["peak_time"],
+                "peak_image": peak_images.get(round(interval["peak_time"], 3))
+            })
+    highlights.sort(key=lambda h: (h["peak_confidence"], h["duration"]), reverse=True)
+    return {"model": model_info, "generated": time.time(), "clips": len(results), "highlights": highlights}
+
+
+def reanalyze_videos(videos_dir, weights, output_dir, backend='pytorch', workers=None, threads=1,
+                     stride=5, batch_size=8, imgsz=640, conf=0.25, max_gap=2.0, top_k=3,
+                     save_peaks=True, force=False):
+    """
+    Re-score every clip in a directory with the current model
+
+    Args:
+        videos_dir: Directory with recorded clips
+        weights: Model path for the chosen backend (.pt, .onnx, OpenVINO dir)
+        output_dir: Where per-clip JSON, peak frames and highlights.json go
+        backend: 'pytorch', 'onnx' or 'openvino'
+        workers: Worker processes (default: CPU cores / threads)
+        threads: Inference threads per worker
+        stride: Analyse every Nth frame
+        batch_size: Frames per predict call
+        max_gap: Seconds without an interaction frame that still join one interval
+        top_k: Peak frames kept per clip
+        force: Re-analyse clips whose results already match this model
+
+    Returns:
+        Highlights index dict
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    peaks_dir = output_dir / "peaks" if save_peaks else None
+    if peaks_dir:
+        peaks_dir.mkdir(exist_ok=True)
+    workers = workers or max(1, (os.cpu_count() or 1) // max(threads, 1))
+    weights = Path(weights)
+    model_info = {
+        "backend": backend,
+        "weights": str(weights),
+        "weights_mtime": weights.stat().st_mtime if weights.exists() else None,
+        "stride": stride,
+        "imgsz": imgsz,
+        "conf": conf
+    }
+
+    print("="*50)
+    print("Re-analysing recorded videos")
+    print("="*50)
+
+    videos = find_videos(videos_dir)
+    results = []
+    pending = []
+    for video in videos:
+        result_path = output_dir / f"{video.stem}.json"
+        if not force and result_path.exists():
+            previous = json.loads(result_path.read_text())
+            # Same model and settings, same file: keep the earlier result
+            if previous.get("model") == model_info and previous.get("video_mtime") == video.stat().st_mtime:
+                results.append(previous)
+                continue
+        pending.append(video)
+
+    print(f"{len(videos)} clips in {videos_dir}: {len(pending)} to analyse, {len(results)} up to date")
+    print(f"{workers} workers x {threads} threads, {backend}, stride {stride}, batch {batch_size}, imgsz {imgsz}")
+
+    settings = {
+        "stride": max(1, stride), "batch_size": max(1, batch_size), "imgsz": imgsz, "conf": conf,
+        "max_gap": max_gap, "top_k": top_k, "peaks_dir": str(peaks_dir) if peaks_dir else None
+    }
+    start = time.time()
+    frames_analyzed = 0
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(backend, str(weights), threads, settings)) as pool:
+            futures = {pool.submit(analyze_clip, str(video)): video for video in pending}
+            for done, future in enumerate(as_completed(futures), 1):
+                video = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"[{done}/{len(pending)}] {video.name}: failed ({e})")
+                    continue
+                if "error" in result:
+                    print(f"[{done}/{len(pending)}] {video.name}: {result['error']}")
+                    continue
+                result["model"] = model_info
+                (output_dir / f"{video.stem}.json").write_text(json.dumps(result))
+                results.append(result)
+                frames_analyzed += result["frames_analyzed"]
+                print(f"[{done}/{len(pending)}] {video.name}: {len(result['interactions'])} interactions, "
+                      f"{result['interaction_seconds']}s, {result['frames_analyzed']} frames "
+                      f"in {result['analysis_seconds']}s")
+
+    elapsed = time.time() - start
+    highlights = build_highlights(results, model_info)
+    (output_dir / "highlights.json").write_text(json.dumps(highlights, indent=2))
+
+    print("="*50)
+    print(f"Analysed {len(pending)} clips ({frames_analyzed} frames) in {elapsed:.1f}s "
+          f"({frames_analyzed / elapsed if elapsed > 0 else 0:.1f} frames/s)")
+    print(f"{len(highlights['highlights'])} interactions indexed in {output_dir / 'highlights.json'}")
+    for h in highlights["highlights"][:5]:
+        print(f"  {h['video']} {h['start']:.1f}-{h['end']:.1f}s  peak {h['peak_confidence']:.2f}")
+    print("="*50)
+    return highlights
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Re-run the detector over recorded videos in parallel')
+    parser.add_argument('--videos', type=str, default=str(DEFAULT_VIDEOS),
+                       help='Directory with recorded clips')
+    parser.add_argument('--weights', type=str, default=str(DEFAULT_WEIGHTS),
+                       help='Model for the backend (.pt, .onnx or OpenVINO model dir)')
+    parser.add_argument('--backend', type=str, default='pytorch', choices=['pytorch', 'onnx', 'openvino'],
+                       help='Inference backend (default: pytorch)')
+    parser.add_argument('--output', type=str, default=str(DEFAULT_OUTPUT),
+                       help='Output directory, outside the videos directory (default: <project>/reanalysis)')
+    parser.add_argument('--workers', type=int, default=None,
+                       help='Worker processes (default: CPU cores / threads)')
+    parser.add_argument('--threads', type=int, default=1,
+                       help='Inference threads per worker (default: 1)')
+    parser.add_argument('--stride', type=int, default=5,
+                       help='Analyse every Nth frame (default: 5)')
+    parser.add_argument('--batch-size', type=int, default=8,
+                       help='Frames per predict call (default: 8)')
+    parser.add_argument('--img-size', type=int, default=640,
+                       help='Inference image size')
+    parser.add_argument('--conf', type=float, default=0.25,
+                       help='Confidence threshold (default: 0.25)')
+    parser.add_argument('--max-gap', type=float, default=2.0,
+                       help='Seconds between interaction frames that still count as one interaction')
+    parser.add_argument('--top-k', type=int, default=3,
+                       help='Peak-confidence frames kept per clip')
+    parser.add_argument('--no-peak-images', action='store_true',
+                       help='Do not write JPEGs of the peak frames')
+    parser.add_argument('--force', action='store_true',
+                       help='Re-analyse clips even if their results match the current model')
+
+    args = parser.parse_args()
+    videos_dir = Path(args.videos)
+    if not videos_dir.is_dir():
+        print(f"Videos directory not found: {videos_dir}")
+        return
+
+    reanalyze_videos(
+        videos_dir, args.weights, args.output,
+        backend=args.backend, workers=args.workers, threads=args.threads,
+        stride=args.stride, batch_size=args.batch_size, imgsz=args.img_size, conf=args.conf,
+        max_gap=args.max_gap, top_k=args.top_k, save_peaks=not args.no_peak_images, force=args.force
+    )
+
+
+if __name__ == '__main__':
+    main()
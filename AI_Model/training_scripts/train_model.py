@@ -215,6 +215,8 @@ def main():
                        help='Experiment name')
     parser.add_argument('--optimize', action='store_true',
                        help='Optimize model for Jetson Nano after training')
+    parser.add_argument('--export', nargs='+', choices=['onnx', 'openvino'], default=None,
+                       help='Export for CPU inference after training (see export_model.py)')
     
     args = parser.parse_args()
     
@@ -257,6 +259,13 @@ def main():
         model_path = Path(args.project) / args.name / 'weights' / 'best.pt'
         if model_path.exists():
             optimize_for_jetson(str(model_path))
+    
+    # Export for CPU inference backends (FP16 .half() does not speed up CPU inference)
+    if args.export:
+        model_path = Path(args.project) / args.name / 'weights' / 'best.pt'
+        if model_path.exists():
+            from export_model import export_model
+            export_model(model_path, args.export, args.img_size)
 
 
 if __name__ == '__main__':
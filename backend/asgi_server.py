@@ -0,0 +1,170 @@
+"""
+ASGI Serving Mode for the Streaming Backend (SERVER_MODE = "asgi")
+- Native async routes for long-lived and high-rate endpoints:
+  /esp32/frame, /stream/frame (long-poll), /stream/mjpeg, /events,
+  GET /videos/<name> (Range requests via FileResponse)
+- Every other route (/esp32/distance, /stream/live, /videos*, /config, ...)
+  is served by the existing Flask app through a WSGI bridge
+
+Camera, decode and inference threads are unchanged; they wake async
+subscribers through loop.call_soon_threadsafe (Subscription.notify), so each
+stream viewer is a coroutine instead of a dedicated OS thread.
+
+Requires: pip install "starlette>=0.39" uvicorn a2wsgi
+(FileResponse answers Range requests from starlette 0.39 on)
+"""
+
+import asyncio
+import starlette
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.http import parse_etags
+from a2wsgi import WSGIMiddleware
+
+
+STARLETTE_RANGE_VERSION = (0, 39)  # First release whose FileResponse returns 206 for Range
+
+
+def create_asgi_app(server):
+    """Build the ASGI app around the streaming server module (its globals hold all state)"""
+    if tuple(int(part) for part in starlette.__version__.split(".")[:2]) < STARLETTE_RANGE_VERSION:
+        print(f"⚠️  starlette {starlette.__version__} ignores Range requests - /videos/<name> returns "
+              f"whole files (iOS seeking needs starlette>=0.39)")
+    cors_headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Expose-Headers": ", ".join(server.CORS_EXPOSE_HEADERS)
+    }
+
+    def client_address(request):
+        return request.client.host if request.client else None
+
+    async def receive_esp32_frame(request):
+        """Receive camera frame from ESP32-S3 (decode happens on the decode pool)"""
+        jpeg_data = await request.body()
+        device_id = request.headers.get('x-device') or client_address(request) or server.DEFAULT_DEVICE_ID
+        body, status = server.ingest_frame(device_id, jpeg_data)
+        return JSONResponse(body, status_code=status)
+
+    async def stream_frame(request):
+        """Latest annotated frame as raw JPEG (see streaming_backend_server.stream_frame)"""
+        device_id = request.query_params.get('device')
+        variant = server.parse_stream_variant(
+            request.query_params.get('profile'), request.query_params.get('quality')
+        )
+        wait = server.parse_long_poll_wait(request.query_params.get('wait'))
+        if_none_match = parse_etags(request.headers.get('if-none-match'))
+
+        error = server.ambiguous_device_error(device_id)
+        if error:
+            return JSONResponse(error[0], status_code=error[1], headers=cors_headers)
+        state = server.resolve_device_state(device_id)
+        if state is None or state["latest_result"] is None:
+            return JSONResponse({"error": "No frame available"}, status_code=404, headers=cors_headers)
+
+        if wait > 0 and if_none_match.contains(server.frame_etag(state, state["frame_seq"], variant)):
+            subscription = server.frame_bus.subscribe(
+                state["device_id"], client_address(request), loop=asyncio.get_running_loop()
+            )
+            try:
+                # Re-check after subscribing so a frame published in between is not missed
+                if if_none_match.contains(server.frame_etag(state, state["frame_seq"], variant)):
+                    state = await subscription.wait_async(wait) or state
+            finally:
+                server.frame_bus.unsubscribe(subscription)
+
+        # JPEG encode (once per frame, shared cache) runs off the event loop
+        status, body, headers = await asyncio.to_thread(
+            server.build_frame_response, state, variant, if_none_match
+        )
+        headers.update(cors_headers)
+        if status == 304:
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type='image/jpeg', headers=headers)
+
+    async def get_video(request):
+        """Recorded clip with Range (206) support, streamed from disk without a worker thread"""
+        filename = request.path_params['filename']
+        video_path = server.clip_path(filename)
+        if video_path is None or not video_path.is_file():
+            return JSONResponse({"error": "Video not found"}, status_code=404, headers=cors_headers)
+        return FileResponse(
+            video_path,
+            media_type=server.VIDEO_MIMETYPES.get(video_path.suffix, 'application/octet-stream'),
+            headers=cors_headers
+        )
+
+    async def stream_mjpeg(request):
+        """MJPEG video stream, one coroutine per viewer"""
+        device_id = request.query_params.get('device')
+        profile = request.query_params.get('profile')
+        quality = request.query_params.get('quality')
+        error = server.ambiguous_device_error(device_id)
+        if error:
+            return JSONResponse(error[0], status_code=error[1], headers=cors_headers)
+        # Follow the camera resolved now, even if more cameras register later
+        state = server.resolve_device_state(device_id)
+        subscription = server.frame_bus.subscribe(
+            state["device_id"] if state else device_id, client_address(request), loop=asyncio.get_running_loop()
+        )
+
+        async def generate():
+            nonlocal state
+            try:
+                # Send the current frame straight away, then one part per published frame
+                while True:
+                    part = await asyncio.to_thread(server.mjpeg_part, state, profile, quality)
+                    if part is not None:
+                        yield part
+
+                    # Sleep until the bus publishes a new frame for this camera
+                    state = None
+                    while state is None:
+                        state = await subscription.wait_async(5.0)
+            finally:
+                server.frame_bus.unsubscribe(subscription)
+
+        return StreamingResponse(
+            generate(), media_type='multipart/x-mixed-replace; boundary=frame', headers=cors_headers
+        )
+
+    async def stream_events(request):
+        """Server-Sent Events stream of state changes (see streaming_backend_server.stream_events)"""
+        device_id = request.query_params.get('device')
+        types, error = server.parse_event_types(request.query_params.get('types'))
+        if error:
+            return JSONResponse({"error": error}, status_code=400, headers=cors_headers)
+
+        subscription = server.event_bus.subscribe(
+            device_id, types, client_address(request), loop=asyncio.get_running_loop()
+        )
+
+        async def generate():
+            try:
+                yield server.SSE_RETRY
+                while True:
+                    messages = await subscription.wait_async(server.EVENT_HEARTBEAT_SECONDS)
+                    yield b"".join(messages) if messages else server.SSE_KEEP_ALIVE
+            finally:
+                server.event_bus.unsubscribe(subscription)
+
+        headers = dict(cors_headers, **{"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+        return StreamingResponse(generate(), media_type='text/event-stream', headers=headers)
+
+    return Starlette(routes=[
+        Route('/esp32/frame', receive_esp32_frame, methods=['POST']),
+        Route('/stream/frame', stream_frame, methods=['GET']),
+        Route('/stream/mjpeg', stream_mjpeg, methods=['GET']),
+        Route('/events', stream_events, methods=['GET']),
+        Route('/videos/{filename}', get_video, methods=['GET']),  # DELETE falls through to Flask
+        # Everything else: the Flask routes, run on a small thread pool
+        Mount('/', app=WSGIMiddleware(server.app, workers=server.ASGI_WSGI_WORKERS))
+    ])
+
+
+def run_asgi_server(server, host, port):
+    """Serve the app with uvicorn (blocks until shutdown)"""
+    import uvicorn
+
+    print(f"⚡ ASGI mode: uvicorn on {host}:{port} ({server.ASGI_WSGI_WORKERS} WSGI bridge workers)")
+    uvicorn.run(create_asgi_app(server), host=host, port=port, log_level="warning")
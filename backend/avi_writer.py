@@ -0,0 +1,160 @@
+"""
+MJPEG AVI Writer for Passthrough Recording (RECORDING_MODE = "passthrough")
+- write() appends the ESP32's JPEG bytes as-is: no decode, no re-encode,
+  no frame copy, so recording costs a file write per frame
+- Width/height come from the first JPEG's SOF header; the frame rate is
+  measured from the capture timestamps, so clips play back at real speed
+- The header is written as a placeholder and patched in release(), together
+  with the idx1 index (8 bytes of memory per frame until then)
+
+Pure Python (AVI 1.0 / RIFF). OpenCV, ffmpeg and most players read the result;
+for iOS playback, transcode the finished clip to H.264 (PASSTHROUGH_TRANSCODE).
+"""
+
+import struct
+from array import array
+from pathlib import Path
+
+AVI_MAX_BYTES = 0xFFFFFFFF - 16 * 1024 * 1024  # RIFF sizes are 32-bit; stop short of 4 GB
+HEADER_SIZE = 224  # RIFF + hdrl (avih, strl) + LIST movi headers, fixed layout
+AVIF_HASINDEX = 0x10
+AVIIF_KEYFRAME = 0x10
+DEFAULT_FPS = 10.0  # Used when a clip has fewer than two frames
+
+# JPEG start-of-frame markers (baseline, progressive, ...) carrying the image size
+SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def jpeg_dimensions(data):
+    """(width, height) from a JPEG's SOF segment, or None if it cannot be found"""
+    offset = 2  # After SOI
+    size = len(data)
+    while offset + 4 <= size:
+        if data[offset] != 0xFF:
+            offset += 1
+            continue
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1  # Fill byte
+            continue
+        if marker in (0x01,) or 0xD0 <= marker <= 0xD9:
+            offset += 2  # Standalone marker, no length
+            continue
+        segment_length = struct.unpack_from(">H", data, offset + 2)[0]
+        if marker in SOF_MARKERS and offset + 9 <= size:
+            height, width = struct.unpack_from(">HH", data, offset + 5)
+            return width, height
+        offset += 2 + segment_length
+    return None
+
+
+class MjpegAviWriter:
+    """Append-only AVI file of JPEG frames (same write()/release() shape as cv2.VideoWriter)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.file = open(self.path, "wb")
+        self.file.write(b"\0" * HEADER_SIZE)  # Patched in release()
+        self.offsets = array("I")  # Chunk positions relative to the 'movi' fourcc
+        self.sizes = array("I")
+        self.position = HEADER_SIZE
+        self.width = None
+        self.height = None
+        self.first_timestamp = None
+        self.last_timestamp = None
+        self.max_frame_bytes = 0
+        self.full = False
+
+    def write(self, jpeg_data, timestamp):
+        """
+        Append one JPEG. Frames must arrive in timestamp order; ones not newer
+        than the last written frame (e.g. already written as pre-roll) are
+        skipped. Returns True if the frame was written.
+        """
+        if self.full or (self.last_timestamp is not None and timestamp <= self.last_timestamp):
+            return False
+
+        size = len(jpeg_data)
+        if self.width is None:
+            dimensions = jpeg_dimensions(jpeg_data)
+            if dimensions is None:
+                return False
+            self.width, self.height = dimensions
+        if self.position + size + 16 * (len(self.sizes) + 2) > AVI_MAX_BYTES:
+            self.full = True
+            print(f"⚠️  {self.path.name} reached the AVI size limit - further frames are not recorded")
+            return False
+
+        self.file.write(struct.pack("<4sI", b"00dc", size))
+        self.file.write(jpeg_data)
+        if size & 1:
+            self.file.write(b"\0")  # Chunks are word aligned
+
+        self.offsets.append(self.position - (HEADER_SIZE - 4))
+        self.sizes.append(size)
+        self.position += 8 + size + (size & 1)
+        self.max_frame_bytes = max(self.max_frame_bytes, size)
+        if self.first_timestamp is None:
+            self.first_timestamp = timestamp
+        self.last_timestamp = timestamp
+        return True
+
+    @property
+    def frame_count(self):
+        return len(self.sizes)
+
+    @property
+    def fps(self):
+        """Average capture rate of the written frames"""
+        if self.frame_count < 2 or self.last_timestamp <= self.first_timestamp:
+            return DEFAULT_FPS
+        return (self.frame_count - 1) / (self.last_timestamp - self.first_timestamp)
+
+    def release(self):
+        """Write the idx1 index and patch the header (frame count, size, frame rate)"""
+        if self.file.closed:
+            return
+
+        index = bytearray()
+        for offset, size in zip(self.offsets, self.sizes):
+            index += struct.pack("<4sIII", b"00dc", AVIIF_KEYFRAME, offset, size)
+        self.file.write(struct.pack("<4sI", b"idx1", len(index)))
+        self.file.write(index)
+        end = self.position + 8 + len(index)
+
+        self.file.seek(0)
+        self.file.write(self.build_header(end))
+        self.file.close()
+
+    def build_header(self, file_size):
+        width = self.width or 0
+        height = self.height or 0
+        frames = self.frame_count
+        rate = max(1, round(self.fps * 1000))  # dwRate / dwScale = fps
+        buffer_size = self.max_frame_bytes + 8
+
+        avih = struct.pack(
+            "<IIIIIIIIII16x",
+            round(1000000 / self.fps), round(self.max_frame_bytes * self.fps), 0, AVIF_HASINDEX,
+            frames, 0, 1, buffer_size, width, height
+        )
+        strh = struct.pack(
+            "<4s4sIHHIIIIIIIIhhhh",
+            b"vids", b"MJPG", 0, 0, 0, 0, 1000, rate, 0, frames, buffer_size, 0xFFFFFFFF, 0,
+            0, 0, width, height
+        )
+        strf = struct.pack(
+            "<IiiHH4sIiiII",
+            40, width, height, 1, 24, b"MJPG", width * height * 3, 0, 0, 0, 0
+        )
+        strl = (b"strl" + struct.pack("<4sI", b"strh", len(strh)) + strh
+                + struct.pack("<4sI", b"strf", len(strf)) + strf)
+        hdrl = (b"hdrl" + struct.pack("<4sI", b"avih", len(avih)) + avih
+                + struct.pack("<4sI", b"LIST", len(strl)) + strl)
+        movi_size = self.position - (HEADER_SIZE - 4)  # 'movi' fourcc + frame chunks
+
+        header = (struct.pack("<4sI4s", b"RIFF", file_size - 8, b"AVI ")
+                  + struct.pack("<4sI", b"LIST", len(hdrl)) + hdrl
+                  + struct.pack("<4sI4s", b"LIST", movi_size, b"movi"))
+        assert len(header) == HEADER_SIZE
+        return header
@@ -0,0 +1,202 @@
+"""
+Low-Priority Compaction of Archived Clips
+- Re-encodes finished clips (mp4v / MJPEG) to a compact codec with ffmpeg,
+  optionally keeping only the frames around detections
+- ffmpeg runs at the lowest CPU priority (nice 19), idle I/O class (ionice
+  -c 3 on Linux, taskpolicy -b on macOS) and a capped thread count
+- While should_pause() reports a reason (live inference under pressure, a
+  clip recording, high load) the ffmpeg process is suspended with SIGSTOP and
+  resumed with SIGCONT, so compaction never competes with the live pipeline
+
+Requires ffmpeg on PATH.
+"""
+
+import shutil
+import signal
+import subprocess
+import tempfile
+import time
+
+from ffmpeg_recorder import encoder_args
+
+CAN_SUSPEND = hasattr(signal, "SIGSTOP")  # POSIX only; elsewhere ffmpeg just runs niced
+
+
+def encoder_available(encoder):
+    """True if ffmpeg is on PATH and was built with the encoder"""
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        return False
+    result = subprocess.run([ffmpeg, "-hide_banner", "-encoders"], capture_output=True, text=True)
+    return any(line.split()[1:2] == [encoder] for line in result.stdout.splitlines())
+
+
+def low_priority_prefix():
+    """
+    Command prefix for the lowest CPU priority and the idle I/O class. Each tool
+    execs the next, so the process keeps the ffmpeg PID (for SIGSTOP/SIGCONT).
+    No preexec_fn: it is not safe to use from this multi-threaded server.
+    """
+    prefix = ["nice", "-n", "19"] if shutil.which("nice") else []
+    if shutil.which("ionice"):
+        prefix += ["ionice", "-c", "3"]
+    elif shutil.which("taskpolicy"):
+        prefix += ["taskpolicy", "-b"]
+    return prefix
+
+
+def keep_ranges(detection_times, started_at, ended_at, frame_count, preroll_frames, padding):
+    """
+    Frame ranges of a clip within `padding` seconds of a detection.
+
+    Live frames (after the pre-roll) are taken as evenly spread between
+    started_at and ended_at, which holds for every recording mode because the
+    file keeps one frame per processed upload whatever its nominal frame rate.
+
+    Returns:
+        [(first, last)] inclusive frame indices, or None to keep the whole clip
+        (no detections logged, e.g. proximity-triggered clips)
+    """
+    span = (ended_at or 0) - started_at
+    live_frames = frame_count - preroll_frames
+    if not detection_times or span <= 0 or live_frames <= 0:
+        return None
+
+    frames_per_second = live_frames / span
+    pad = padding * frames_per_second
+    ranges = []
+    for ts in detection_times:
+        center = preroll_frames + (ts - started_at) * frames_per_second
+        first = max(0, int(center - pad))
+        last = min(frame_count - 1, int(center + pad))
+        if ranges and first <= ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], max(ranges[-1][1], last))
+        else:
+            ranges.append((first, last))
+    return ranges
+
+
+class ClipCompactor:
+    """Runs one low-priority ffmpeg re-encode at a time and keeps totals for /health"""
+
+    def __init__(self, encoder="libx264", preset="slow", crf=28, threads=1, poll_seconds=1.0):
+        self.encoder = encoder
+        self.preset = preset
+        self.crf = crf
+        self.threads = threads
+        self.poll_seconds = poll_seconds
+        self.process = None
+        self.current = None
+        self.paused_reason = None
+        self.stopped = False
+        self.clips_compacted = 0
+        self.clips_skipped = 0
+        self.clips_failed = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.seconds_cut = 0.0
+        self.seconds_paused = 0.0
+        self.seconds_encoding = 0.0
+
+    def command(self, source, output, keep=None, fps=None):
+        """ffmpeg arguments: re-encode (video only), keeping the frame ranges in `keep` if given"""
+        command = [
+            *low_priority_prefix(), shutil.which("ffmpeg") or "ffmpeg", "-y", "-loglevel", "error",
+            "-threads", str(self.threads), "-i", str(source)
+        ]
+        if keep:
+            # Kept frames are re-timed back to back at the clip's average rate
+            selected = "+".join(f"between(n,{first},{last})" for first, last in keep)
+            command += ["-vf", f"select='{selected}',setpts=N/({fps:.4f}*TB)", "-vsync", "vfr"]
+        command += [
+            "-an", *encoder_args(self.encoder, self.preset, self.crf), "-threads", str(self.threads),
+            "-pix_fmt", "yuv420p"
+        ]
+        if "265" in self.encoder or "hevc" in self.encoder:
+            command += ["-tag:v", "hvc1"]  # Needed for HEVC playback on iOS
+        return command + ["-movflags", "+faststart", "-f", "mp4", str(output)]
+
+    def compact(self, source, output, keep=None, fps=None, should_pause=None):
+        """
+        Encode source into output at low priority, suspending ffmpeg while
+        should_pause() returns a reason. Returns True if ffmpeg succeeded.
+        """
+        if self.stopped:
+            return False
+        start = time.time()
+        self.current = source.name
+        # stderr goes to a temp file: an unread pipe could fill up and block ffmpeg
+        error_log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            self.command(source, output, keep, fps), stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL, stderr=error_log
+        )
+        try:
+            while True:
+                try:
+                    self.process.wait(timeout=self.poll_seconds)
+                    break
+                except subprocess.TimeoutExpired:
+                    pass
+                reason = should_pause() if should_pause and CAN_SUSPEND else None
+                if reason and self.paused_reason is None:
+                    self.process.send_signal(signal.SIGSTOP)
+                    print(f"⏸️  Compaction paused ({reason})")
+                elif reason is None and self.paused_reason is not None:
+                    self.process.send_signal(signal.SIGCONT)
+                    print("▶️  Compaction resumed")
+                if self.paused_reason is not None:
+                    self.seconds_paused += self.poll_seconds
+                self.paused_reason = reason
+            error_log.seek(0)
+            stderr = error_log.read().decode('utf-8', 'replace').strip()
+        finally:
+            error_log.close()
+            self.terminate()
+            self.current = None
+            self.paused_reason = None
+        self.seconds_encoding += time.time() - start
+
+        if self.process.returncode != 0:
+            if self.stopped:
+                return False
+            message = stderr.splitlines()
+            print(f"⚠️  Compaction of {source.name} failed (ffmpeg exit {self.process.returncode})"
+                  f"{': ' + message[-1] if message else ''}")
+            return False
+        return True
+
+    def stop(self):
+        """Shutdown: end the running encode; its clip stays as it was"""
+        self.stopped = True
+        self.terminate()
+
+    def terminate(self):
+        """Stop a running (possibly suspended) ffmpeg"""
+        process = self.process
+        if process is None or process.poll() is not None:
+            return
+        if CAN_SUSPEND:
+            process.send_signal(signal.SIGCONT)  # A stopped process cannot act on SIGTERM
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def get_stats(self):
+        return {
+            "encoder": self.encoder,
+            "current": self.current,
+            "paused": self.paused_reason,
+            "clips_compacted": self.clips_compacted,
+            "clips_skipped": self.clips_skipped,
+            "clips_failed": self.clips_failed,
+            "bytes_before": self.bytes_before,
+            "bytes_after": self.bytes_after,
+            "bytes_saved": self.bytes_before - self.bytes_after,
+            "seconds_cut": round(self.seconds_cut, 1),
+            "seconds_encoding": round(self.seconds_encoding, 1),
+            "seconds_paused": round(self.seconds_paused, 1)
+        }
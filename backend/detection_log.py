@@ -0,0 +1,255 @@
+"""
+Append-Only Detection Log (SQLite, batched writes)
+- One compact row per detection: timestamp, camera, frame, class, confidence,
+  bbox and source (detector / tracker / motion-gate reuse)
+- log() only appends a reference to an in-memory deque (no conversion, no I/O),
+  so the cost inside process_detections stays around a microsecond
+- A background thread converts and writes pending frames in one transaction
+  every DETECTION_LOG_FLUSH_SECONDS, and prunes rows past the retention period
+- summary() / timeline() / rows() back the /analytics endpoints
+"""
+
+import sqlite3
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+CLASS_IDS = {"human": 0, "cat": 1}
+CLASS_LABELS = {0: "human", 1: "cat"}
+SOURCE_IDS = {"detector": 0, "tracker": 1, "reuse": 2}
+SOURCE_LABELS = {0: "detector", 1: "tracker", 2: "reuse"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS devices (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL
+);
+CREATE TABLE IF NOT EXISTS detections (
+    ts REAL NOT NULL,
+    device INTEGER NOT NULL,
+    frame INTEGER NOT NULL,
+    cls INTEGER NOT NULL,
+    conf REAL NOT NULL,
+    x1 REAL, y1 REAL, x2 REAL, y2 REAL,
+    source INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS detections_ts ON detections (ts);
+CREATE INDEX IF NOT EXISTS detections_device_ts ON detections (device, ts);
+"""
+
+
+class DetectionLog:
+    """Batched SQLite writer plus aggregate queries"""
+
+    def __init__(self, db_path, flush_seconds=1.0, max_pending_frames=50000, retention_days=30):
+        self.db_path = Path(db_path)
+        self.flush_seconds = flush_seconds
+        self.retention_seconds = retention_days * 86400
+        self.pending = deque(maxlen=max_pending_frames)  # Oldest frames are dropped if the disk stalls
+        self.lock = threading.Lock()  # Serialises use of the connection
+        self.device_ids = {}
+
+        self.db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(SCHEMA)
+            for device_id, name in self.db.execute("SELECT id, name FROM devices"):
+                self.device_ids[name] = device_id
+
+        self.frames_logged = 0
+        self.rows_written = 0
+        self.frames_dropped = 0
+        self.last_flush_ms = 0.0
+        self.last_prune = 0.0
+        self.running = True
+        self.wake = threading.Event()
+        self.thread = threading.Thread(target=self.flush_loop, daemon=True)
+        self.thread.start()
+
+    def log(self, device, frame_seq, timestamp, detections, source="detector"):
+        """Hot path: queue one frame's detections (the list is not copied and must not be mutated)"""
+        if len(self.pending) == self.pending.maxlen:
+            self.frames_dropped += 1
+        self.pending.append((timestamp, device, frame_seq, source, detections))
+        self.frames_logged += 1
+
+    def flush_loop(self):
+        while self.running:
+            self.wake.wait(self.flush_seconds)
+            self.wake.clear()
+            try:
+                self.flush()
+                if time.time() - self.last_prune > 3600:
+                    self.prune()
+            except Exception as e:
+                print(f"⚠️  Detection log write error: {e}")
+
+    def flush(self):
+        """Write all pending frames in a single transaction"""
+        start = time.time()
+        frames = []
+        while True:
+            try:
+                frames.append(self.pending.popleft())
+            except IndexError:
+                break
+        if not frames:
+            return 0
+
+        with self.lock, self.db:
+            rows = []
+            for timestamp, device, frame_seq, source, detections in frames:
+                device_id = self.device_id(device)
+                source_id = SOURCE_IDS.get(source, 0)
+                for det in detections:
+                    x1, y1, x2, y2 = det["bbox"]
+                    rows.append((
+                        timestamp, device_id, frame_seq, CLASS_IDS.get(det["class"], -1),
+                        round(det["confidence"], 3), round(x1, 1), round(y1, 1), round(x2, 1), round(y2, 1),
+                        source_id
+                    ))
+            self.db.executemany("INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+        self.rows_written += len(rows)
+        self.last_flush_ms = (time.time() - start) * 1000.0
+        return len(rows)
+
+    def device_id(self, name):
+        """Small integer ID for a camera name (lock held)"""
+        device_id = self.device_ids.get(name)
+        if device_id is None:
+            row = self.db.execute("SELECT id FROM devices WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                device_id = self.db.execute("INSERT INTO devices (name) VALUES (?)", (name,)).lastrowid
+            else:
+                device_id = row[0]
+            self.device_ids[name] = device_id
+        return device_id
+
+    def prune(self):
+        """Delete rows older than the retention period"""
+        self.last_prune = time.time()
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM detections WHERE ts < ?", (self.last_prune - self.retention_seconds,))
+
+    def close(self):
+        self.running = False
+        self.wake.set()
+        self.thread.join(timeout=5)
+        self.flush()
+
+    def get_stats(self):
+        return {
+            "pending_frames": len(self.pending),
+            "frames_logged": self.frames_logged,
+            "rows_written": self.rows_written,
+            "frames_dropped": self.frames_dropped,
+            "last_flush_ms": round(self.last_flush_ms, 2)
+        }
+
+    # ---- Queries (pending frames are flushed first so results are current) ----
+    # All detections of one frame share its timestamp, so (device, ts) identifies
+    # a frame even across restarts (frame_seq starts again at 0).
+
+    def where_clause(self, since=None, until=None, device=None, cls=None):
+        where = []
+        params = []
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("ts < ?")
+            params.append(until)
+        if device is not None:
+            where.append("device = ?")
+            params.append(self.device_ids.get(device, -1))
+        if cls is not None:
+            where.append("cls = ?")
+            params.append(CLASS_IDS.get(cls, -1))
+        return (" WHERE " + " AND ".join(where)) if where else "", params
+
+    def summary(self, since=None, until=None, device=None):
+        """Detections/frames per class, frames with both classes, time range"""
+        self.flush()
+        where, params = self.where_clause(since, until, device)
+        with self.lock:
+            classes = {
+                CLASS_LABELS.get(cls, str(cls)): {
+                    "detections": count,
+                    "frames": frames,
+                    "avg_confidence": round(avg_conf, 3)
+                }
+                for cls, count, frames, avg_conf in self.db.execute(
+                    f"SELECT cls, COUNT(*), COUNT(DISTINCT device || ':' || ts), AVG(conf) "
+                    f"FROM detections{where} GROUP BY cls", params
+                )
+            }
+            frames, interaction_frames, first_ts, last_ts = self.db.execute(
+                f"SELECT COUNT(*), SUM(humans > 0 AND cats > 0), MIN(ts), MAX(ts) FROM ("
+                f"SELECT MIN(ts) AS ts, SUM(cls = 0) AS humans, SUM(cls = 1) AS cats "
+                f"FROM detections{where} GROUP BY device, ts)", params
+            ).fetchone()
+        return {
+            "classes": classes,
+            "frames_with_detections": frames,
+            "interaction_frames": interaction_frames or 0,
+            "first": first_ts,
+            "last": last_ts
+        }
+
+    def timeline(self, since, until, bucket_seconds, device=None):
+        """Per-bucket frame counts with a human, a cat, and both (interactions)"""
+        self.flush()
+        where, params = self.where_clause(since, until, device)
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT CAST(ts / ? AS INTEGER) * ? AS bucket, SUM(humans > 0), SUM(cats > 0), "
+                f"SUM(humans > 0 AND cats > 0), MAX(max_conf) FROM ("
+                f"SELECT MIN(ts) AS ts, SUM(cls = 0) AS humans, SUM(cls = 1) AS cats, MAX(conf) AS max_conf "
+                f"FROM detections{where} GROUP BY device, ts) GROUP BY bucket ORDER BY bucket",
+                [bucket_seconds, bucket_seconds] + params
+            ).fetchall()
+        return [
+            {
+                "start": bucket,
+                "human_frames": humans,
+                "cat_frames": cats,
+                "interaction_frames": both,
+                "max_confidence": round(max_conf, 3)
+            }
+            for bucket, humans, cats, both, max_conf in rows
+        ]
+
+    def frame_times(self, since, until, device=None):
+        """Timestamps of the frames with at least one detection, oldest first"""
+        self.flush()
+        where, params = self.where_clause(since, until, device)
+        with self.lock:
+            return [ts for (ts,) in self.db.execute(
+                f"SELECT DISTINCT ts FROM detections{where} ORDER BY ts", params
+            )]
+
+    def rows(self, since=None, until=None, device=None, cls=None, limit=1000):
+        """Raw detections, newest first"""
+        self.flush()
+        where, params = self.where_clause(since, until, device, cls)
+        names = {device_id: name for name, device_id in self.device_ids.items()}
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT ts, device, frame, cls, conf, x1, y1, x2, y2, source FROM detections{where} "
+                f"ORDER BY ts DESC LIMIT ?", params + [limit]
+            ).fetchall()
+        return [
+            {
+                "timestamp": ts,
+                "device": names.get(device_id),
+                "frame": frame,
+                "class": CLASS_LABELS.get(cls, str(cls)),
+                "confidence": conf,
+                "bbox": [x1, y1, x2, y2],
+                "source": SOURCE_LABELS.get(source)
+            }
+            for ts, device_id, frame, cls, conf, x1, y1, x2, y2, source in rows
+        ]
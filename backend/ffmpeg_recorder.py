@@ -0,0 +1,107 @@
+"""
+ffmpeg Pipe Recorder (RECORDING_MODE = "ffmpeg")
+- Streams raw BGR frames into an ffmpeg subprocess that encodes H.264
+  (or any encoder ffmpeg has: libx264, h264_nvenc, h264_videotoolbox, ...)
+- ffmpeg encodes at a nominal frame rate with B-frames off (-bf 0); the
+  capture timestamp of every frame is kept, and after release the sample
+  durations are rewritten from them (mp4_tools.set_frame_times), so clips
+  play at real speed whatever rate the camera and inference managed
+- Encoding runs in the ffmpeg process, off the Python threads
+
+Requires ffmpeg on PATH.
+"""
+
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+NOMINAL_FPS = 30  # Encoder rate control only - real timing comes from the capture timestamps
+
+
+def ffmpeg_available():
+    return shutil.which("ffmpeg") is not None
+
+
+def encoder_args(encoder, preset=None, crf=None, bitrate=None):
+    """Encoder options: CRF for the x264/x265 software encoders, a bitrate for hardware ones"""
+    args = ["-c:v", encoder]
+    if preset:
+        args += ["-preset", preset]
+    if encoder.startswith("libx26") and crf is not None:
+        args += ["-crf", str(crf)]
+    elif bitrate:
+        args += ["-b:v", str(bitrate)]
+    return args
+
+
+class FfmpegRecorder:
+    """Same write()/release() shape as the other recorders; write() takes the capture timestamp"""
+
+    def __init__(self, path, width, height, encoder="libx264", preset="veryfast", crf=23, bitrate=None):
+        self.path = Path(path)
+        # 4:2:0 chroma needs even dimensions
+        self.width = width - width % 2
+        self.height = height - height % 2
+        self.frame_times = []
+        self.failed = False
+        command = [
+            shutil.which("ffmpeg") or "ffmpeg", "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{self.width}x{self.height}",
+            "-r", str(NOMINAL_FPS), "-i", "-",
+            *encoder_args(encoder, preset, crf, bitrate),
+            "-bf", "0", "-pix_fmt", "yuv420p", "-f", "mp4", str(self.path)
+        ]
+        # stderr goes to a temp file, read back in release(): nothing reads a pipe while
+        # recording, and a full pipe would block ffmpeg (and the writer thread with it)
+        self.error_log = tempfile.TemporaryFile()
+        self.process = subprocess.Popen(
+            command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=self.error_log
+        )
+
+    def write(self, frame, timestamp):
+        """
+        Pipe one frame to ffmpeg. Frames must arrive in timestamp order; ones
+        not newer than the last written frame are skipped. Returns True if written.
+        """
+        if self.failed or (self.frame_times and timestamp <= self.frame_times[-1]):
+            return False
+
+        height, width = frame.shape[:2]
+        if (height, width) != (self.height, self.width):
+            if height - self.height in (0, 1) and width - self.width in (0, 1):
+                frame = frame[:self.height, :self.width]  # Odd size: drop the last row/column
+            else:
+                frame = cv2.resize(frame, (self.width, self.height), interpolation=cv2.INTER_AREA)
+        if not frame.flags['C_CONTIGUOUS']:
+            frame = np.ascontiguousarray(frame)
+
+        try:
+            self.process.stdin.write(frame.data)
+        except (BrokenPipeError, OSError):
+            self.failed = True
+            print(f"⚠️  ffmpeg stopped accepting frames for {self.path.name}")
+            return False
+        self.frame_times.append(timestamp)
+        return True
+
+    def release(self):
+        """Close the pipe and wait for ffmpeg to finish the file"""
+        if self.error_log.closed:
+            return
+        try:
+            self.process.communicate(timeout=60)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.communicate()
+        self.error_log.seek(0)
+        stderr = self.error_log.read()
+        self.error_log.close()
+        if self.process.returncode != 0:
+            self.failed = True
+            message = stderr.decode('utf-8', 'replace').strip().splitlines()
+            print(f"⚠️  ffmpeg exited with code {self.process.returncode} for {self.path.name}"
+                  f"{': ' + message[-1] if message else ''}")
@@ -0,0 +1,241 @@
+"""
+Pluggable Inference Backends for the Streaming Server
+- pytorch:  Ultralytics YOLO on the trained best.pt
+- onnx:     ONNX Runtime on best.onnx (CPU)
+- openvino: OpenVINO IR (best_openvino_model/best.xml) on CPU
+
+Export the ONNX / OpenVINO artifacts with AI_Model/training_scripts/export_model.py.
+Every backend returns the same compact detection list per frame:
+    [{"class": "human" | "cat", "confidence": float, "bbox": [x1, y1, x2, y2]}, ...]
+"""
+
+from abc import ABC, abstractmethod
+from pathlib import Path
+import cv2
+import numpy as np
+
+# Model class index -> name used by the server and iOS app
+CLASS_NAMES = {0: "human", 1: "cat"}
+
+
+def make_detection(cls, conf, xyxy):
+    """Build one detection dict (same format as /status and /stream/live)"""
+    return {
+        "class": CLASS_NAMES.get(int(cls), "cat"),
+        "confidence": float(conf),
+        "bbox": [float(v) for v in xyxy]
+    }
+
+
+class UltralyticsBackend:
+    """PyTorch weights via Ultralytics YOLO"""
+
+    name = "pytorch"
+
+    def __init__(self, model_path, threads=None):
+        from ultralytics import YOLO
+
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+
+        self.model_path = Path(model_path)
+        self.threads = threads
+        self.model = YOLO(str(model_path))
+
+    def predict(self, frames, conf=0.25, iou=0.45, imgsz=640):
+        """Run detection on a list of BGR frames, one detection list per frame"""
+        results = self.model.predict(
+            source=frames,
+            conf=conf,
+            iou=iou,
+            imgsz=imgsz,
+            half=False,  # FP16 disabled for CPU (use half=True on GPU)
+            verbose=False
+        )
+
+        batch_detections = []
+        for result in results:
+            detections = []
+            for box in result.boxes:
+                detections.append(make_detection(box.cls[0], box.conf[0], box.xyxy[0].tolist()))
+            batch_detections.append(detections)
+        return batch_detections
+
+
+class ExportedModelBackend(ABC):
+    """Shared YOLOv8 pre/post-processing for exported (ONNX / OpenVINO) models"""
+
+    name = "exported"
+
+    def __init__(self, model_path, threads=None):
+        self.model_path = Path(model_path)
+        self.threads = threads
+        self.fixed_imgsz = None  # Set by subclasses when the export has a static input size
+        self.dynamic_batch = False
+        self.imgsz_warned = False
+
+    @abstractmethod
+    def run(self, blob):
+        """Run the network on an NCHW float32 blob, returning the raw (N, 4+nc, anchors) output"""
+
+    def predict(self, frames, conf=0.25, iou=0.45, imgsz=640):
+        """Run detection on a list of BGR frames, one detection list per frame"""
+        size = self.fixed_imgsz or imgsz
+        if size != imgsz and not self.imgsz_warned:
+            # A different imgsz asked for by the server has no effect on this model
+            self.imgsz_warned = True
+            print(f"⚠️  {self.model_path.name} was exported with a fixed {self.fixed_imgsz} px input - "
+                  f"imgsz {imgsz} is ignored (export without --static to allow other sizes)")
+        blobs = []
+        letterboxes = []
+        for frame in frames:
+            blob, letterbox_info = preprocess_frame(frame, size)
+            blobs.append(blob)
+            letterboxes.append(letterbox_info)
+
+        if self.dynamic_batch:
+            outputs = self.run(np.stack(blobs))
+        else:
+            outputs = np.concatenate([self.run(blob[None]) for blob in blobs])
+
+        return [
+            postprocess_output(output, letterbox_info, conf, iou)
+            for output, letterbox_info in zip(outputs, letterboxes)
+        ]
+
+
+class OnnxRuntimeBackend(ExportedModelBackend):
+    """best.onnx via ONNX Runtime (CPU execution provider)"""
+
+    name = "onnx"
+
+    def __init__(self, model_path, threads=None):
+        super().__init__(model_path, threads)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+
+        self.session = ort.InferenceSession(
+            str(model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+
+        # Static exports have integer dims; dynamic exports use named dims
+        batch_dim, _, height_dim, _ = model_input.shape
+        self.dynamic_batch = not isinstance(batch_dim, int)
+        if isinstance(height_dim, int):
+            self.fixed_imgsz = height_dim
+
+    def run(self, blob):
+        return self.session.run(None, {self.input_name: blob})[0]
+
+
+class OpenVinoBackend(ExportedModelBackend):
+    """OpenVINO IR (best_openvino_model/) on the CPU plugin"""
+
+    name = "openvino"
+
+    def __init__(self, model_path, threads=None):
+        super().__init__(model_path, threads)
+        try:
+            import openvino as ov
+        except ImportError:
+            import openvino.runtime as ov  # openvino < 2023.1
+
+        model_path = Path(model_path)
+        if model_path.is_dir():
+            model_path = next(model_path.glob("*.xml"))
+
+        core = ov.Core()
+        network = core.read_model(str(model_path))
+
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if threads:
+            config["INFERENCE_NUM_THREADS"] = str(threads)
+
+        self.compiled_model = core.compile_model(network, "CPU", config)
+        self.output = self.compiled_model.output(0)
+
+        input_shape = network.input(0).get_partial_shape()
+        self.dynamic_batch = input_shape[0].is_dynamic
+        if input_shape[2].is_static:
+            self.fixed_imgsz = input_shape[2].get_length()
+
+    def run(self, blob):
+        return self.compiled_model([blob])[self.output]
+
+
+INFERENCE_BACKENDS = {
+    "pytorch": UltralyticsBackend,
+    "onnx": OnnxRuntimeBackend,
+    "openvino": OpenVinoBackend
+}
+
+
+def create_inference_backend(name, model_path, threads=None):
+    """Create the backend selected by INFERENCE_BACKEND"""
+    if name not in INFERENCE_BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}' (choose from {', '.join(INFERENCE_BACKENDS)})")
+
+    if not Path(model_path).exists():
+        raise FileNotFoundError(f"Model for '{name}' backend not found: {model_path} (run export_model.py first)")
+
+    return INFERENCE_BACKENDS[name](model_path, threads)
+
+
+def preprocess_frame(frame, size):
+    """Letterbox a BGR frame to size x size and convert to a CHW float32 RGB blob"""
+    height, width = frame.shape[:2]
+    scale = min(size / height, size / width)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    pad_x = (size - new_width) / 2
+    pad_y = (size - new_height) / 2
+
+    resized = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+    top, bottom = int(round(pad_y - 0.1)), int(round(pad_y + 0.1))
+    left, right = int(round(pad_x - 0.1)), int(round(pad_x + 0.1))
+    padded = cv2.copyMakeBorder(resized, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114))
+
+    blob = cv2.dnn.blobFromImage(padded, 1 / 255.0, swapRB=True)[0]
+    return blob, (scale, left, top, width, height)
+
+
+def postprocess_output(output, letterbox_info, conf, iou):
+    """Decode one YOLOv8 output (4+nc, anchors) into detections in original frame coordinates"""
+    scale, pad_x, pad_y, width, height = letterbox_info
+    predictions = output.T  # (anchors, 4 + nc)
+
+    class_scores = predictions[:, 4:]
+    class_ids = class_scores.argmax(axis=1)
+    scores = class_scores[np.arange(len(class_ids)), class_ids]
+    keep = scores >= conf
+    if not keep.any():
+        return []
+
+    boxes = predictions[keep, :4]
+    scores = scores[keep]
+    class_ids = class_ids[keep]
+
+    # cx, cy, w, h (letterboxed) -> x1, y1, x2, y2 (original frame)
+    xyxy = np.empty_like(boxes)
+    xyxy[:, 0] = (boxes[:, 0] - boxes[:, 2] / 2 - pad_x) / scale
+    xyxy[:, 1] = (boxes[:, 1] - boxes[:, 3] / 2 - pad_y) / scale
+    xyxy[:, 2] = (boxes[:, 0] + boxes[:, 2] / 2 - pad_x) / scale
+    xyxy[:, 3] = (boxes[:, 1] + boxes[:, 3] / 2 - pad_y) / scale
+    xyxy[:, [0, 2]] = xyxy[:, [0, 2]].clip(0, width)
+    xyxy[:, [1, 3]] = xyxy[:, [1, 3]].clip(0, height)
+
+    # Class-aware NMS (same as Ultralytics default agnostic_nms=False)
+    nms_boxes = [[x1, y1, x2 - x1, y2 - y1] for x1, y1, x2, y2 in xyxy.tolist()]
+    indices = cv2.dnn.NMSBoxesBatched(nms_boxes, scores.tolist(), class_ids.tolist(), conf, iou)
+
+    return [
+        make_detection(class_ids[i], scores[i], xyxy[i])
+        for i in np.array(indices).flatten()
+    ]
@@ -0,0 +1,267 @@
+"""
+MP4 Post-Processing for Recorded Clips
+- faststart(): move the moov atom (the sample index) in front of mdat so
+  players can start playback and seek after fetching the first few KB
+  (cv2.VideoWriter writes moov at the end of the file)
+- set_frame_times(): give every sample its real duration from the capture
+  timestamps (variable frame rate), for clips encoded at a nominal rate
+
+Pure Python, no ffmpeg needed: top-level atoms are copied in chunks and only
+the tables inside moov (stco / co64, stts and the durations) are patched.
+"""
+
+import os
+import struct
+from pathlib import Path
+
+# Atoms on the path moov -> trak -> mdia -> minf -> stbl -> stco/co64 (and trak -> edts -> elst)
+CONTAINER_ATOMS = {b"moov", b"trak", b"edts", b"mdia", b"minf", b"stbl"}
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def read_top_level_atoms(f, file_size):
+    """[(type, offset, size)] for the top-level atoms of an MP4 file"""
+    atoms = []
+    offset = 0
+    while offset + 8 <= file_size:
+        f.seek(offset)
+        size, atom_type = struct.unpack(">I4s", f.read(8))
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+        elif size == 0:
+            size = file_size - offset  # Last atom, extends to end of file
+        if size < 8 or offset + size > file_size:
+            raise ValueError(f"Corrupt MP4: atom {atom_type!r} at {offset} has size {size}")
+        atoms.append((atom_type, offset, size))
+        offset += size
+    return atoms
+
+
+def iter_child_atoms(data, start, end):
+    """Yield (type, offset, size, header_size) for the atoms in data[start:end]"""
+    offset = start
+    while offset + 8 <= end:
+        size, atom_type = struct.unpack_from(">I4s", data, offset)
+        header_size = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", data, offset + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size or offset + size > end:
+            raise ValueError(f"Corrupt MP4: atom {atom_type!r} inside moov has size {size}")
+        yield atom_type, offset, size, header_size
+        offset += size
+
+
+def find_child_atoms(data, names, start=0, end=None):
+    """Yield (type, offset, size, header_size) for every atom named in names, searching containers"""
+    end = len(data) if end is None else end
+    for atom_type, offset, size, header_size in iter_child_atoms(data, start, end):
+        if atom_type in names:
+            yield atom_type, offset, size, header_size
+        if atom_type in CONTAINER_ATOMS:
+            yield from find_child_atoms(data, names, offset + header_size, offset + size)
+
+
+def shift_chunk_offsets(moov, delta, start, end):
+    """Add delta to every chunk offset in [start, end) inside moov (bytearray, patched in place)"""
+    for atom_type, offset, _, header_size in find_child_atoms(moov, {b"stco", b"co64"}):
+        body = offset + header_size
+        count = struct.unpack_from(">I", moov, body + 4)[0]  # After version/flags
+        fmt = f">{count}{'I' if atom_type == b'stco' else 'Q'}"
+        offsets = [
+            value + delta if start <= value < end else value
+            for value in struct.unpack_from(fmt, moov, body + 8)
+        ]
+        if atom_type == b"stco" and offsets and max(offsets) > 0xFFFFFFFF:
+            raise OverflowError("Chunk offsets exceed 4 GB (stco would need converting to co64)")
+        struct.pack_into(fmt, moov, body + 8, *offsets)
+
+
+def copy_range(src, dst, offset, size):
+    src.seek(offset)
+    remaining = size
+    while remaining > 0:
+        chunk = src.read(min(COPY_CHUNK_SIZE, remaining))
+        if not chunk:
+            raise ValueError("Unexpected end of file while copying atom")
+        dst.write(chunk)
+        remaining -= len(chunk)
+
+
+def faststart(path):
+    """
+    Rewrite an MP4 so moov sits right after ftyp, ahead of the media data.
+
+    Returns True if the file was rewritten, False if it was already faststart
+    (or is not a plain ftyp/mdat/moov file). The new file is written next to the
+    original and swapped in with os.replace, so readers never see a partial file.
+    """
+    path = Path(path)
+    file_size = path.stat().st_size
+
+    with open(path, "rb") as src:
+        atoms = read_top_level_atoms(src, file_size)
+        types = [atom_type for atom_type, _, _ in atoms]
+        if b"moov" not in types or b"mdat" not in types:
+            return False
+
+        moov_index = types.index(b"moov")
+        if moov_index < types.index(b"mdat"):
+            return False  # Already faststart
+
+        # Everything between ftyp and the old moov position moves down by moov's size
+        head = atoms[:1] if types[0] == b"ftyp" else []
+        insert_at = head[0][2] if head else 0
+        _, moov_offset, moov_size = atoms[moov_index]
+
+        src.seek(moov_offset)
+        moov = bytearray(src.read(moov_size))
+        shift_chunk_offsets(moov, moov_size, insert_at, moov_offset)
+
+        tmp_path = path.with_name(path.name + ".faststart.tmp")
+        try:
+            with open(tmp_path, "wb") as dst:
+                for _, offset, size in head:
+                    copy_range(src, dst, offset, size)
+                dst.write(moov)
+                for atom_type, offset, size in atoms[len(head):]:
+                    if atom_type != b"moov":
+                        copy_range(src, dst, offset, size)
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    return True
+
+
+def is_faststart(path):
+    """True if moov comes before mdat"""
+    path = Path(path)
+    with open(path, "rb") as f:
+        types = [atom_type for atom_type, _, _ in read_top_level_atoms(f, path.stat().st_size)]
+    return b"moov" in types and b"mdat" in types and types.index(b"moov") < types.index(b"mdat")
+
+
+def rebuild_atoms(data, start, end, patch):
+    """Copy of the atoms in data[start:end] with patch(type, atom bytes) applied, container sizes recomputed"""
+    out = bytearray()
+    for atom_type, offset, size, header_size in iter_child_atoms(data, start, end):
+        if atom_type in CONTAINER_ATOMS:
+            body = rebuild_atoms(data, offset + header_size, offset + size, patch)
+            out += struct.pack(">I4s", 8 + len(body), atom_type) + body
+        else:
+            out += patch(atom_type, data[offset:offset + size])
+    return out
+
+
+def header_timescale(moov, name):
+    """Timescale from the first mvhd / mdhd atom"""
+    for _, offset, _, header_size in find_child_atoms(moov, {name}):
+        version = moov[offset + header_size]
+        return struct.unpack_from(">I", moov, offset + header_size + (20 if version == 1 else 12))[0]
+    return None
+
+
+def frame_durations(frame_times, timescale):
+    """Per-sample durations in timescale ticks (rounded on the running total, so no drift)"""
+    ticks = [round((t - frame_times[0]) * timescale) for t in frame_times]
+    durations = [max(1, b - a) for a, b in zip(ticks, ticks[1:])]
+    # The last frame has no successor: show it as long as the one before
+    durations.append(durations[-1] if durations else timescale // 10)
+    return durations
+
+
+def build_stts(durations):
+    """Run-length encoded time-to-sample atom"""
+    entries = []
+    for duration in durations:
+        if entries and entries[-1][1] == duration:
+            entries[-1][0] += 1
+        else:
+            entries.append([1, duration])
+    body = struct.pack(">II", 0, len(entries)) + b"".join(struct.pack(">II", count, delta) for count, delta in entries)
+    return struct.pack(">I4s", 8 + len(body), b"stts") + body
+
+
+def set_duration(atom, v0_offset, v1_offset, duration):
+    """Patch the duration field of a full atom (offsets are from the start of its body)"""
+    atom = bytearray(atom)
+    if atom[8] == 1:
+        struct.pack_into(">Q", atom, 8 + v1_offset, duration)
+    else:
+        struct.pack_into(">I", atom, 8 + v0_offset, min(duration, 0xFFFFFFFF))
+    return atom
+
+
+def set_frame_times(path, frame_times):
+    """
+    Replace the sample durations of a single-track video with the real frame
+    intervals (capture timestamps in seconds, one per sample) - a VFR clip
+    that plays back at the speed it was captured.
+
+    Only for files with moov at the end and no B-frames (no ctts), i.e. decode
+    order = presentation order, as written by the ffmpeg recorder (-bf 0).
+    Run before faststart(). Returns True if the file was rewritten; like
+    faststart() it writes a copy and swaps it in with os.replace.
+    """
+    path = Path(path)
+    file_size = path.stat().st_size
+
+    with open(path, "rb") as f:
+        atoms = read_top_level_atoms(f, file_size)
+        types = [atom_type for atom_type, _, _ in atoms]
+        if not types or types[-1] != b"moov" or b"mdat" not in types:
+            return False
+
+        _, moov_offset, moov_size = atoms[-1]
+        f.seek(moov_offset)
+        moov = bytearray(f.read(moov_size))
+        if struct.unpack_from(">I", moov)[0] == 1:
+            return False  # 64-bit moov header, not written by our recorders
+
+        if len(list(find_child_atoms(moov, {b"trak"}))) != 1 or any(find_child_atoms(moov, {b"ctts"})):
+            return False
+        sample_count = 0
+        for _, offset, _, header_size in find_child_atoms(moov, {b"stts"}):
+            count = struct.unpack_from(">I", moov, offset + header_size + 4)[0]
+            sample_count = sum(
+                struct.unpack_from(">I", moov, offset + header_size + 8 + 8 * i)[0] for i in range(count)
+            )
+        if sample_count != len(frame_times) or sample_count == 0:
+            return False
+
+        movie_timescale = header_timescale(moov, b"mvhd")
+        media_timescale = header_timescale(moov, b"mdhd")
+        durations = frame_durations(frame_times, media_timescale)
+        media_duration = sum(durations)
+        movie_duration = round(media_duration * movie_timescale / media_timescale)
+
+        def patch(atom_type, atom):
+            if atom_type == b"stts":
+                return build_stts(durations)
+            if atom_type == b"mdhd":
+                return set_duration(atom, 16, 24, media_duration)
+            if atom_type == b"mvhd":
+                return set_duration(atom, 16, 24, movie_duration)
+            if atom_type == b"tkhd":
+                return set_duration(atom, 20, 28, movie_duration)
+            if atom_type == b"elst" and struct.unpack_from(">I", atom, 12)[0] == 1:
+                return set_duration(atom, 8, 8, movie_duration)  # Single edit: the whole track
+            return atom
+
+        body = rebuild_atoms(moov, 8, len(moov), patch)
+        # moov is the last atom, so nothing after it moves and no chunk offset changes
+        tmp_path = path.with_name(path.name + ".timing.tmp")
+        try:
+            with open(tmp_path, "wb") as dst:
+                copy_range(f, dst, 0, moov_offset)
+                dst.write(struct.pack(">I4s", 8 + len(body), b"moov") + body)
+            os.replace(tmp_path, path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+    return True
@@ -6,51 +6,92 @@ Streaming Backend Server for Hand-Pet Interaction Detection
 - Streams live feed to iOS app
 """
 
-from flask import Flask, request, jsonify, send_file, Response
+from flask import Flask, request, jsonify, send_from_directory, Response
 from flask_cors import CORS
-from ultralytics import YOLO
 import cv2
 import numpy as np
 import base64
 from pathlib import Path
 from datetime import datetime
+import sys
+import asyncio
 import threading
 import queue
+from concurrent.futures import ThreadPoolExecutor
+import os
+import shutil
+import subprocess
 import time
 import json
+from collections import deque
+from inference_backends import create_inference_backend
+from mp4_tools import faststart, set_frame_times
+from avi_writer import MjpegAviWriter
+from ffmpeg_recorder import FfmpegRecorder, ffmpeg_available, encoder_args
+from video_catalog import VideoCatalog, probe_video
+from detection_log import DetectionLog
+from clip_compactor import ClipCompactor, encoder_available, keep_ranges
 # ESP32 MOTOR CONTROL - Commented out (see hardware_part/esp32_motor_control folder)
 # import serial
 # import serial.tools.list_ports
 
 app = Flask(__name__)
-CORS(app)
+# Expose the binary live-frame headers (/stream/frame) to browser dashboards
+CORS_EXPOSE_HEADERS = [
+    "ETag", "X-Device", "X-Frame-Seq", "X-Detections", "X-Recording",
+    "X-Current-Video", "X-Proximity-Alert", "X-Beacon-Distance"
+]
+CORS(app, expose_headers=CORS_EXPOSE_HEADERS)
 
 # Configuration
 SCRIPT_DIR = Path(__file__).parent.absolute()  # iOS_App/backend/
 PROJECT_ROOT = SCRIPT_DIR.parent.parent.absolute()  # new-FYP/
 MODEL_PATH = PROJECT_ROOT / "AI_Model" / "weights" / "best.pt"
+ONNX_MODEL_PATH = MODEL_PATH.with_suffix(".onnx")  # From export_model.py --formats onnx
+OPENVINO_MODEL_PATH = MODEL_PATH.parent / "best_openvino_model"  # From export_model.py --formats openvino
 VIDEOS_DIR = PROJECT_ROOT / "recorded_videos"
+THUMBS_DIR = VIDEOS_DIR / ".thumbs"  # Poster + preview sprite per clip
+DATA_DIR = PROJECT_ROOT / "server_data"  # Databases - outside VIDEOS_DIR, which /videos/<name> serves
+VIDEO_CATALOG_PATH = DATA_DIR / "catalog.sqlite3"  # Clip index (see video_catalog.py)
+DETECTION_LOG_PATH = DATA_DIR / "detections.sqlite3"  # Per-detection history (see detection_log.py)
+
+
+def move_legacy_database(old_path, new_path):
+    """Databases used to live in VIDEOS_DIR as dot files: move them (with WAL/SHM files) on first start"""
+    if old_path.exists() and not new_path.exists():
+        for suffix in ("", "-wal", "-shm"):
+            old_file = old_path.with_name(old_path.name + suffix)
+            if old_file.exists():
+                os.replace(old_file, new_path.with_name(new_path.name + suffix))
+        print(f"📦 Moved {old_path.name} to {new_path}")
+
 
-# Video write queue (for async writing)
-video_write_queue = queue.Queue(maxsize=3)  # Small queue to prevent memory buildup
 VIDEOS_DIR.mkdir(exist_ok=True)
+THUMBS_DIR.mkdir(exist_ok=True)
+DATA_DIR.mkdir(exist_ok=True)
+move_legacy_database(VIDEOS_DIR / ".catalog.sqlite3", VIDEO_CATALOG_PATH)
+move_legacy_database(VIDEOS_DIR / ".detections.sqlite3", DETECTION_LOG_PATH)
+video_catalog = VideoCatalog(VIDEO_CATALOG_PATH)
 
 # Global variables
 model = None
 camera_capture = None
-esp32_frame_queue = queue.Queue(maxsize=1)  # Keep only latest frame (prevents lag)
 use_esp32_camera = True  # Changed to True: Use ESP32-S3 instead of Mac webcam
 
-recording_state = {
-    "is_recording": False,
-    "video_writer": None,
-    "current_filename": None,
-    "last_detection_time": time.time(),
-    "both_detected": False,
-    "latest_frame": None,
-    "latest_annotated_frame": None,
-    "detections": []
-}
+# Serving mode: "threaded" = Flask dev server (one thread per request),
+# "asgi" = uvicorn event loop (see asgi_server.py; pip install starlette uvicorn a2wsgi)
+SERVER_MODE = "threaded"
+SERVER_PORT = 5001
+ASGI_WSGI_WORKERS = 8  # Threads for the routes bridged to Flask in ASGI mode
+
+# Per-camera state, keyed by device ID (X-Device header for ESP32 boards)
+# Boards send "X-Device: ESP32-S3-<MAC>"; this ID is only for frames with neither that header nor a client address
+DEFAULT_DEVICE_ID = "ESP32-S3-unknown"
+WEBCAM_DEVICE_ID = "webcam"
+MAX_DEVICES = 8  # Reject frames from additional cameras beyond this
+devices = {}
+devices_lock = threading.Lock()
+frame_ready = threading.Condition()  # Notified whenever any device slot gets a frame
 
 # BLE Beacon proximity state
 proximity_state = {
@@ -69,13 +110,909 @@ proximity_state = {
 CONFIDENCE_THRESHOLD = 0.25
 COOLDOWN_SECONDS = 2
 CAMERA_ID = 0  # Default camera (0 for Mac webcam, adjust for Jetson)
-MAX_VIDEOS = 10  # Keep only the 10 newest videos, delete older ones
+MAX_VIDEOS = None  # Optional clip count limit (None = retention by bytes and age only)
+SEGMENT_SECONDS = 60  # Long interactions are split into files this long, linked by event_id (0 = one file)
+RETENTION_MAX_BYTES = 4 * 1024 ** 3  # Disk quota for recordings, oldest clips deleted first (None = no quota)
+RETENTION_MAX_AGE_DAYS = 14  # Delete clips older than this (None = keep)
+RETENTION_INTERVAL_SECONDS = 300  # Retention also runs after every saved clip
+MP4_FASTSTART = True  # Move the MP4 index (moov) to the front of each finished clip
+# "reencode" = decode -> cv2.VideoWriter mp4v; "passthrough" = ESP32 JPEG bytes written
+# unchanged into an MJPEG AVI (no decode/encode/copy per recorded frame);
+# "ffmpeg" = raw frames piped to ffmpeg (H.264, real capture timestamps)
+RECORDING_MODE = "reencode"
+PASSTHROUGH_TRANSCODE = False  # Convert finished passthrough clips to H.264 MP4 in the background (needs ffmpeg)
+FFMPEG_ENCODER = "libx264"  # Or a hardware encoder: "h264_videotoolbox" (Mac), "h264_nvenc" (Jetson/NVIDIA)
+FFMPEG_PRESET = "veryfast"
+FFMPEG_CRF = 23  # Quality for libx264/libx265
+FFMPEG_BITRATE = "2M"  # Used instead of CRF by hardware encoders
+# Frames waiting for a camera's writer thread are bounded by memory, not count
+# (~100 decoded VGA frames, or thousands of passthrough JPEGs)
+RECORDING_QUEUE_MAX_BYTES = 96 * 1024 * 1024
+VIDEO_MIMETYPES = {".mp4": "video/mp4", ".avi": "video/x-msvideo"}
+POSTER_WIDTH = 320  # Poster JPEG for the video list
+SPRITE_TILES = 8  # Evenly spaced frames in the preview strip
+SPRITE_TILE_WIDTH = 160
+THUMB_JPEG_QUALITY = 70
+
+# Pre-roll: each camera keeps its last few seconds of uploads as JPEG bytes, written
+# at the start of every new clip so recordings show the approach to the trigger
+PREROLL_SECONDS = 4.0  # 0 disables
+PREROLL_MAX_BYTES = 6 * 1024 * 1024  # Per camera (~40 KB VGA JPEGs at 15 fps need ~2.4 MB for 4 s)
+
+# Compaction: clips older than COMPACTION_MIN_AGE_HOURS are re-encoded to a compact codec
+# by a niced ffmpeg, suspended whenever a camera records or live inference needs the CPU.
+# Off by default: the re-encode is lossy and replaces the original recordings
+COMPACTION_ENABLED = False  # Needs ffmpeg
+COMPACTION_MIN_AGE_HOURS = 24
+COMPACTION_ENCODER = "libx264"  # "libx265" is smaller again (tagged hvc1 for iOS playback)
+COMPACTION_PRESET = "slow"
+COMPACTION_CRF = 28
+COMPACTION_THREADS = 1
+COMPACTION_CUT_IDLE = False  # Also drop stretches without detections (from the detection log)
+COMPACTION_CUT_PADDING_SECONDS = 3.0  # Kept before/after each detection
+COMPACTION_MIN_CUT_SECONDS = 5.0  # Smaller cuts are not worth it - plain re-encode
+COMPACTION_MAX_LOAD = 0.75  # Pause above this 1-minute load average per CPU core
+COMPACTION_LATENCY_RATIO = 0.8  # Pause while end-to-end latency is above 80% of LATENCY_TARGET_MS
+COMPACTION_INTERVAL_SECONDS = 600
+COMPACTION_RETRY_HOURS = 1  # After a failed encode (killed, disk full), doubling per failure
+COMPACTION_MAX_ATTEMPTS = 3  # Then the clip is left as it is
+
+# Detection history (/analytics)
+DETECTION_LOG_FLUSH_SECONDS = 1.0  # Batch writes off the inference thread
+DETECTION_LOG_MAX_PENDING = 50000  # Frames buffered in memory if the disk stalls
+DETECTION_LOG_RETENTION_DAYS = 30
+ANALYTICS_MAX_ROWS = 5000
+
+# Inference backend ("pytorch", "onnx" or "openvino" - see inference_backends.py)
+INFERENCE_BACKEND = "pytorch"
+INFERENCE_THREADS = 4  # CPU threads used by the backend (None = library default)
+INFERENCE_IMGSZ = 640
+MODEL_PATHS = {
+    "pytorch": MODEL_PATH,
+    "onnx": ONNX_MODEL_PATH,
+    "openvino": OPENVINO_MODEL_PATH
+}
+
+# Class colours for the live-view overlay (BGR)
+CLASS_COLORS = {"human": (255, 128, 0), "cat": (0, 200, 255)}
+
+# Batched inference (ESP32 mode)
+INFERENCE_BATCH_SIZE = 4  # Max frames per model.predict call
+INFERENCE_BATCH_WAIT_MS = 20  # Max time to wait for a batch to fill up
+
+# JPEG decode pool (ESP32 ingest)
+DECODE_WORKERS = 2  # Threads decoding uploads off the Flask request thread
+DECODE_REDUCED_FACTOR = 1  # 1 = full size; 2/4/8 = decode at 1/N size (pair with a lower imgsz)
+DECODE_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+decode_executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="jpeg-decode")
+
+# Motion gating (skip inference on static scenes, reuse previous detections)
+MOTION_GATING = True
+MOTION_DOWNSCALE_SIZE = (80, 60)  # Frame differencing resolution (width, height)
+MOTION_PIXEL_THRESHOLD = 25  # Grey-level change for a pixel to count as moving
+MOTION_AREA_THRESHOLD = 0.01  # Fraction of moving pixels that counts as a scene change
+MOTION_MAX_SKIP_SECONDS = 2.0  # Always run full inference at least this often
+
+# Detect-every-N with box tracking in between (N adapts between MIN and MAX)
+TRACKING_ENABLED = False
+TRACKING_MIN_INTERVAL = 2  # Detector runs at least every 2nd frame
+TRACKING_MAX_INTERVAL = 6  # ...and at most every 6th frame when tracking is reliable
+TRACKING_MIN_CONFIDENCE = 0.5  # Re-detect early when fewer flow points than this survive
+TRACKING_GOOD_IOU = 0.6  # Tracked vs detected box IoU that counts as a good prediction
+TRACKING_FLOW_WIDTH = 320  # Optical flow runs on a downscaled grey frame this wide
+
+# Adaptive inference-rate controller (holds end-to-end latency near the target)
+ADAPTIVE_CONTROL = True
+LATENCY_TARGET_MS = 250  # Frame received -> detections processed
+CONTROLLER_INTERVAL_SECONDS = 2.0  # Min time between operating point changes
+CONTROLLER_RECOVER_RATIO = 0.6  # Step back up when latency is below 60% of target
+OPERATING_LADDER = [
+    # frame_skip: frames dropped between processed frames (per camera)
+    {"frame_skip": 0, "imgsz": INFERENCE_IMGSZ, "jpeg_quality": 75},
+    {"frame_skip": 0, "imgsz": 480, "jpeg_quality": 70},
+    {"frame_skip": 1, "imgsz": 480, "jpeg_quality": 65},
+    {"frame_skip": 1, "imgsz": 320, "jpeg_quality": 60},
+    {"frame_skip": 2, "imgsz": 320, "jpeg_quality": 50}
+]
+
+# Live-view resolution/quality ladder (?profile= on /stream/live, /stream/frame, /stream/mjpeg)
+STREAM_PROFILES = {
+    "thumb": {"width": 160, "jpeg_quality": 50, "labels": False},  # Grid views / very weak Wi-Fi
+    "low": {"width": 320, "jpeg_quality": 60, "labels": True},  # Phones on weak Wi-Fi
+    "high": {"width": None, "jpeg_quality": None, "labels": True}  # Full frame, rate controller quality
+}
+DEFAULT_STREAM_PROFILE = "high"
+
+# Binary live-frame endpoint (/stream/frame)
+LONG_POLL_MAX_SECONDS = 10.0  # Upper bound for ?wait=
+BOOT_ID = format(int(time.time()), "x")  # Keeps ETags from matching across server restarts
+
+# Detection/recording/proximity event channel (/events, Server-Sent Events)
+EVENT_TYPES = ("detections", "recording", "proximity")
+EVENT_BOX_INTERVAL_SECONDS = 0.5  # Box-only movement is sent at most this often (count changes go at once)
+EVENT_DISTANCE_STEP = 0.1  # Beacon distance is reported in 0.1 m steps
+EVENT_HEARTBEAT_SECONDS = 15.0  # Keep-alive comment on idle connections
+SSE_RETRY = b"retry: 2000\n\n"  # Browser reconnect delay (ms)
+SSE_KEEP_ALIVE = b": keep-alive\n\n"
+
+# Inference statistics (reported by /health)
+inference_stats = {
+    "batches": 0,
+    "frames": 0,
+    "last_batch_size": 0,
+    "avg_batch_size": 0.0,
+    "avg_inference_ms_per_frame": 0.0,
+    "avg_frame_latency_ms": 0.0,
+    "last_batch_at": 0.0
+}
 
 # ESP32 MOTOR CONTROL - Commented out (see hardware_part/esp32_motor_control folder)
 # esp32_connection = None
 # ESP32_ENABLED = False  # Set to True when ESP32 is connected
 
 
+class MotionGate:
+    """Cheap downscaled frame-differencing pre-filter in front of model.predict"""
+    
+    def __init__(self):
+        self.reference = None  # Downscaled grey frame from the last full inference
+        self.last_inference_time = 0.0
+        self.frames_checked = 0
+        self.frames_skipped = 0
+        self.check_time = 0.0  # Total seconds spent in the gate itself
+    
+    def needs_inference(self, frame, now):
+        """True if the scene changed since the last inference (or the forced interval elapsed)"""
+        start = time.time()
+        small = cv2.resize(frame, MOTION_DOWNSCALE_SIZE, interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+        
+        if self.reference is None or self.reference.shape != gray.shape:
+            changed = True
+        else:
+            diff = cv2.absdiff(gray, self.reference)
+            moving = cv2.countNonZero(cv2.threshold(diff, MOTION_PIXEL_THRESHOLD, 255, cv2.THRESH_BINARY)[1])
+            changed = moving >= MOTION_AREA_THRESHOLD * gray.size
+        
+        forced = now - self.last_inference_time >= MOTION_MAX_SKIP_SECONDS
+        run_inference = changed or forced
+        
+        # Compare against the frame that was last inferred, so slow changes still add up
+        if run_inference:
+            self.reference = gray
+            self.last_inference_time = now
+        else:
+            self.frames_skipped += 1
+        
+        self.frames_checked += 1
+        self.check_time += time.time() - start
+        return run_inference
+
+
+class AdaptiveController:
+    """
+    Measures per-stage latency and steps along OPERATING_LADDER (frame skip,
+    imgsz, JPEG quality) to hold end-to-end latency near LATENCY_TARGET_MS.
+    """
+    
+    def __init__(self):
+        self.level = 0
+        self.stage_ms = {}  # Exponential moving average per stage
+        self.last_adjust_time = time.time()
+        self.adjustments = 0
+    
+    @property
+    def operating_point(self):
+        """Current frame_skip / imgsz / jpeg_quality"""
+        return OPERATING_LADDER[self.level if ADAPTIVE_CONTROL else 0]
+    
+    def record(self, stage, seconds):
+        """Add one latency sample (seconds) for a pipeline stage"""
+        ms = seconds * 1000.0
+        previous = self.stage_ms.get(stage)
+        self.stage_ms[stage] = ms if previous is None else previous + 0.2 * (ms - previous)
+    
+    def maybe_adjust(self, now):
+        """Move one rung down the ladder when over budget, one rung up when well under"""
+        if not ADAPTIVE_CONTROL or now - self.last_adjust_time < CONTROLLER_INTERVAL_SECONDS:
+            return
+        
+        latency = self.stage_ms.get("end_to_end")
+        if latency is None:
+            return
+        
+        new_level = self.level
+        if latency > LATENCY_TARGET_MS and self.level < len(OPERATING_LADDER) - 1:
+            new_level = self.level + 1
+        elif latency < LATENCY_TARGET_MS * CONTROLLER_RECOVER_RATIO and self.level > 0:
+            new_level = self.level - 1
+        
+        self.last_adjust_time = now
+        if new_level != self.level:
+            self.level = new_level
+            self.adjustments += 1
+            point = OPERATING_LADDER[new_level]
+            print(f"🎛️  Latency {latency:.0f} ms (target {LATENCY_TARGET_MS} ms) -> level {new_level}: "
+                  f"skip {point['frame_skip']}, imgsz {point['imgsz']}, JPEG q{point['jpeg_quality']}")
+    
+    def get_status(self):
+        """Operating point and stage latencies for /health"""
+        return {
+            "enabled": ADAPTIVE_CONTROL,
+            "latency_target_ms": LATENCY_TARGET_MS,
+            "level": self.level if ADAPTIVE_CONTROL else 0,
+            "max_level": len(OPERATING_LADDER) - 1,
+            "operating_point": self.operating_point,
+            "stage_ms": {stage: round(ms, 2) for stage, ms in self.stage_ms.items()},
+            "adjustments": self.adjustments
+        }
+
+
+rate_controller = AdaptiveController()
+
+
+def box_iou(box_a, box_b):
+    """Intersection-over-union of two [x1, y1, x2, y2] boxes"""
+    inter_w = min(box_a[2], box_b[2]) - max(box_a[0], box_b[0])
+    inter_h = min(box_a[3], box_b[3]) - max(box_a[1], box_b[1])
+    if inter_w <= 0 or inter_h <= 0:
+        return 0.0
+    intersection = inter_w * inter_h
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    return intersection / (area_a + area_b - intersection + 1e-9)
+
+
+class BoxTracker:
+    """
+    Carries detector boxes forward between detector frames with sparse optical flow.
+    
+    After each detector frame the new boxes are IoU-associated with the tracked ones:
+    good agreement lengthens the detect interval (up to TRACKING_MAX_INTERVAL), poor
+    agreement shortens it. A drop in flow confidence forces an early re-detect.
+    """
+    
+    def __init__(self):
+        self.prev_gray = None
+        self.scale = 1.0  # Flow frame pixels per original frame pixel
+        self.tracks = []
+        self.detect_interval = TRACKING_MIN_INTERVAL
+        self.frames_since_detection = 0
+        self.force_detect = True
+        self.confidence = 1.0
+        self.frames_tracked = 0
+        self.frames_detected = 0
+        self.early_redetects = 0
+    
+    def to_flow_gray(self, frame):
+        """Downscaled grey copy of the frame used for optical flow"""
+        height, width = frame.shape[:2]
+        self.scale = min(1.0, TRACKING_FLOW_WIDTH / width)
+        if self.scale < 1.0:
+            frame = cv2.resize(frame, (int(width * self.scale), int(height * self.scale)), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    
+    def can_track(self):
+        """True if this frame can use tracked boxes instead of the detector"""
+        return (
+            self.prev_gray is not None
+            and not self.force_detect
+            and self.frames_since_detection + 1 < self.detect_interval
+        )
+    
+    def update(self, frame, detections):
+        """Reset tracks from a detector frame and adapt the detect interval"""
+        # IoU association: how well did the tracked boxes predict this detection?
+        if self.tracks and self.frames_since_detection > 0:
+            ious = []
+            for det in detections:
+                candidates = [box_iou(det["bbox"], t["bbox"]) for t in self.tracks if t["class"] == det["class"]]
+                ious.append(max(candidates, default=0.0))
+            matched_well = (
+                len(detections) == len(self.tracks)
+                and all(iou >= TRACKING_GOOD_IOU for iou in ious)
+            )
+            if matched_well:
+                self.detect_interval = min(TRACKING_MAX_INTERVAL, self.detect_interval + 1)
+            else:
+                self.detect_interval = max(TRACKING_MIN_INTERVAL, self.detect_interval // 2)
+        
+        self.prev_gray = self.to_flow_gray(frame)
+        self.tracks = [dict(det) for det in detections]
+        self.frames_since_detection = 0
+        self.force_detect = False
+        self.confidence = 1.0
+        self.frames_detected += 1
+    
+    def track(self, frame):
+        """Move each tracked box by the median optical flow of points inside it"""
+        gray = self.to_flow_gray(frame)
+        self.frames_since_detection += 1
+        self.frames_tracked += 1
+        
+        if not self.tracks or gray.shape != self.prev_gray.shape:
+            self.prev_gray = gray
+            return [dict(t, tracked=True) for t in self.tracks]
+        
+        height, width = gray.shape
+        confidences = []
+        for t in self.tracks:
+            x1, y1, x2, y2 = (int(round(v * self.scale)) for v in t["bbox"])
+            x1, y1 = max(0, x1), max(0, y1)
+            x2, y2 = min(width, x2), min(height, y2)
+            if x2 - x1 < 4 or y2 - y1 < 4:
+                confidences.append(0.0)
+                continue
+            
+            points = cv2.goodFeaturesToTrack(self.prev_gray[y1:y2, x1:x2], maxCorners=20, qualityLevel=0.01, minDistance=3)
+            if points is None or len(points) < 3:
+                # Textureless box: trust it only while the region stays unchanged
+                diff = cv2.absdiff(self.prev_gray[y1:y2, x1:x2], gray[y1:y2, x1:x2])
+                confidences.append(1.0 if float(diff.mean()) < MOTION_PIXEL_THRESHOLD else 0.0)
+                continue
+            points = (points + np.float32([x1, y1])).astype(np.float32)
+            
+            # Forward-backward check rejects points the flow could not follow
+            forward, status, _ = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, points, None, winSize=(15, 15), maxLevel=2)
+            backward, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, self.prev_gray, forward, None, winSize=(15, 15), maxLevel=2)
+            fb_error = np.linalg.norm((points - backward).reshape(-1, 2), axis=1)
+            good = (status.ravel() == 1) & (back_status.ravel() == 1) & (fb_error < 1.0)
+            confidences.append(good.mean())
+            
+            if good.sum() >= 3:
+                dx, dy = np.median((forward - points).reshape(-1, 2)[good], axis=0) / self.scale
+                t["bbox"] = [t["bbox"][0] + dx, t["bbox"][1] + dy, t["bbox"][2] + dx, t["bbox"][3] + dy]
+        
+        self.prev_gray = gray
+        self.confidence = float(min(confidences))
+        if self.confidence < TRACKING_MIN_CONFIDENCE:
+            # Tracking is losing the objects - run the detector on the next frame
+            self.force_detect = True
+            self.early_redetects += 1
+            self.detect_interval = max(TRACKING_MIN_INTERVAL, self.detect_interval // 2)
+        
+        return [dict(t, bbox=[round(v, 1) for v in t["bbox"]], tracked=True) for t in self.tracks]
+
+
+class PrerollBuffer:
+    """
+    Ring buffer of one camera's most recent uploads, kept as the compressed JPEG
+    bytes (tens of KB per frame instead of ~1 MB decoded). Bounded by both
+    PREROLL_SECONDS and PREROLL_MAX_BYTES; frames are only decoded when a clip starts.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.frames = deque()  # (received_at, jpeg bytes), oldest first
+        self.bytes = 0
+        self.frames_evicted = 0
+        self.frames_flushed = 0  # Written into clips
+    
+    def add(self, received_at, jpeg_data):
+        """Append one upload (no copy - the request body is kept as is) and evict old frames"""
+        if PREROLL_SECONDS <= 0:
+            if self.frames:
+                self.clear()
+            return
+        with self.lock:
+            self.frames.append((received_at, jpeg_data))
+            self.bytes += len(jpeg_data)
+            oldest_allowed = received_at - PREROLL_SECONDS
+            while self.frames and (self.frames[0][0] < oldest_allowed or self.bytes > PREROLL_MAX_BYTES):
+                _, old = self.frames.popleft()
+                self.bytes -= len(old)
+                self.frames_evicted += 1
+    
+    def snapshot(self, after, before):
+        """Buffered frames received in (after, before), oldest first"""
+        with self.lock:
+            return [(t, data) for t, data in self.frames if after < t < before]
+    
+    def count_flushed(self, written):
+        """Called by the writer thread with the frames a snapshot actually added to a clip"""
+        with self.lock:
+            self.frames_flushed += written
+    
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.bytes = 0
+    
+    def get_stats(self):
+        with self.lock:
+            seconds = self.frames[-1][0] - self.frames[0][0] if len(self.frames) > 1 else 0.0
+            return {
+                "frames": len(self.frames),
+                "bytes": self.bytes,
+                "seconds": round(seconds, 2),
+                "frames_evicted": self.frames_evicted,
+                "frames_flushed": self.frames_flushed
+            }
+
+
+class EncodedFrameCache:
+    """
+    Annotated JPEG (and base64) encodings of one camera's latest frame.
+    
+    Annotation is lazy: boxes are only drawn when a client asks for the frame,
+    once per frame_seq and stream profile rung, into canvases reused across
+    frames (smaller rungs are downscaled first, then drawn). Encodings are keyed
+    by rung and quality and invalidated when frame_seq changes, so each new
+    frame is scaled and encoded at most once per rung no matter how many
+    clients poll, and nothing is drawn or encoded while nobody is watching.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seq = None
+        self.entries = {}
+        self.canvases = {}  # (width, labels) -> (frame_seq, reused annotation buffer)
+        self.rendered_seq = None
+        self.frames_rendered = 0  # Distinct frames annotated for at least one client
+        self.renders = 0
+        self.encodes = 0
+        self.hits = 0
+    
+    def render(self, seq, frame, detections, width, labels):
+        """The frame at the rung's width with boxes drawn, in a reused canvas (lock held)"""
+        height, frame_width = frame.shape[:2]
+        if width is None or width >= frame_width:
+            width = frame_width
+        
+        key = (width, labels)
+        cached = self.canvases.get(key)
+        if cached is not None and cached[0] == seq:
+            return cached[1]
+        
+        size = (width, max(1, int(round(height * width / frame_width))))
+        canvas = cached[1] if cached is not None else None
+        if canvas is None or canvas.shape[:2] != (size[1], size[0]):
+            canvas = np.empty((size[1], size[0]) + frame.shape[2:], frame.dtype)
+        
+        if width == frame_width:
+            np.copyto(canvas, frame)
+        else:
+            cv2.resize(frame, size, dst=canvas, interpolation=cv2.INTER_AREA)
+        draw_detections(canvas, detections, scale=width / frame_width, labels=labels)
+        
+        self.canvases[key] = (seq, canvas)
+        self.renders += 1
+        if self.rendered_seq != seq:
+            self.rendered_seq = seq
+            self.frames_rendered += 1
+        return canvas
+    
+    def get(self, state, variant, as_base64=False):
+        """Return (frame_seq, encoded bytes or base64 str) of the latest frame for a stream variant"""
+        latest = state["latest_result"]
+        if latest is None:
+            return None, None
+        seq, frame, detections = latest
+        
+        _, width, quality, labels = variant
+        key = (width, quality, labels, as_base64)
+        with self.lock:
+            if seq != self.seq:
+                self.seq = seq
+                self.entries = {}
+            
+            data = self.entries.get(key)
+            if data is not None:
+                self.hits += 1
+                return seq, data
+            
+            jpeg_key = (width, quality, labels, False)
+            jpeg_bytes = self.entries.get(jpeg_key)
+            if jpeg_bytes is None:
+                canvas = self.render(seq, frame, detections, width, labels)
+                jpeg_bytes = encode_jpeg(canvas, quality).tobytes()
+                self.entries[jpeg_key] = jpeg_bytes
+                self.encodes += 1
+            
+            data = base64.b64encode(jpeg_bytes).decode('utf-8') if as_base64 else jpeg_bytes
+            self.entries[key] = data
+            return seq, data
+
+
+class Subscription:
+    """
+    Wake-up signal for one subscriber, waited on by a request thread (threaded
+    mode) or a coroutine on the ASGI event loop (loop given at subscribe time).
+    Publishers on camera/inference threads call notify().
+    """
+    
+    def __init__(self, loop=None):
+        self.event = threading.Event()
+        self.loop = loop
+        self.async_event = asyncio.Event() if loop is not None else None
+    
+    def notify(self):
+        self.event.set()
+        if self.loop is not None:
+            try:
+                self.loop.call_soon_threadsafe(self.async_event.set)
+            except RuntimeError:
+                pass  # Event loop already closed (server shutting down)
+    
+    def wait_signal(self, timeout):
+        """Block the calling thread until notified; False on timeout"""
+        if not self.event.wait(timeout):
+            return False
+        self.event.clear()
+        return True
+    
+    async def wait_signal_async(self, timeout):
+        """Await notification on the event loop; False on timeout"""
+        try:
+            await asyncio.wait_for(self.async_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.async_event.clear()
+        self.event.clear()
+        return True
+
+
+class FrameSubscription(Subscription):
+    """One live-view client: a latest-only slot plus delivery/drop counters"""
+    
+    def __init__(self, subscriber_id, device_id, client, loop=None):
+        super().__init__(loop)
+        self.id = subscriber_id
+        self.device_id = device_id  # None = follow the default camera
+        self.client = client
+        self.connected_at = time.time()
+        self.pending = None  # Device state with an undelivered frame
+        self.delivered = 0
+        self.dropped = 0
+    
+    def take(self):
+        state, self.pending = self.pending, None
+        if state is not None:
+            self.delivered += 1
+        return state
+    
+    def wait(self, timeout):
+        """Block until a new frame is published (or timeout); returns the device state or None"""
+        return self.take() if self.wait_signal(timeout) else None
+    
+    async def wait_async(self, timeout):
+        """wait() for ASGI handlers"""
+        return self.take() if await self.wait_signal_async(timeout) else None
+
+
+class FrameBus:
+    """
+    Publishes new annotated frames to live-view subscribers.
+    
+    Each subscriber has a single latest-only slot: if a client has not consumed the
+    previous frame when a new one arrives, the old one is replaced and counted as
+    dropped, so slow clients skip frames instead of building up latency.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.next_id = 1
+    
+    def subscribe(self, device_id=None, client=None, loop=None):
+        with self.lock:
+            subscription = FrameSubscription(self.next_id, device_id, client, loop)
+            self.subscribers[subscription.id] = subscription
+            self.next_id += 1
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.pop(subscription.id, None)
+    
+    def publish(self, state):
+        """Wake the subscribers following this camera"""
+        default_state = resolve_device_state()
+        with self.lock:
+            subscriptions = list(self.subscribers.values())
+        
+        for subscription in subscriptions:
+            follows = subscription.device_id == state["device_id"] or (
+                subscription.device_id is None and state is default_state
+            )
+            if not follows:
+                continue
+            if subscription.pending is not None:
+                subscription.dropped += 1
+            subscription.pending = state
+            subscription.notify()
+    
+    def get_stats(self):
+        """Connected subscribers with per-client delivery and drop counts"""
+        now = time.time()
+        with self.lock:
+            subscriptions = list(self.subscribers.values())
+        return {
+            "subscribers": len(subscriptions),
+            "clients": [
+                {
+                    "id": sub.id,
+                    "device": sub.device_id,
+                    "client": sub.client,
+                    "delivered": sub.delivered,
+                    "dropped": sub.dropped,
+                    "connected_seconds": round(now - sub.connected_at, 1)
+                }
+                for sub in subscriptions
+            ]
+        }
+
+
+frame_bus = FrameBus()
+
+detection_log = DetectionLog(
+    DETECTION_LOG_PATH,
+    flush_seconds=DETECTION_LOG_FLUSH_SECONDS,
+    max_pending_frames=DETECTION_LOG_MAX_PENDING,
+    retention_days=DETECTION_LOG_RETENTION_DAYS
+)
+
+
+class EventSubscription(Subscription):
+    """One /events client: latest pending event per (type, device) plus counters"""
+    
+    def __init__(self, subscriber_id, device_id, types, client, loop=None):
+        super().__init__(loop)
+        self.id = subscriber_id
+        self.device_id = device_id  # None = all cameras
+        self.types = types
+        self.client = client
+        self.connected_at = time.time()
+        self.lock = threading.Lock()
+        self.pending = {}  # (type, device) -> (event id, encoded message)
+        self.delivered = 0
+        self.coalesced = 0
+    
+    def follows(self, event_type, device_id):
+        if event_type not in self.types:
+            return False
+        # Proximity events (device None) go to everyone
+        return self.device_id is None or device_id is None or device_id == self.device_id
+    
+    def offer(self, key, event_id, message):
+        """Queue an event, replacing an unsent one for the same (type, device)"""
+        with self.lock:
+            if key in self.pending:
+                self.coalesced += 1
+            self.pending[key] = (event_id, message)
+        self.notify()
+    
+    def take(self):
+        with self.lock:
+            messages = [message for _, message in sorted(self.pending.values())]
+            self.pending = {}
+        self.delivered += len(messages)
+        return messages
+    
+    def wait(self, timeout):
+        """Block until events are pending (or timeout); returns encoded messages in publish order"""
+        return self.take() if self.wait_signal(timeout) else []
+    
+    async def wait_async(self, timeout):
+        """wait() for ASGI handlers"""
+        return self.take() if await self.wait_signal_async(timeout) else []
+
+
+class EventBus:
+    """
+    Pushes compact state-change events to /events subscribers.
+    
+    An event is only published when its payload differs from the last one sent
+    for the same (type, device), and is encoded once for all subscribers. Each
+    subscriber keeps one pending slot per (type, device), so a slow client gets
+    the latest state instead of a growing backlog. Nothing here touches frames.
+    """
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.next_id = 1
+        self.event_id = 0
+        self.last_events = {}  # (type, device) -> (payload, event id, encoded message)
+        self.published = 0
+        self.suppressed = 0
+    
+    def subscribe(self, device_id=None, types=EVENT_TYPES, client=None, loop=None):
+        """Register a subscriber, pre-loaded with the current state as a snapshot"""
+        with self.lock:
+            subscription = EventSubscription(self.next_id, device_id, types, client, loop)
+            self.subscribers[subscription.id] = subscription
+            self.next_id += 1
+            snapshot = list(self.last_events.items())
+        
+        for key, (_, event_id, message) in snapshot:
+            if subscription.follows(*key):
+                subscription.offer(key, event_id, message)
+        return subscription
+    
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscribers.pop(subscription.id, None)
+    
+    def publish(self, event_type, device_id, payload):
+        """Send payload if it changed since the last event of this type for this device"""
+        key = (event_type, device_id)
+        with self.lock:
+            last = self.last_events.get(key)
+            if last is not None and last[0] == payload:
+                self.suppressed += 1
+                return False
+            
+            self.event_id += 1
+            data = dict(payload, device=device_id, timestamp=round(time.time(), 3))
+            message = (
+                f"id: {self.event_id}\nevent: {event_type}\n"
+                f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+            ).encode('utf-8')
+            self.last_events[key] = (payload, self.event_id, message)
+            self.published += 1
+            event_id = self.event_id
+            subscriptions = list(self.subscribers.values())
+        
+        for subscription in subscriptions:
+            if subscription.follows(event_type, device_id):
+                subscription.offer(key, event_id, message)
+        return True
+    
+    def get_stats(self):
+        """Subscriber count and publish/suppress/coalesce totals"""
+        with self.lock:
+            subscriptions = list(self.subscribers.values())
+        return {
+            "subscribers": len(subscriptions),
+            "published": self.published,
+            "suppressed": self.suppressed,
+            "delivered": sum(sub.delivered for sub in subscriptions),
+            "coalesced": sum(sub.coalesced for sub in subscriptions)
+        }
+
+
+event_bus = EventBus()
+
+
+def publish_detection_event(state, now):
+    """
+    Detections event for one camera: sent at once when class counts change,
+    otherwise (boxes moving) at most every EVENT_BOX_INTERVAL_SECONDS.
+    """
+    detections = state["detections"]
+    counts = {
+        "human": sum(1 for det in detections if det["class"] == "human"),
+        "cat": sum(1 for det in detections if det["class"] == "cat")
+    }
+    if counts == state["event_counts"] and now - state["last_detection_event"] < EVENT_BOX_INTERVAL_SECONDS:
+        return
+    
+    state["event_counts"] = counts
+    state["last_detection_event"] = now
+    event_bus.publish("detections", state["device_id"], {
+        "counts": counts,
+        "both_detected": counts["human"] > 0 and counts["cat"] > 0,
+        "detections": compact_detection_list(detections)
+    })
+
+
+def publish_recording_event(state):
+    """Recording event for one camera (start/stop/new segment, trigger and file name)"""
+    clip = state["clip"]
+    event_bus.publish("recording", state["device_id"], {
+        "is_recording": state["is_recording"],
+        "trigger": state["recording_trigger"],
+        "current_video": state["current_filename"],
+        "event_id": clip["event_id"] if clip else None,
+        "segment": clip["segment"] if clip else None
+    })
+
+
+def publish_proximity_event():
+    """Proximity event (shared beacon), distance rounded to EVENT_DISTANCE_STEP"""
+    event_bus.publish("proximity", None, {
+        "distance": round(round(proximity_state["distance"] / EVENT_DISTANCE_STEP) * EVENT_DISTANCE_STEP, 2),
+        "is_close": proximity_state["is_close"],
+        "alert_active": proximity_state["proximity_alert_active"],
+        "recording": proximity_state["proximity_recording"]
+    })
+
+
+def create_device_state(device_id):
+    """Create the per-camera state (frame slot, detection state, recorder)"""
+    return {
+        "device_id": device_id,
+        "frame_queue": queue.Queue(maxsize=1),  # Keep only latest frame (prevents lag)
+        "decode_lock": threading.Lock(),  # Held while a decode for this camera is in flight
+        "video_write_queue": queue.Queue(),  # Clip items for the writer thread (see queue_clip_frame)
+        "write_queue_lock": threading.Lock(),
+        "write_queue_bytes": 0,  # Frame memory queued, capped at RECORDING_QUEUE_MAX_BYTES
+        "recording_lock": threading.RLock(),  # Serialises start / stop / segment rotation
+        "is_recording": False,
+        "recording_trigger": None,  # "ai" or "proximity"
+        "clip": None,  # Current clip (writer, counters, summary) - see start_recording
+        "current_filename": None,
+        "preroll": PrerollBuffer(),  # Last PREROLL_SECONDS of uploads (ESP32 JPEG bytes)
+        "frame_received_at": None,  # Upload time of the frame being processed (pre-roll cut-off)
+        "recording_stopped_at": 0.0,
+        "last_detection_time": time.time(),
+        "both_detected": False,
+        "latest_frame": None,
+        "latest_result": None,  # (frame_seq, frame, detections), annotated on demand by jpeg_cache
+        "frame_seq": 0,  # Incremented for every processed frame
+        "jpeg_cache": EncodedFrameCache(),
+        "detections": [],
+        "event_counts": None,  # Class counts in the last /events detections event
+        "last_detection_event": 0.0,
+        "frames_received": 0,
+        "frames_dropped": 0,
+        "frames_skipped": 0,  # Dropped by the rate controller's frame skip
+        "frames_processed": 0,
+        "decode_errors": 0,
+        "motion_gate": MotionGate(),
+        "tracker": BoxTracker(),
+        "last_frame_time": None
+    }
+
+
+def get_device_state(device_id, create=True):
+    """Look up a camera by ID, registering it (and its video writer) on first use"""
+    with devices_lock:
+        state = devices.get(device_id)
+        if state is not None or not create:
+            return state
+        
+        if len(devices) >= MAX_DEVICES:
+            return None
+        
+        state = create_device_state(device_id)
+        devices[device_id] = state
+    
+    # Each camera gets its own writer so one recording never blocks another
+    writer_thread = threading.Thread(target=video_writer_thread, args=(state,), daemon=True)
+    writer_thread.start()
+    print(f"📷 New camera registered: {device_id}")
+    return state
+
+
+def resolve_device_state(device_id=None):
+    """
+    Find the camera an API request refers to: ?device=<id>, else the only
+    registered camera. None if it is unknown, or if several cameras are
+    registered and the request names none (see ambiguous_device_error).
+    """
+    if device_id:
+        return get_device_state(device_id, create=False)
+    
+    with devices_lock:
+        if len(devices) == 1:
+            return next(iter(devices.values()))
+        return None
+
+
+def ambiguous_device_error(device_id=None):
+    """(body, 400) if several cameras are registered and the request does not pick one, else None"""
+    if device_id:
+        return None
+    with devices_lock:
+        if len(devices) < 2:
+            return None
+        device_ids = sorted(devices)
+    return {"error": "Several cameras connected - choose one with ?device=<id>", "devices": device_ids}, 400
+
+
+def list_device_states():
+    """Snapshot of all registered cameras"""
+    with devices_lock:
+        return list(devices.values())
+
+
 class CameraThread(threading.Thread):
     """Handles camera capture and detection in separate thread"""
     
@@ -110,11 +1047,13 @@ class CameraThread(threading.Thread):
         self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, 1280)
         self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 720)
         self.camera.set(cv2.CAP_PROP_FPS, 30)
+        self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # Don't let stale frames pile up in the driver
         
         print(f"✅ Camera opened: {self.camera.get(cv2.CAP_PROP_FRAME_WIDTH)}x{self.camera.get(cv2.CAP_PROP_FRAME_HEIGHT)}")
         
         self.running = True
         frame_count = 0
+        state = get_device_state(WEBCAM_DEVICE_ID)
         
         while self.running:
             ret, frame = self.camera.read()
@@ -126,52 +1065,33 @@ class CameraThread(threading.Thread):
             
             frame_count += 1
             
-            # Run detection
-            results = model.predict(
-                source=frame,
-                conf=CONFIDENCE_THRESHOLD,
-                iou=0.45,
-                verbose=False
-            )
-            
-            result = results[0]
-            boxes = result.boxes
-            
-            # Process detections
-            self.process_detections(frame, result)
+            # Run detection (or motion gate / tracker) and process detections
+            self.run_inference([(state, frame, time.time())])
             
-            # Small delay
-            time.sleep(0.01)
+            # Rate controller frame skip: grab() discards frames without decoding them
+            for _ in range(rate_controller.operating_point["frame_skip"]):
+                self.camera.grab()
+                state["frames_skipped"] += 1
         
         if self.camera:
             self.camera.release()
             print("📹 Webcam released")
     
     def run_esp32_mode(self):
-        """Use ESP32-S3 camera frames"""
+        """Use ESP32-S3 camera frames (shared inference scheduler for all boards)"""
         print("🔄 Waiting for ESP32-S3 frames...")
         frame_count = 0
         
         while self.running:
             try:
-                # Get frame from ESP32 queue (with timeout)
-                frame = esp32_frame_queue.get(timeout=1.0)
-                frame_count += 1
-                
-                # Run detection directly (no enhancement for max speed)
-                results = model.predict(
-                    source=frame,
-                    conf=CONFIDENCE_THRESHOLD,
-                    iou=0.45,
-                    imgsz=640,
-                    half=False,  # FP16 disabled for CPU (use half=True on GPU)
-                    verbose=False
+                # Collect up to INFERENCE_BATCH_SIZE frames round-robin across cameras
+                batch = collect_frame_batch(
+                    INFERENCE_BATCH_SIZE,
+                    INFERENCE_BATCH_WAIT_MS / 1000.0
                 )
+                frame_count += len(batch)
                 
-                result = results[0]
-                
-                # Process detections
-                self.process_detections(frame, result)
+                self.run_inference(batch)
                 
             except queue.Empty:
                 # No frame received from ESP32
@@ -184,63 +1104,122 @@ class CameraThread(threading.Thread):
         
         print("📹 ESP32 camera thread stopped")
     
-    def process_detections(self, frame, result):
-        """Process YOLOv8 detection results"""
-        boxes = result.boxes
+    def run_inference(self, batch):
+        """Run one batch of (state, frame, received_at) through motion gate, tracker and detector"""
+        now = time.time()
+        to_detect = []
         
-        # Parse detections
-        detections = []
-        has_human = False
-        has_cat = False
+        for state, frame, received_at in batch:
+            rate_controller.record("queue", now - received_at)
+            
+            # Static scene: reuse previous detections instead of running the model
+            if MOTION_GATING and not state["motion_gate"].needs_inference(frame, now):
+                self.process_detections(state, frame, state["detections"], source="reuse", received_at=received_at)
+            # Between detector frames: carry boxes forward with the tracker
+            elif TRACKING_ENABLED and state["tracker"].can_track():
+                self.process_detections(
+                    state, frame, state["tracker"].track(frame), source="tracker", received_at=received_at
+                )
+            else:
+                to_detect.append((state, frame, received_at))
         
-        for box in boxes:
-            cls = int(box.cls[0])
-            conf = float(box.conf[0])
-            class_name = "human" if cls == 0 else "cat"
+        if to_detect:
+            frames = [frame for _, frame, _ in to_detect]
             
-            detections.append({
-                "class": class_name,
-                "confidence": conf,
-                "bbox": box.xyxy[0].tolist()
-            })
+            # Run detection on the whole batch in one call (no enhancement for max speed)
+            inference_start = time.time()
+            batch_detections = model.predict(
+                frames,
+                conf=CONFIDENCE_THRESHOLD,
+                iou=0.45,
+                imgsz=rate_controller.operating_point["imgsz"]
+            )
+            inference_time = time.time() - inference_start
+            rate_controller.record("inference", inference_time / len(to_detect))
+            
+            # Hand each result back to its own camera
+            process_start = time.time()
+            for (state, frame, received_at), detections in zip(to_detect, batch_detections):
+                self.process_detections(state, frame, detections, received_at=received_at)
+            rate_controller.record("process", (time.time() - process_start) / len(to_detect))
             
-            if class_name == "human":
-                has_human = True
-            elif class_name == "cat":
-                has_cat = True
+            update_inference_stats(
+                len(to_detect),
+                inference_time,
+                [time.time() - received_at for _, _, received_at in to_detect]
+            )
         
-        # Create annotated frame for display (ALWAYS show stream)
-        annotated_frame = result.plot()
+        done_time = time.time()
+        for _, _, received_at in batch:
+            rate_controller.record("end_to_end", done_time - received_at)
+        rate_controller.maybe_adjust(done_time)
+    
+    def process_detections(self, state, frame, detections, source="detector", received_at=None):
+        """
+        Process detection results (compact detection list) for one camera.
+        
+        source is "detector" for model output, "tracker" for boxes carried forward
+        between detector frames, or "reuse" when the motion gate skipped the frame.
+        Recording decisions run for every frame regardless of source.
+        received_at (upload time) marks where a new clip's pre-roll ends.
+        """
+        state["frame_received_at"] = received_at
+        if source == "detector" and TRACKING_ENABLED:
+            state["tracker"].update(frame, detections)
         
-        # Store latest frames (direct assignment, no extra copy)
-        recording_state["latest_frame"] = frame
-        recording_state["latest_annotated_frame"] = annotated_frame
-        recording_state["detections"] = detections
+        has_human = any(det["class"] == "human" for det in detections)
+        has_cat = any(det["class"] == "cat" for det in detections)
+        
+        # Store latest frame (direct assignment, no extra copy). Boxes are drawn
+        # lazily by jpeg_cache when a live-view client actually asks for the frame.
+        state["latest_frame"] = frame
+        state["detections"] = detections
+        state["frame_seq"] += 1
+        state["latest_result"] = (state["frame_seq"], frame, detections)
+        frame_bus.publish(state)
+        now = time.time()
+        publish_detection_event(state, now)
+        if detections:
+            detection_log.log(state["device_id"], state["frame_seq"], now, detections, source)
+        state["frames_processed"] += 1
         
         # Update recording state for AI detection
         both_present = has_human and has_cat
         
         if both_present:
-            recording_state["last_detection_time"] = time.time()
-            recording_state["both_detected"] = True
+            state["last_detection_time"] = time.time()
+            state["both_detected"] = True
             
             # Only start AI detection recording if proximity recording is not active
-            if not recording_state["is_recording"] and not proximity_state["proximity_recording"]:
-                recording_state["is_recording"] = True
-                start_recording(frame.shape)
-                print("🔴 AI Recording STARTED - Cat and Human detected!")
+            if not state["is_recording"] and not proximity_state["proximity_recording"]:
+                with state["recording_lock"]:
+                    if not state["is_recording"]:
+                        state["is_recording"] = True
+                        state["recording_trigger"] = "ai"
+                        start_recording(state, frame.shape)
+                        print(f"🔴 AI Recording STARTED on {state['device_id']} - Cat and Human detected!")
         
         # Queue frame for recording (works for both AI and proximity recording)
-        if recording_state["is_recording"]:
-            try:
-                # Use put_nowait to avoid blocking if queue is full
-                video_write_queue.put_nowait(frame.copy())
-            except queue.Full:
-                pass  # Skip frame if queue full (prevents lag)
+        clip = state["clip"]
+        if state["is_recording"] and clip is not None:
+            if SEGMENT_SECONDS and now - clip["started_at"] >= SEGMENT_SECONDS:
+                # Continue the same event in a new file (a crash loses at most one segment).
+                # A stop from another thread may have won the race: then there is nothing to rotate.
+                with state["recording_lock"]:
+                    if state["clip"] is clip and state["is_recording"]:
+                        clip = start_recording(state, frame.shape, previous=clip)
+            summary = clip["summary"]
+            summary["max_humans"] = max(summary["max_humans"], sum(1 for det in detections if det["class"] == "human"))
+            summary["max_cats"] = max(summary["max_cats"], sum(1 for det in detections if det["class"] == "cat"))
+            if both_present:
+                summary["detection_frames"] += 1
+            # Passthrough clips are fed by ingest_frame with the original JPEG bytes
+            if clip["mode"] != "passthrough":
+                queue_clip_frame(state, clip, state["frame_received_at"] or now, frame, frame.nbytes)
         
         # Check for timeout (only for AI detection recording)
-        if recording_state["is_recording"] and not proximity_state["proximity_recording"]:
-            check_recording_timeout()
+        if state["is_recording"] and state["recording_trigger"] == "ai":
+            check_recording_timeout(state)
     
     def enhance_frame(self, frame):
         """Enhance ESP32 frame quality for better AI detection (ultra-fast version)"""
@@ -259,153 +1238,813 @@ class CameraThread(threading.Thread):
         self.running = False
 
 
-def video_writer_thread():
-    """Background thread for writing video frames (non-blocking)"""
-    print("📹 Video writer thread started")
-    frames_written = 0
+# Round-robin start position so no camera is always first in a batch
+scheduler_offset = 0
+
+
+def collect_frame_batch(max_size, max_wait):
+    """
+    Collect up to max_size (state, frame, received_at) items across all cameras.
+    
+    Cameras are visited round-robin, taking at most one frame per camera per pass,
+    so a fast camera cannot crowd out the others. Waits at most max_wait after the
+    first frame; raises queue.Empty if no camera delivers a frame within 1 second.
+    """
+    global scheduler_offset
+    
+    batch = []
+    deadline = None
+    
+    with frame_ready:
+        while len(batch) < max_size:
+            states = list_device_states()
+            if states:
+                start = scheduler_offset % len(states)
+                states = states[start:] + states[:start]
+            
+            # One pass: take at most one frame from each camera
+            took_frame = False
+            for state in states:
+                try:
+                    frame, received_at = state["frame_queue"].get_nowait()
+                except queue.Empty:
+                    continue
+                batch.append((state, frame, received_at))
+                took_frame = True
+                if len(batch) >= max_size:
+                    break
+            
+            if len(batch) >= max_size or took_frame:
+                continue
+            
+            # Nothing ready - wait for the next frame (or the batch deadline)
+            if not batch:
+                if not frame_ready.wait(timeout=1.0):
+                    raise queue.Empty
+            else:
+                if deadline is None:
+                    deadline = time.time() + max_wait
+                remaining = deadline - time.time()
+                if remaining <= 0 or not frame_ready.wait(timeout=remaining):
+                    break
+    
+    scheduler_offset += 1
+    return batch
+
+
+def update_inference_stats(batch_size, inference_time, frame_latencies):
+    """Update running averages of batch size and per-frame latency"""
+    alpha = 0.1  # Exponential moving average weight
+    per_frame_ms = inference_time * 1000.0 / batch_size
+    latency_ms = sum(frame_latencies) * 1000.0 / len(frame_latencies)
+    
+    if inference_stats["batches"] == 0:
+        inference_stats["avg_batch_size"] = float(batch_size)
+        inference_stats["avg_inference_ms_per_frame"] = per_frame_ms
+        inference_stats["avg_frame_latency_ms"] = latency_ms
+    else:
+        inference_stats["avg_batch_size"] += alpha * (batch_size - inference_stats["avg_batch_size"])
+        inference_stats["avg_inference_ms_per_frame"] += alpha * (per_frame_ms - inference_stats["avg_inference_ms_per_frame"])
+        inference_stats["avg_frame_latency_ms"] += alpha * (latency_ms - inference_stats["avg_frame_latency_ms"])
+    
+    inference_stats["batches"] += 1
+    inference_stats["frames"] += batch_size
+    inference_stats["last_batch_size"] = batch_size
+    inference_stats["last_batch_at"] = time.time()
+
+
+def video_writer_thread(state):
+    """
+    Background thread writing one camera's clips (non-blocking for the camera).
+    
+    Queue items are (kind, clip, received_at, data, nbytes): "preroll" (buffered
+    uploads), "frame" (decoded frame, or JPEG bytes for passthrough clips) and
+    "stop" - the sentinel after a clip's last frame, which closes the file and
+    hands it to the finalize worker, so nothing queued before a stop is lost.
+    """
+    print(f"📹 Video writer thread started for {state['device_id']}")
     while True:
+        kind, clip, received_at, data, nbytes = state["video_write_queue"].get()
+        if nbytes:
+            with state["write_queue_lock"]:
+                state["write_queue_bytes"] -= nbytes
+        
         try:
-            # Wait for frames to write
-            frame = video_write_queue.get(timeout=1)
+            if clip["closed"]:
+                continue  # Straggler queued after the stop sentinel
+            writer = clip["writer"]
+            
+            if kind == "preroll":
+                # Buffered frames from before the trigger go first
+                if clip["mode"] == "passthrough":
+                    written = sum(writer.write(jpeg_data, t) for t, jpeg_data in data)
+                else:
+                    written = write_preroll(writer, data, clip["frame_shape"])
+                clip["frames_written"] += written
+                clip["preroll_frames"] = written
+                state["preroll"].count_flushed(written)
+                print(f"⏪ Pre-roll: {written} frames ({data[-1][0] - data[0][0]:.1f}s) "
+                      f"written to {clip['filename']}")
             
-            # Write frame if recorder is active
-            if recording_state["video_writer"]:
-                recording_state["video_writer"].write(frame)
-                frames_written += 1
-                if frames_written % 30 == 0:  # Log every 30 frames (~1 second)
-                    print(f"📹 Writing frames... ({frames_written} frames written)")
+            elif kind == "frame":
+                if clip["mode"] == "reencode":
+                    writer.write(data)
+                elif not writer.write(data, received_at):
+                    continue  # Already written as pre-roll
+                clip["frames_written"] += 1
+                if clip["frames_written"] % 30 == 0:  # Log every 30 frames (~1 second)
+                    print(f"📹 Writing frames... ({clip['frames_written']} frames written)")
             
-        except queue.Empty:
-            if frames_written > 0:
-                frames_written = 0  # Reset counter when idle
-            continue  # No frames to write, keep waiting
+            elif kind == "stop":
+                close_clip(clip)
+        
         except Exception as e:
             print(f"⚠️  Video write error: {e}")
+            if kind == "stop":
+                clip["closed"] = True
+                clip["done"].set()
 
 
-def cleanup_old_videos():
-    """Delete old videos, keep only the MAX_VIDEOS newest"""
+def queue_clip_frame(state, clip, received_at, data, nbytes):
+    """
+    Queue one frame for the clip's writer. Counts a drop instead when the writer
+    is already RECORDING_QUEUE_MAX_BYTES behind. Frames are queued by reference:
+    decoded frames are never modified after decode (overlays are drawn on copies).
+    """
+    mode = clip["mode"]
+    with state["write_queue_lock"]:
+        if clip["stopped"]:
+            # Rotated to a new segment since the caller looked: the frame belongs to that one
+            clip = state["clip"]
+            if clip is None or clip["mode"] != mode:
+                return False
+        if state["write_queue_bytes"] + nbytes > RECORDING_QUEUE_MAX_BYTES:
+            clip["frames_dropped"] += 1
+            return False
+        state["write_queue_bytes"] += nbytes
+        # Put under the lock so concurrent uploads stay in arrival order
+        state["video_write_queue"].put(("frame", clip, received_at, data, nbytes))
+    return True
+
+
+def close_clip(clip):
+    """Writer thread, at the stop sentinel: close the file, record it, hand it to the finalize worker"""
+    writer = clip["writer"]
+    writer.release()
+    clip["closed"] = True
+    print(f"💾 Saved video: {clip['filename']} ({clip['frames_written']} frames written, "
+          f"{clip['frames_dropped']} dropped)")
+    
+    video_path = clip["path"]
+    video_catalog.finish_recording(
+        clip["filename"],
+        clip["ended_at"],
+        clip["frames_written"],
+        clip["frames_dropped"],
+        video_path.stat().st_size if video_path.exists() else 0,
+        clip["summary"],
+        clip["preroll_frames"]
+    )
+    if clip["mode"] == "passthrough" and writer.width:
+        # Passthrough clips have the camera's native size (from the JPEG headers)
+        video_catalog.update(clip["filename"], width=writer.width, height=writer.height)
+    
+    # Timing/faststart rewrite and thumbnails run on the finalize worker, deletions on the retention worker
+    finalize_executor.submit(finalize_video, video_path, writer.frame_times if clip["mode"] == "ffmpeg" else None)
+    retention_wake.set()
+    clip["done"].set()
+
+
+def write_preroll(writer, preroll, frame_shape):
+    """Decode buffered pre-roll JPEGs and write them, sized to match the live frames"""
+    height, width = frame_shape[:2]
+    flags = DECODE_FLAGS.get(DECODE_REDUCED_FACTOR, cv2.IMREAD_COLOR)
+    written = 0
+    for received_at, jpeg_data in preroll:
+        frame = cv2.imdecode(np.frombuffer(jpeg_data, np.uint8), flags)
+        if frame is None:
+            continue
+        if frame.shape[:2] != (height, width):
+            frame = cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+        if isinstance(writer, FfmpegRecorder):
+            written += writer.write(frame, received_at)
+        else:
+            writer.write(frame)
+            written += 1
+    return written
+
+
+retention_wake = threading.Event()  # Set after each saved clip
+
+
+def enforce_retention():
+    """
+    Delete the oldest finished clips until the byte quota, maximum age and
+    (optional) count limit hold. Works from the catalog index, no directory scan.
+    """
     try:
-        videos = sorted(VIDEOS_DIR.glob("*.mp4"), key=lambda p: p.stat().st_ctime, reverse=True)
+        max_age = RETENTION_MAX_AGE_DAYS * 86400 if RETENTION_MAX_AGE_DAYS is not None else None
+        videos_to_delete = video_catalog.retention_candidates(
+            max_bytes=RETENTION_MAX_BYTES, max_age_seconds=max_age, keep=MAX_VIDEOS, now=time.time()
+        )
         
-        if len(videos) > MAX_VIDEOS:
-            videos_to_delete = videos[MAX_VIDEOS:]
-            for video in videos_to_delete:
-                video.unlink()
-                print(f"🗑️  Deleted old video: {video.name}")
-            
-            print(f"✅ Kept {min(len(videos), MAX_VIDEOS)} newest videos, deleted {len(videos_to_delete)} old ones")
+        freed = 0
+        for filename in videos_to_delete:
+            freed += delete_clip_files(filename)
+            print(f"🗑️  Deleted old video: {filename}")
+        
+        if videos_to_delete:
+            print(f"✅ Retention: deleted {len(videos_to_delete)} clips ({freed / 1e6:.1f} MB), "
+                  f"{video_catalog.total_size() / 1e6:.1f} MB in use")
+        return len(videos_to_delete)
     except Exception as e:
-        print(f"⚠️  Error cleaning up videos: {e}")
+        print(f"⚠️  Error enforcing video retention: {e}")
+        return 0
 
 
-def start_recording(frame_shape):
-    """Start a new video recording"""
+def retention_worker():
+    """Background thread: enforce retention after every saved clip and every RETENTION_INTERVAL_SECONDS"""
+    while True:
+        retention_wake.wait(RETENTION_INTERVAL_SECONDS)
+        retention_wake.clear()
+        enforce_retention()
+
+
+def delete_clip_files(filename):
+    """Remove a clip, its thumbnails and its catalog row; returns the bytes freed"""
+    video_path = VIDEOS_DIR / filename
+    size = video_path.stat().st_size if video_path.exists() else 0
+    video_path.unlink(missing_ok=True)
+    delete_thumbnails(filename)
+    video_catalog.remove(filename)
+    return size
+
+
+def start_recording(state, frame_shape, previous=None):
+    """
+    Start a new video recording for one camera. With previous (the current
+    clip), start the next segment of the same event and close the previous one.
+    Returns the new clip. Callers hold state["recording_lock"].
+    """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"interaction_{timestamp}.mp4"
+    if previous is not None:
+        mode = previous["mode"]  # Segments of one event share a format
+    else:
+        mode = RECORDING_MODE
+        if mode == "passthrough" and state["device_id"] == WEBCAM_DEVICE_ID:
+            mode = "reencode"  # Passthrough needs the camera's JPEG uploads
+        if mode == "ffmpeg" and not ffmpeg_available():
+            print("⚠️  ffmpeg not found - recording with OpenCV mp4v instead")
+            mode = "reencode"
+    extension = ".avi" if mode == "passthrough" else ".mp4"
+    filename = f"interaction_{timestamp}{extension}"
+    
+    # Prefix filenames with the camera when several record at the same time
+    if len(devices) > 1:
+        device_tag = "".join(c if c.isalnum() else "-" for c in state["device_id"])
+        filename = f"interaction_{device_tag}_{timestamp}{extension}"
     filepath = VIDEOS_DIR / filename
     
     height, width = frame_shape[:2]
-    fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-    fps = 30.0
+    if mode == "passthrough":
+        writer = MjpegAviWriter(filepath)
+        width, height = width * DECODE_REDUCED_FACTOR, height * DECODE_REDUCED_FACTOR
+    elif mode == "ffmpeg":
+        writer = FfmpegRecorder(
+            filepath, width, height, FFMPEG_ENCODER, FFMPEG_PRESET, FFMPEG_CRF, FFMPEG_BITRATE
+        )
+    else:
+        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
+        fps = 30.0
+        writer = cv2.VideoWriter(
+            str(filepath), fourcc, fps, (width, height)
+        )
     
-    recording_state["video_writer"] = cv2.VideoWriter(
-        str(filepath), fourcc, fps, (width, height)
+    # Everything about this clip travels with its queue items, so the writer thread
+    # can finish it while the camera already records the next one
+    clip = {
+        "filename": filename,
+        "path": filepath,
+        "event_id": previous["event_id"] if previous else filepath.stem,  # First segment's name
+        "segment": previous["segment"] + 1 if previous else 0,
+        "mode": mode,
+        "writer": writer,
+        "frame_shape": frame_shape,
+        "started_at": time.time(),
+        "ended_at": None,
+        "frames_written": 0,  # Writer thread
+        "frames_dropped": 0,  # Queue budget exceeded (camera/ingest threads)
+        "preroll_frames": 0,
+        "summary": {"max_humans": 0, "max_cats": 0, "detection_frames": 0},
+        "stopped": False,  # Stop sentinel queued
+        "closed": False,
+        "done": threading.Event()  # Set once the file is closed and handed to the finalize worker
+    }
+    
+    # Uploads from before the triggering frame (but not already in the previous clip)
+    if previous is None and mode == "passthrough":
+        # ingest_frame adds each upload to the pre-roll before it looks at state["clip"].
+        # Publishing the clip and snapshotting under the queue lock means every upload is
+        # either in the snapshot or queued by ingest_frame after it; ones in both are
+        # skipped by the writer (timestamp already written)
+        with state["write_queue_lock"]:
+            state["clip"] = clip
+            preroll = state["preroll"].snapshot(state["recording_stopped_at"], float("inf"))
+            if preroll:
+                state["video_write_queue"].put(("preroll", clip, None, preroll, 0))
+    else:
+        if previous is None:
+            preroll = state["preroll"].snapshot(
+                state["recording_stopped_at"], state["frame_received_at"] or clip["started_at"]
+            )
+            if preroll:
+                state["video_write_queue"].put(("preroll", clip, None, preroll, 0))
+        state["clip"] = clip
+    state["current_filename"] = filename
+    video_catalog.add_recording(
+        filename, state["device_id"], state["recording_trigger"], clip["started_at"], width, height,
+        clip["event_id"], clip["segment"]
     )
-    recording_state["current_filename"] = filename
+    if previous is not None:
+        end_clip(state, previous)
+        print(f"📹 Started segment {clip['segment']} of {clip['event_id']}: {filename}")
+    else:
+        print(f"📹 Started recording: {filename}")
+    publish_recording_event(state)
+    return clip
+
+
+def end_clip(state, clip):
+    """Queue the stop sentinel behind the clip's last frame (under the queue lock, see queue_clip_frame)"""
+    with state["write_queue_lock"]:
+        clip["ended_at"] = time.time()
+        clip["stopped"] = True
+        state["video_write_queue"].put(("stop", clip, None, None, 0))
+
+
+def stop_recording(state):
+    """
+    Stop the current clip for one camera (returns immediately). A stop sentinel
+    follows the clip's last queued frame; the writer thread closes the file when
+    it gets there. Returns the clip (clip["done"] is set once it is saved).
+    """
+    with state["recording_lock"]:
+        clip = state["clip"]
+        state["clip"] = None
+        if clip is not None:
+            end_clip(state, clip)
+            state["current_filename"] = None
+            state["recording_stopped_at"] = clip["ended_at"]
+    
+    publish_recording_event(state)
+    return clip
+
+
+# One background worker post-processes finished clips in order
+finalize_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="finalize")
+
+
+def finalize_video(video_path, frame_times=None):
+    """
+    Post-process a finished clip: apply the capture timestamps (ffmpeg clips),
+    move moov in front of mdat for instant playback/seeking, then render its
+    poster and preview sprite.
+    """
+    try:
+        if frame_times and set_frame_times(video_path, frame_times):
+            print(f"⏱️  Frame timing: {video_path.name} ({len(frame_times)} frames, "
+                  f"{len(frame_times) / max(frame_times[-1] - frame_times[0], 1e-3):.1f} fps average)")
+        if video_path.suffix == ".avi" and PASSTHROUGH_TRANSCODE:
+            video_path = transcode_to_h264(video_path)
+            if video_path is None:
+                return
+        if MP4_FASTSTART and video_path.suffix == ".mp4":
+            start = time.time()
+            if faststart(video_path):
+                print(f"⚡ Faststart: {video_path.name} ({(time.time() - start) * 1000:.0f} ms)")
+    except FileNotFoundError:
+        return  # Deleted (cleanup / API) before we got to it
+    except Exception as e:
+        print(f"⚠️  Post-processing failed for {video_path.name}: {e}")
+    
+    try:
+        if generate_thumbnails(video_path):
+            print(f"🖼️  Thumbnails: {video_path.name}")
+    except Exception as e:
+        print(f"⚠️  Thumbnail generation failed for {video_path.name}: {e}")
+
+
+def transcode_to_h264(video_path):
+    """
+    Replace a passthrough MJPEG AVI with an H.264 MP4 (faststart) using ffmpeg.
+    Returns the new path, the AVI path if ffmpeg is missing, or None if the
+    clip was deleted meanwhile.
+    """
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        print(f"⚠️  ffmpeg not found - keeping {video_path.name} as MJPEG AVI")
+        return video_path
+    
+    mp4_path = video_path.with_suffix(".mp4")
+    tmp_path = mp4_path.with_name(mp4_path.name + ".tmp")
+    start = time.time()
+    try:
+        subprocess.run(
+            [ffmpeg, "-y", "-loglevel", "error", "-i", str(video_path),
+             *encoder_args(FFMPEG_ENCODER, FFMPEG_PRESET, FFMPEG_CRF, FFMPEG_BITRATE),
+             "-pix_fmt", "yuv420p", "-movflags", "+faststart", "-f", "mp4", str(tmp_path)],
+            check=True, capture_output=True
+        )
+        os.replace(tmp_path, mp4_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    
+    if video_catalog.get(video_path.name) is None:
+        mp4_path.unlink(missing_ok=True)  # Deleted while transcoding
+        return None
+    video_catalog.rename(video_path.name, mp4_path.name, mp4_path.stat().st_size)
+    video_path.unlink(missing_ok=True)
+    delete_thumbnails(video_path.name)
+    print(f"🎞️  Transcoded {video_path.name} -> {mp4_path.name} ({time.time() - start:.1f}s)")
+    return mp4_path
+
+
+clip_compactor = ClipCompactor(COMPACTION_ENCODER, COMPACTION_PRESET, COMPACTION_CRF, COMPACTION_THREADS)
+
+
+def compaction_pause_reason():
+    """Why compaction must wait right now (None = the machine is idle enough)"""
+    if any(state["clip"] is not None for state in list_device_states()):
+        return "recording"
+    if time.time() - inference_stats["last_batch_at"] < 5.0:
+        if ADAPTIVE_CONTROL and rate_controller.level > 0:
+            return f"rate control at level {rate_controller.level}"
+        latency = rate_controller.stage_ms.get("end_to_end")
+        if latency is not None and latency > LATENCY_TARGET_MS * COMPACTION_LATENCY_RATIO:
+            return f"inference latency {latency:.0f} ms"
+    if hasattr(os, "getloadavg"):
+        load = os.getloadavg()[0] / (os.cpu_count() or 1)
+        if load > COMPACTION_MAX_LOAD:
+            return f"load {load:.2f} per core"
+    return None
+
+
+def compaction_worker():
+    """Background thread: compact clips older than COMPACTION_MIN_AGE_HOURS, one at a time, when idle"""
+    while True:
+        now = time.time()
+        candidates = video_catalog.compaction_candidates(
+            now - COMPACTION_MIN_AGE_HOURS * 3600, now, COMPACTION_RETRY_HOURS * 3600, COMPACTION_MAX_ATTEMPTS
+        )
+        for row in candidates:
+            while compaction_pause_reason() is not None:
+                time.sleep(5.0)  # Do not even start while the live pipeline is busy
+            try:
+                compact_clip(row)
+            except Exception as e:
+                print(f"⚠️  Compaction error for {row['filename']}: {e}")
+                compaction_failed(row)
+        if not candidates:
+            time.sleep(COMPACTION_INTERVAL_SECONDS)
+
+
+def compaction_failed(row):
+    """Count a failed attempt; the clip is retried after a backoff, up to COMPACTION_MAX_ATTEMPTS"""
+    clip_compactor.clips_failed += 1
+    attempts = video_catalog.compaction_failed(row["filename"], time.time())
+    if attempts >= COMPACTION_MAX_ATTEMPTS:
+        print(f"⚠️  Giving up compacting {row['filename']} after {attempts} attempts")
+    else:
+        print(f"🔁 Compaction of {row['filename']} will be retried in "
+              f"{COMPACTION_RETRY_HOURS * 2 ** (attempts - 1):g} h")
+
+
+def compact_clip(row):
+    """
+    Re-encode one finished clip (optionally without its stretches of no
+    detections) and swap it in atomically. The catalog row gets the new
+    name/size; clips that would not shrink are kept as they are.
+    """
+    video_path = VIDEOS_DIR / row["filename"]
+    if not video_path.exists():
+        video_catalog.remove(row["filename"])  # Deleted behind the catalog's back
+        return
+    size_before = video_path.stat().st_size
+    
+    keep = fps = None
+    seconds_cut = 0.0
+    if COMPACTION_CUT_IDLE:
+        frame_count, duration, _, _ = probe_video(video_path)
+        if frame_count and duration:
+            fps = frame_count / duration
+            keep = keep_ranges(
+                detection_log.frame_times(row["started_at"], row["ended_at"], row["device"]),
+                row["started_at"], row["ended_at"], frame_count, row["preroll_frames"] or 0,
+                COMPACTION_CUT_PADDING_SECONDS
+            )
+            if keep:
+                seconds_cut = (frame_count - sum(last - first + 1 for first, last in keep)) / fps
+                if seconds_cut < COMPACTION_MIN_CUT_SECONDS:
+                    keep, seconds_cut = None, 0.0
+    
+    mp4_path = video_path.with_suffix(".mp4")
+    tmp_path = mp4_path.with_name(mp4_path.name + ".tmp")
+    try:
+        if not clip_compactor.compact(video_path, tmp_path, keep, fps, compaction_pause_reason):
+            if not clip_compactor.stopped:  # Not counted when the server shuts down
+                compaction_failed(row)
+            return
+        size_after = tmp_path.stat().st_size
+        if video_catalog.get(row["filename"]) is None:
+            return  # Deleted while compacting
+        if keep is None and size_after >= size_before:
+            clip_compactor.clips_skipped += 1
+            video_catalog.update(row["filename"], compacted_at=time.time())
+            print(f"🗜️  {row['filename']} is already compact ({size_before / 1e6:.1f} MB) - kept")
+            return
+        os.replace(tmp_path, mp4_path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    
+    fields = {"size": size_after, "compacted_at": time.time()}
+    if keep:
+        frame_count, duration, _, _ = probe_video(mp4_path)
+        fields.update(frame_count=frame_count, duration=duration, preroll_frames=0)
+    if mp4_path != video_path:
+        video_catalog.rename(video_path.name, mp4_path.name, size_after)
+        video_path.unlink(missing_ok=True)
+        delete_thumbnails(video_path.name)
+    video_catalog.update(mp4_path.name, **fields)
+    
+    clip_compactor.clips_compacted += 1
+    clip_compactor.bytes_before += size_before
+    clip_compactor.bytes_after += size_after
+    clip_compactor.seconds_cut += seconds_cut
+    print(f"🗜️  Compacted {video_path.name} -> {mp4_path.name}: {size_before / 1e6:.1f} -> "
+          f"{size_after / 1e6:.1f} MB" + (f", {seconds_cut:.0f}s without detections cut" if keep else ""))
     
-    print(f"📹 Started recording: {filename}")
+    if keep or mp4_path != video_path:
+        generate_thumbnails(mp4_path)
 
 
-def stop_recording():
-    """Stop and save the current video"""
-    if recording_state["video_writer"]:
-        # Wait for remaining frames to be written
-        time.sleep(0.2)
+def thumbnail_paths(filename):
+    """(poster, sprite) cache paths for a clip"""
+    return THUMBS_DIR / f"{filename}.poster.jpg", THUMBS_DIR / f"{filename}.sprite.jpg"
+
+
+def generate_thumbnails(video_path):
+    """
+    Write a poster JPEG (frame at 1/3 of the clip) and a horizontal sprite of
+    SPRITE_TILES evenly spaced frames. Frames in between are only grabbed, not
+    decoded to images. Returns False if the clip has no readable frames.
+    """
+    capture = cv2.VideoCapture(str(video_path))
+    try:
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        if frame_count <= 0:
+            return False
         
-        recording_state["video_writer"].release()
-        print(f"💾 Saved video: {recording_state['current_filename']}")
-        recording_state["video_writer"] = None
-        recording_state["current_filename"] = None
+        tile_indices = sorted({int(i * frame_count / SPRITE_TILES) for i in range(SPRITE_TILES)})
+        poster_index = frame_count // 3
+        wanted = set(tile_indices) | {poster_index}
         
-        # Clear any remaining queued frames
-        while not video_write_queue.empty():
-            try:
-                video_write_queue.get_nowait()
-            except queue.Empty:
+        poster = None
+        tiles = []
+        for index in range(max(wanted) + 1):
+            if not capture.grab():
                 break
-        
-        # Clean up old videos after saving
-        cleanup_old_videos()
+            if index not in wanted:
+                continue
+            ok, frame = capture.retrieve()
+            if not ok:
+                continue
+            if index == poster_index:
+                poster = resize_to_width(frame, POSTER_WIDTH)
+            if index in tile_indices:
+                tiles.append(resize_to_width(frame, SPRITE_TILE_WIDTH))
+    finally:
+        capture.release()
+    
+    if not tiles:
+        return False
+    
+    poster_path, sprite_path = thumbnail_paths(video_path.name)
+    encode_params = [cv2.IMWRITE_JPEG_QUALITY, THUMB_JPEG_QUALITY]
+    write_jpeg_atomic(poster_path, poster if poster is not None else resize_to_width(tiles[0], POSTER_WIDTH), encode_params)
+    write_jpeg_atomic(sprite_path, np.hstack(tiles), encode_params)
+    return True
+
+
+def resize_to_width(frame, width):
+    height = max(1, int(round(frame.shape[0] * width / frame.shape[1])))
+    return cv2.resize(frame, (width, height), interpolation=cv2.INTER_AREA)
+
+
+def write_jpeg_atomic(path, image, encode_params):
+    """Encode to a temp file and swap it in, so a request never serves half a JPEG"""
+    ok, buffer = cv2.imencode('.jpg', image, encode_params)
+    if not ok:
+        raise ValueError(f"JPEG encode failed for {path.name}")
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_bytes(buffer.tobytes())
+    os.replace(tmp_path, path)
 
 
-def check_recording_timeout():
+def delete_thumbnails(filename):
+    for path in thumbnail_paths(filename):
+        path.unlink(missing_ok=True)
+
+
+def check_recording_timeout(state):
     """Check if we should stop recording due to timeout"""
-    if recording_state["is_recording"]:
-        time_since_detection = time.time() - recording_state["last_detection_time"]
+    if state["is_recording"]:
+        time_since_detection = time.time() - state["last_detection_time"]
         if time_since_detection > COOLDOWN_SECONDS:
-            recording_state["is_recording"] = False
-            recording_state["both_detected"] = False
-            stop_recording()
-            print(f"⏱️  Recording stopped - {COOLDOWN_SECONDS}s timeout")
+            with state["recording_lock"]:
+                if not state["is_recording"]:
+                    return  # Stopped meanwhile (beacon / shutdown)
+                state["is_recording"] = False
+                state["recording_trigger"] = None
+                state["both_detected"] = False
+                stop_recording(state)
+            print(f"⏱️  Recording stopped on {state['device_id']} - {COOLDOWN_SECONDS}s timeout")
 
 
 def load_model():
-    """Load YOLOv8 model with optimizations"""
+    """Load YOLOv8 model with the configured inference backend"""
     global model
-    print(f"⏳ Loading model: {MODEL_PATH}")
-    model = YOLO(MODEL_PATH)
+    model_path = MODEL_PATHS[INFERENCE_BACKEND]
+    print(f"⏳ Loading model ({INFERENCE_BACKEND}, {INFERENCE_THREADS or 'default'} threads): {model_path}")
+    model = create_inference_backend(INFERENCE_BACKEND, model_path, INFERENCE_THREADS)
     
     # Warmup model for faster first inference
     print("🔥 Warming up model...")
     dummy_frame = np.zeros((640, 640, 3), dtype=np.uint8)
-    model.predict(dummy_frame, verbose=False)
+    model.predict([dummy_frame], imgsz=INFERENCE_IMGSZ)
     
     print("✅ Model loaded and warmed up!")
 
 
-def frame_to_base64(frame):
-    """Convert frame to base64 JPEG (fast encoding)"""
-    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 75])
-    return base64.b64encode(buffer).decode('utf-8')
+def draw_detections(image, detections, scale=1.0, labels=True):
+    """Draw detection boxes (and labels) in place; scale maps bbox coords onto a resized image"""
+    for det in detections:
+        x1, y1, x2, y2 = (int(v * scale) for v in det["bbox"])
+        color = CLASS_COLORS.get(det["class"], (0, 255, 0))
+        label = f"{det['class']} {det['confidence']:.2f}"
+        
+        cv2.rectangle(image, (x1, y1), (x2, y2), color, 2 if scale >= 0.5 else 1)
+        if not labels:
+            continue
+        (text_w, text_h), _ = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, 0.5, 1)
+        label_y = max(y1, text_h + 4)
+        cv2.rectangle(image, (x1, label_y - text_h - 4), (x1 + text_w + 2, label_y), color, -1)
+        cv2.putText(image, label, (x1 + 1, label_y - 3), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (255, 255, 255), 1, cv2.LINE_AA)
+    return image
 
 
-@app.route('/esp32/frame', methods=['POST'])
-def receive_esp32_frame():
-    """Receive camera frame from ESP32-S3"""
-    global use_esp32_camera
-    
+def decode_frame_job(state, jpeg_data, received_at):
+    """Decode one camera's JPEG upload on the decode pool and hand it to the scheduler"""
     try:
-        # Get JPEG data from ESP32
-        jpeg_data = request.data
-        
-        if len(jpeg_data) == 0:
-            return jsonify({"error": "No image data received"}), 400
-        
-        # Decode JPEG to OpenCV format
+        decode_start = time.time()
         nparr = np.frombuffer(jpeg_data, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        frame = cv2.imdecode(nparr, DECODE_FLAGS.get(DECODE_REDUCED_FACTOR, cv2.IMREAD_COLOR))
+        rate_controller.record("decode", time.time() - decode_start)
         
         if frame is None:
-            return jsonify({"error": "Failed to decode image"}), 400
+            state["decode_errors"] += 1
+            return
         
-        # Add frame to queue (non-blocking)
         try:
-            esp32_frame_queue.put_nowait(frame)
+            state["frame_queue"].put_nowait((frame, received_at))
+            with frame_ready:
+                frame_ready.notify()
         except queue.Full:
-            # Queue full, skip this frame
-            pass
+            state["frames_dropped"] += 1
+    except Exception as e:
+        state["decode_errors"] += 1
+        print(f"❌ Error decoding frame from {state['device_id']}: {e}")
+    finally:
+        state["decode_lock"].release()
+
+
+def encode_jpeg(frame, quality=None):
+    """JPEG-encode a frame (defaults to the rate controller's current quality)"""
+    encode_start = time.time()
+    if quality is None:
+        quality = rate_controller.operating_point["jpeg_quality"]
+    _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    rate_controller.record("encode", time.time() - encode_start)
+    return buffer
+
+
+def parse_stream_variant(profile=None, quality=None):
+    """
+    (profile, width, jpeg quality, labels) for a stream request.
+    
+    ?profile=thumb|low|high picks a STREAM_PROFILES rung (unknown -> default);
+    ?quality=10-95 overrides its JPEG quality. Without either, quality follows
+    the rate controller.
+    """
+    if profile not in STREAM_PROFILES:
+        profile = DEFAULT_STREAM_PROFILE
+    rung = STREAM_PROFILES[profile]
+    
+    try:
+        jpeg_quality = min(95, max(10, int(quality)))
+    except (TypeError, ValueError):
+        jpeg_quality = rung["jpeg_quality"] or rate_controller.operating_point["jpeg_quality"]
+    return profile, rung["width"], jpeg_quality, rung["labels"]
+
+
+def get_stream_variant():
+    return parse_stream_variant(request.args.get('profile'), request.args.get('quality'))
+
+
+def parse_long_poll_wait(value):
+    """?wait= seconds for /stream/frame, clamped to 0..LONG_POLL_MAX_SECONDS"""
+    try:
+        wait = float(value)
+    except (TypeError, ValueError):
+        return 0.0
+    return min(LONG_POLL_MAX_SECONDS, max(0.0, wait))
+
+
+def parse_event_types(value):
+    """?types= for /events -> (types, error message or None)"""
+    types = tuple(value.split(",")) if value else EVENT_TYPES
+    unknown = [event_type for event_type in types if event_type not in EVENT_TYPES]
+    if unknown:
+        return types, f"Unknown event types: {', '.join(unknown)}"
+    return types, None
+
+
+def ingest_frame(device_id, jpeg_data):
+    """
+    Accept one JPEG upload from a camera (shared by the Flask and ASGI routes).
+    
+    Applies the rate controller's frame skip and drop-before-decode, and hands
+    the JPEG to the decode pool. Returns (response dict, HTTP status).
+    """
+    try:
+        if len(jpeg_data) == 0:
+            return {"error": "No image data received"}, 400
         
-        return jsonify({
+        state = get_device_state(device_id)
+        if state is None:
+            return {"error": f"Too many cameras (max {MAX_DEVICES})"}, 503
+        
+        received_at = time.time()
+        state["frames_received"] += 1
+        state["last_frame_time"] = received_at
+        # Every upload goes into the pre-roll, including ones skipped or dropped below
+        state["preroll"].add(received_at, jpeg_data)
+        
+        # Passthrough recording: the upload itself goes into the clip (no decode, no copy)
+        clip = state["clip"]
+        if clip is not None and clip["mode"] == "passthrough":
+            queue_clip_frame(state, clip, received_at, jpeg_data, len(jpeg_data))
+        
+        # Rate controller frame skip: only every (skip + 1)-th upload is decoded
+        frame_skip = rate_controller.operating_point["frame_skip"]
+        if frame_skip and state["frames_received"] % (frame_skip + 1) != 0:
+            state["frames_skipped"] += 1
+            return {
+                "success": True,
+                "message": "Frame skipped (rate control)",
+                "device": device_id,
+                "queued": False,
+                "timestamp": datetime.now().isoformat()
+            }, 200
+        
+        # Drop before decode: skip the frame if the slot is still full or a decode is in flight
+        queued = False
+        if not state["frame_queue"].full() and state["decode_lock"].acquire(blocking=False):
+            # Decode JPEG to OpenCV format on the bounded pool (at most one job per camera)
+            decode_executor.submit(decode_frame_job, state, jpeg_data, received_at)
+            queued = True
+        else:
+            state["frames_dropped"] += 1
+        
+        return {
             "success": True,
-            "message": "Frame received",
-            "frame_size": frame.shape,
+            "message": "Frame received" if queued else "Frame dropped (camera busy)",
+            "device": device_id,
+            "queued": queued,
             "timestamp": datetime.now().isoformat()
-        })
+        }, 200
         
     except Exception as e:
         print(f"❌ Error receiving ESP32 frame: {e}")
-        return jsonify({"error": str(e)}), 500
+        return {"error": str(e)}, 500
+
+
+@app.route('/esp32/frame', methods=['POST'])
+def receive_esp32_frame():
+    """Receive camera frame from ESP32-S3"""
+    # Each board gets its own frame slot (X-Device header, else client address)
+    device_id = request.headers.get('X-Device') or request.remote_addr or DEFAULT_DEVICE_ID
+    body, status = ingest_frame(device_id, request.data)
+    return jsonify(body), status
 
 
 @app.route('/esp32/distance', methods=['POST'])
@@ -443,13 +2082,21 @@ def receive_distance_data():
             # Beacon is close - activate alert
             proximity_state['proximity_alert_active'] = True
             
-            # Start recording if not already recording
+            # Start recording on every camera with a frame (if not already recording)
             if not proximity_state['proximity_recording']:
-                if recording_state['latest_frame'] is not None:
+                started = 0
+                for state in list_device_states():
+                    with state['recording_lock']:
+                        if state['latest_frame'] is None or state['is_recording']:
+                            continue
+                        state['is_recording'] = True
+                        state['recording_trigger'] = "proximity"
+                        start_recording(state, state['latest_frame'].shape)
+                    started += 1
+                
+                if started > 0 or any(s['is_recording'] for s in list_device_states()):
                     proximity_state['proximity_recording'] = True
-                    recording_state['is_recording'] = True
-                    start_recording(recording_state['latest_frame'].shape)
-                    print(f"🚨 PROXIMITY ALERT! Recording started - RSSI: {rssi} dBm, Distance: {distance:.2f}m")
+                    print(f"🚨 PROXIMITY ALERT! Recording started on {started} camera(s) - RSSI: {rssi} dBm, Distance: {distance:.2f}m")
                 else:
                     print("⚠️  No frame available to start recording")
         else:
@@ -460,10 +2107,17 @@ def receive_distance_data():
             
             if proximity_state['proximity_recording']:
                 proximity_state['proximity_recording'] = False
-                recording_state['is_recording'] = False
-                stop_recording()
+                # Only stop recordings the beacon started; AI recordings keep their own timeout
+                for state in list_device_states():
+                    with state['recording_lock']:
+                        if state['recording_trigger'] == "proximity":
+                            state['is_recording'] = False
+                            state['recording_trigger'] = None
+                            stop_recording(state)
                 print(f"⏹️  Recording stopped - beacon beyond 1m")
         
+        publish_proximity_event()
+        
         return jsonify({
             "success": True,
             "distance": distance,
@@ -503,37 +2157,256 @@ def enable_esp32_camera():
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
+    states = list_device_states()
     return jsonify({
         "status": "healthy",
         "model_loaded": model is not None,
-        "recording": recording_state["is_recording"],
+        "recording": any(state["is_recording"] for state in states),
         "camera_active": camera_thread.running if camera_thread else False,
+        "camera_count": len(states),
+        "inference_backend": model.name if model is not None else INFERENCE_BACKEND,
+        "inference_threads": INFERENCE_THREADS,
         "camera_source": "ESP32-S3" if use_esp32_camera else "Mac Webcam",
+        "server_mode": SERVER_MODE,
+        "inference": {
+            "batch_size_limit": INFERENCE_BATCH_SIZE,
+            "batch_wait_ms": INFERENCE_BATCH_WAIT_MS,
+            "batches": inference_stats["batches"],
+            "frames": inference_stats["frames"],
+            "last_batch_size": inference_stats["last_batch_size"],
+            "avg_batch_size": round(inference_stats["avg_batch_size"], 2),
+            "avg_inference_ms_per_frame": round(inference_stats["avg_inference_ms_per_frame"], 2),
+            "avg_frame_latency_ms": round(inference_stats["avg_frame_latency_ms"], 2)
+        },
+        "motion_gate": get_motion_gate_stats(),
+        "tracking": get_tracking_stats(),
+        "rate_control": rate_controller.get_status(),
+        "jpeg_cache": get_jpeg_cache_stats(),
+        "stream_clients": frame_bus.get_stats(),
+        "event_clients": event_bus.get_stats(),
+        "detection_log": detection_log.get_stats(),
+        "preroll": get_preroll_stats(),
+        "storage": {
+            "bytes": video_catalog.total_size(),
+            "quota_bytes": RETENTION_MAX_BYTES,
+            "max_age_days": RETENTION_MAX_AGE_DAYS,
+            "segment_seconds": SEGMENT_SECONDS
+        },
+        "compaction": {
+            "enabled": COMPACTION_ENABLED,
+            "min_age_hours": COMPACTION_MIN_AGE_HOURS,
+            "cut_idle": COMPACTION_CUT_IDLE,
+            "pause_reason": compaction_pause_reason(),
+            **clip_compactor.get_stats()
+        },
         "timestamp": datetime.now().isoformat()
     })
 
 
+def get_clip_stats(state):
+    """Written/dropped frames of the clip being recorded, plus writer queue memory"""
+    clip = state["clip"]
+    return {
+        "filename": clip["filename"] if clip else None,
+        "mode": clip["mode"] if clip else None,
+        "frames_written": clip["frames_written"] if clip else 0,
+        "frames_dropped": clip["frames_dropped"] if clip else 0,
+        "queue_items": state["video_write_queue"].qsize(),
+        "queue_bytes": state["write_queue_bytes"],
+        "queue_max_bytes": RECORDING_QUEUE_MAX_BYTES
+    }
+
+
+def get_preroll_stats():
+    """Pre-roll buffer memory across cameras"""
+    buffers = {state["device_id"]: state["preroll"].get_stats() for state in list_device_states()}
+    return {
+        "seconds": PREROLL_SECONDS,
+        "max_bytes_per_camera": PREROLL_MAX_BYTES,
+        "total_bytes": sum(stats["bytes"] for stats in buffers.values()),
+        "total_frames": sum(stats["frames"] for stats in buffers.values()),
+        "cameras": buffers
+    }
+
+
+def get_motion_gate_stats():
+    """Aggregate motion gate skip ratio and estimated CPU saved across cameras"""
+    checked = 0
+    skipped = 0
+    gate_time = 0.0
+    per_device = {}
+    for state in list_device_states():
+        gate = state["motion_gate"]
+        checked += gate.frames_checked
+        skipped += gate.frames_skipped
+        gate_time += gate.check_time
+        per_device[state["device_id"]] = round(gate.frames_skipped / gate.frames_checked, 3) if gate.frames_checked else 0.0
+    
+    # Each skipped frame saves one model.predict, minus the gate's own cost
+    saved = skipped * inference_stats["avg_inference_ms_per_frame"] / 1000.0 - gate_time
+    return {
+        "enabled": MOTION_GATING,
+        "frames_checked": checked,
+        "frames_skipped": skipped,
+        "skip_ratio": round(skipped / checked, 3) if checked else 0.0,
+        "skip_ratio_per_device": per_device,
+        "avg_gate_ms": round(gate_time * 1000.0 / checked, 3) if checked else 0.0,
+        "cpu_seconds_saved": round(max(0.0, saved), 2)
+    }
+
+
+def get_tracking_stats():
+    """Per-camera detect interval and tracker counters"""
+    per_device = {}
+    for state in list_device_states():
+        tracker = state["tracker"]
+        per_device[state["device_id"]] = {
+            "detect_interval": tracker.detect_interval,
+            "confidence": round(tracker.confidence, 3),
+            "frames_tracked": tracker.frames_tracked,
+            "frames_detected": tracker.frames_detected,
+            "early_redetects": tracker.early_redetects
+        }
+    return {
+        "enabled": TRACKING_ENABLED,
+        "min_interval": TRACKING_MIN_INTERVAL,
+        "max_interval": TRACKING_MAX_INTERVAL,
+        "devices": per_device
+    }
+
+
+def get_jpeg_cache_stats():
+    """Annotate/encode vs reuse counts of the shared live-view JPEG cache"""
+    states = list_device_states()
+    encodes = sum(state["jpeg_cache"].encodes for state in states)
+    hits = sum(state["jpeg_cache"].hits for state in states)
+    renders = sum(state["jpeg_cache"].renders for state in states)
+    frames_rendered = sum(state["jpeg_cache"].frames_rendered for state in states)
+    frames = sum(state["frames_processed"] for state in states)
+    return {
+        "annotated_frames": frames_rendered,
+        "unviewed_frames": max(0, frames - frames_rendered),  # Processed frames nobody asked to see
+        "renders": renders,  # One per frame and profile rung
+        "profiles": list(STREAM_PROFILES),
+        "encodes": encodes,
+        "hits": hits,
+        "hit_ratio": round(hits / (encodes + hits), 3) if encodes + hits else 0.0
+    }
+
+
 @app.route('/stream/live', methods=['GET'])
 def stream_live():
     """Get current frame with annotations (for live view) - optimized"""
-    if recording_state["latest_annotated_frame"] is None:
+    error = ambiguous_device_error(request.args.get('device'))
+    if error:
+        return jsonify(error[0]), error[1]
+    state = resolve_device_state(request.args.get('device'))
+    if state is None or state["latest_result"] is None:
         return jsonify({"error": "No frame available"}), 404
     
-    # Fast JPEG encoding with lower quality for faster transmission
-    frame_base64 = frame_to_base64(recording_state["latest_annotated_frame"])
+    # Shared cache: encoded once per new frame and profile/quality, reused by every client
+    variant = get_stream_variant()
+    frame_seq, frame_base64 = state["jpeg_cache"].get(state, variant, as_base64=True)
     
     # Minimal response (remove unnecessary fields for speed)
     return jsonify({
         "frame": frame_base64,
-        "detections": recording_state["detections"],
-        "is_recording": recording_state["is_recording"],
-        "current_video": recording_state["current_filename"],
+        "frame_seq": frame_seq,
+        "profile": variant[0],
+        "device": state["device_id"],
+        "detections": state["detections"],
+        "is_recording": state["is_recording"],
+        "current_video": state["current_filename"],
         "proximity_alert": proximity_state["proximity_alert_active"],
         "beacon_distance": proximity_state["distance"],
         "timestamp": datetime.now().isoformat()
     })
 
 
+def frame_etag(state, frame_seq, variant):
+    """ETag for one camera frame in one stream variant (profile + JPEG quality)"""
+    profile, _, quality, _ = variant
+    return f"{BOOT_ID}-{state['device_id']}-{frame_seq}-{profile}-q{quality}"
+
+
+def compact_detection_list(detections):
+    """Detections with rounded confidence and box coordinates"""
+    return [
+        {
+            "class": det["class"],
+            "confidence": round(det["confidence"], 3),
+            "bbox": [round(v, 1) for v in det["bbox"]]
+        }
+        for det in detections
+    ]
+
+
+def compact_detections(detections):
+    """Detections as compact JSON for the X-Detections header"""
+    return json.dumps(compact_detection_list(detections), separators=(',', ':'))
+
+
+@app.route('/stream/frame', methods=['GET'])
+def stream_frame():
+    """
+    Latest annotated frame as raw JPEG, with detections/state in headers.
+    
+    Supports If-None-Match -> 304 on the frame ETag, and ?wait=<seconds> to
+    long-poll: if the client already has the current frame, block until the
+    next one is published (or the wait expires, then 304).
+    """
+    device_id = request.args.get('device')
+    variant = get_stream_variant()
+    wait = parse_long_poll_wait(request.args.get('wait'))
+    
+    error = ambiguous_device_error(device_id)
+    if error:
+        return jsonify(error[0]), error[1]
+    state = resolve_device_state(device_id)
+    if state is None or state["latest_result"] is None:
+        return jsonify({"error": "No frame available"}), 404
+    
+    if wait > 0 and request.if_none_match.contains(frame_etag(state, state["frame_seq"], variant)):
+        subscription = frame_bus.subscribe(state["device_id"], request.remote_addr)
+        try:
+            # Re-check after subscribing so a frame published in between is not missed
+            if request.if_none_match.contains(frame_etag(state, state["frame_seq"], variant)):
+                state = subscription.wait(wait) or state
+        finally:
+            frame_bus.unsubscribe(subscription)
+    
+    status, body, headers = build_frame_response(state, variant, request.if_none_match)
+    if status == 304:
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='image/jpeg', headers=headers)
+
+
+def build_frame_response(state, variant, if_none_match):
+    """
+    (status, JPEG bytes or None, headers) for /stream/frame (Flask and ASGI).
+    if_none_match is a werkzeug ETags set parsed from the request. The state
+    headers are sent with 304s too: recording and proximity change without a new frame.
+    """
+    frame_seq, jpeg_bytes = state["jpeg_cache"].get(state, variant)
+    etag = frame_etag(state, frame_seq, variant)
+    headers = {
+        "ETag": f'"{etag}"',
+        "X-Device": state["device_id"],
+        "X-Frame-Seq": str(frame_seq),
+        "Cache-Control": "no-cache",
+        "X-Detections": compact_detections(state["detections"]),
+        "X-Recording": "1" if state["is_recording"] else "0",
+        "X-Proximity-Alert": "1" if proximity_state["proximity_alert_active"] else "0",
+        "X-Beacon-Distance": f"{proximity_state['distance']:.2f}"
+    }
+    if state["current_filename"]:
+        headers["X-Current-Video"] = state["current_filename"]
+    
+    if if_none_match.contains(etag):
+        return 304, None, headers
+    return 200, jpeg_bytes, headers
+
+
 @app.route('/proximity/status', methods=['GET'])
 def get_proximity_status():
     """Get current proximity status"""
@@ -550,7 +2423,7 @@ def get_proximity_status():
         "calculation_method": "path_loss_formula",
         "last_update": proximity_state["last_update"],
         "time_since_update": time_since_update,
-        "has_frame": recording_state["latest_frame"] is not None,
+        "has_frame": any(state["latest_frame"] is not None for state in list_device_states()),
         "timestamp": datetime.now().isoformat()
     })
 
@@ -558,51 +2431,205 @@ def get_proximity_status():
 @app.route('/stream/mjpeg', methods=['GET'])
 def stream_mjpeg():
     """MJPEG video stream (alternative for continuous streaming)"""
+    device_id = request.args.get('device')
+    profile = request.args.get('profile')
+    quality = request.args.get('quality')
+    error = ambiguous_device_error(device_id)
+    if error:
+        return jsonify(error[0]), error[1]
+    # Follow the camera resolved now, even if more cameras register later
+    state = resolve_device_state(device_id)
+    subscription = frame_bus.subscribe(state["device_id"] if state else device_id, request.remote_addr)
+    
     def generate():
-        while True:
-            if recording_state["latest_annotated_frame"] is not None:
-                _, buffer = cv2.imencode('.jpg', recording_state["latest_annotated_frame"])
-                frame_bytes = buffer.tobytes()
+        nonlocal state
+        try:
+            # Send the current frame straight away, then one part per published frame
+            while True:
+                part = mjpeg_part(state, profile, quality)
+                if part is not None:
+                    yield part
                 
-                yield (b'--frame\r\n'
-                       b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-            
-            time.sleep(0.033)  # ~30 FPS
+                # Sleep until the bus publishes a new frame for this camera
+                state = None
+                while state is None:
+                    state = subscription.wait(timeout=5.0)
+        finally:
+            frame_bus.unsubscribe(subscription)
     
     return Response(generate(),
                     mimetype='multipart/x-mixed-replace; boundary=frame')
 
 
+@app.route('/events', methods=['GET'])
+def stream_events():
+    """
+    Server-Sent Events stream of state changes (no frames).
+    
+    Event types: detections (per camera), recording (per camera) and proximity.
+    Filter with ?device=<id> and ?types=detections,recording,proximity. The
+    current state is sent on connect, then only changes.
+    """
+    device_id = request.args.get('device')
+    types, error = parse_event_types(request.args.get('types'))
+    if error:
+        return jsonify({"error": error}), 400
+    
+    subscription = event_bus.subscribe(device_id, types, request.remote_addr)
+    
+    def generate():
+        try:
+            yield SSE_RETRY
+            while True:
+                messages = subscription.wait(EVENT_HEARTBEAT_SECONDS)
+                yield b"".join(messages) if messages else SSE_KEEP_ALIVE
+        finally:
+            event_bus.unsubscribe(subscription)
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"  # Don't let a reverse proxy buffer events
+    return response
+
+
+def mjpeg_part(state, profile=None, quality=None):
+    """One multipart/x-mixed-replace part for a camera's latest frame (None if no frame yet)"""
+    if state is None or state["latest_result"] is None:
+        return None
+    # Resolved per part so the default profile follows the rate controller's quality
+    _, frame_bytes = state["jpeg_cache"].get(state, parse_stream_variant(profile, quality))
+    return (b'--frame\r\n'
+            b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
+
+
 @app.route('/status', methods=['GET'])
 def get_status():
     """Get current detection and recording status"""
+    error = ambiguous_device_error(request.args.get('device'))
+    if error:
+        return jsonify(error[0]), error[1]
+    state = resolve_device_state(request.args.get('device'))
+    if state is None:
+        return jsonify({
+            "is_recording": False,
+            "both_detected": False,
+            "current_video": None,
+            "detections": [],
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    return jsonify({
+        "device": state["device_id"],
+        "is_recording": state["is_recording"],
+        "both_detected": state["both_detected"],
+        "current_video": state["current_filename"],
+        "detections": state["detections"],
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.route('/devices', methods=['GET'])
+def get_devices():
+    """List connected cameras and their per-device state"""
+    now = time.time()
+    cameras = []
+    for state in list_device_states():
+        cameras.append({
+            "device": state["device_id"],
+            "is_recording": state["is_recording"],
+            "recording_trigger": state["recording_trigger"],
+            "current_video": state["current_filename"],
+            "detections": len(state["detections"]),
+            "frames_received": state["frames_received"],
+            "frames_dropped": state["frames_dropped"],
+            "frames_skipped": state["frames_skipped"],
+            "frames_processed": state["frames_processed"],
+            "decode_errors": state["decode_errors"],
+            "preroll": state["preroll"].get_stats(),
+            "recording": get_clip_stats(state),
+            "seconds_since_frame": (now - state["last_frame_time"]) if state["last_frame_time"] else None
+        })
+    
     return jsonify({
-        "is_recording": recording_state["is_recording"],
-        "both_detected": recording_state["both_detected"],
-        "current_video": recording_state["current_filename"],
-        "detections": recording_state["detections"],
+        "devices": cameras,
+        "count": len(cameras),
         "timestamp": datetime.now().isoformat()
     })
 
 
 @app.route('/videos', methods=['GET'])
 def get_videos():
-    """Get list of all recorded videos"""
+    """
+    Page through recorded videos from the catalog (newest first, no directory scan).
+    
+    Query: limit (default 50, max 200), cursor (next_cursor of the previous page),
+    trigger (ai / proximity), device, since / until (epoch seconds or ISO time),
+    event (event_id: all segments of one interaction).
+    """
+    try:
+        since = parse_time_param(request.args.get('since'))
+        until = parse_time_param(request.args.get('until'))
+        rows, next_cursor = video_catalog.list(
+            limit=request.args.get('limit', default=50, type=int),
+            cursor=request.args.get('cursor'),
+            trigger=request.args.get('trigger'),
+            device=request.args.get('device'),
+            since=since,
+            until=until,
+            event_id=request.args.get('event')
+        )
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid query: {e}"}), 400
+    
     videos = []
-    for video_file in sorted(VIDEOS_DIR.glob('*.mp4'), key=lambda x: x.stat().st_ctime, reverse=True):
+    for row in rows:
+        size = row['size']
+        if size is None:
+            # Still recording: the only file we stat
+            video_path = VIDEOS_DIR / row['filename']
+            size = video_path.stat().st_size if video_path.exists() else 0
         videos.append({
-            'filename': video_file.name,
-            'size': video_file.stat().st_size,
-            'created': datetime.fromtimestamp(video_file.stat().st_ctime).isoformat(),
-            'url': f'/videos/{video_file.name}'
+            'filename': row['filename'],
+            'size': size,
+            'created': datetime.fromtimestamp(row['started_at']).isoformat(),
+            'url': f'/videos/{row["filename"]}',
+            'thumb_url': f'/videos/{row["filename"]}/thumb',
+            'sprite_url': f'/videos/{row["filename"]}/thumb?kind=sprite',
+            'device': row['device'],
+            'event_id': row['event_id'],
+            'segment': row['segment'],
+            'trigger': row['trigger'],
+            'status': row['status'],
+            'duration': row['duration'],
+            'frame_count': row['frame_count'],
+            'frames_dropped': row['frames_dropped'],
+            'width': row['width'],
+            'height': row['height'],
+            'detections': {
+                'max_humans': row['max_humans'],
+                'max_cats': row['max_cats'],
+                'detection_frames': row['detection_frames']
+            }
         })
     
     return jsonify({
         'videos': videos,
-        'count': len(videos)
+        'count': len(videos),
+        'total': video_catalog.count(),
+        'next_cursor': next_cursor
     })
 
 
+def parse_time_param(value):
+    """?since= / ?until= as epoch seconds or ISO 8601 -> epoch seconds (None if absent)"""
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
 # ESP32 MOTOR CONTROL ENDPOINTS - Commented out (see hardware_part/esp32_motor_control folder)
 # Uncomment these and install pyserial to enable motor control via serial
 # OR use HTTP requests to ESP32 web server (recommended)
@@ -678,46 +2705,164 @@ def get_videos():
 #     })
 
 
+def clip_path(filename):
+    """Path of a recorded clip, or None for names that are not clips (hidden files, other suffixes)"""
+    if filename.startswith('.') or Path(filename).suffix not in VIDEO_MIMETYPES:
+        return None
+    return VIDEOS_DIR / filename
+
+
 @app.route('/videos/<filename>', methods=['GET'])
 def get_video(filename):
     """Download a specific video file"""
     try:
-        video_path = VIDEOS_DIR / filename
+        video_path = clip_path(filename)
         
-        if not video_path.exists():
+        if video_path is None or not video_path.is_file():
             return jsonify({"error": "Video not found"}), 404
         
-        return send_file(
-            video_path,
-            mimetype='video/mp4',
+        # conditional=True: Range -> 206 Partial Content, plus ETag/If-Modified-Since.
+        # The file is streamed in blocks (or via wsgi.file_wrapper/sendfile when the server has it).
+        return send_from_directory(
+            VIDEOS_DIR,
+            filename,
+            mimetype=VIDEO_MIMETYPES.get(video_path.suffix, 'application/octet-stream'),
             as_attachment=False,
-            download_name=filename
+            conditional=True
         )
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/analytics/summary', methods=['GET'])
+def analytics_summary():
+    """Detection counts per class, frames with both classes, time range (?since ?until ?device)"""
+    try:
+        since = parse_time_param(request.args.get('since'))
+        until = parse_time_param(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid time: {e}"}), 400
+    
+    summary = detection_log.summary(since, until, request.args.get('device'))
+    summary.update({"since": since, "until": until, "device": request.args.get('device')})
+    return jsonify(summary)
+
+
+@app.route('/analytics/timeline', methods=['GET'])
+def analytics_timeline():
+    """
+    Frames with a human / cat / both per time bucket.
+    Query: since (default 24 h ago), until, bucket (seconds, default 3600), device.
+    """
+    try:
+        since = parse_time_param(request.args.get('since'))
+        until = parse_time_param(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid time: {e}"}), 400
+    if since is None:
+        since = time.time() - 86400
+    bucket = max(1, request.args.get('bucket', default=3600, type=int))
+    
+    return jsonify({
+        "since": since,
+        "until": until,
+        "bucket_seconds": bucket,
+        "buckets": detection_log.timeline(since, until, bucket, request.args.get('device'))
+    })
+
+
+@app.route('/analytics/detections', methods=['GET'])
+def analytics_detections():
+    """Raw logged detections, newest first (?since ?until ?device ?class ?limit)"""
+    try:
+        since = parse_time_param(request.args.get('since'))
+        until = parse_time_param(request.args.get('until'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid time: {e}"}), 400
+    limit = max(1, min(ANALYTICS_MAX_ROWS, request.args.get('limit', default=1000, type=int)))
+    
+    rows = detection_log.rows(since, until, request.args.get('device'), request.args.get('class'), limit)
+    return jsonify({"detections": rows, "count": len(rows)})
+
+
+@app.route('/videos/<filename>/thumb', methods=['GET'])
+def get_video_thumbnail(filename):
+    """
+    Poster JPEG (?kind=poster, default) or preview sprite (?kind=sprite) of a clip.
+    
+    Normally rendered by the finalize worker when the clip is saved; clips from
+    before that (or still recording) are rendered on first request.
+    """
+    kind = request.args.get('kind', 'poster')
+    if kind not in ('poster', 'sprite'):
+        return jsonify({"error": "kind must be 'poster' or 'sprite'"}), 400
+    
+    video_path = clip_path(filename)
+    if video_path is None:
+        return jsonify({"error": "Video not found"}), 404
+    poster_path, sprite_path = thumbnail_paths(filename)
+    thumb_path = poster_path if kind == 'poster' else sprite_path
+    
+    if not thumb_path.exists():
+        if not video_path.is_file():
+            return jsonify({"error": "Video not found"}), 404
+        if not generate_thumbnails(video_path):
+            return jsonify({"error": "No frames to render yet"}), 404
+    
+    response = send_from_directory(THUMBS_DIR, thumb_path.name, mimetype='image/jpeg', conditional=True)
+    if kind == 'sprite':
+        response.headers["X-Sprite-Tiles"] = str(SPRITE_TILES)
+        response.headers["X-Tile-Width"] = str(SPRITE_TILE_WIDTH)
+    return response
+
+
 @app.route('/videos/<filename>', methods=['DELETE'])
 def delete_video(filename):
     """Delete a specific video file"""
     try:
-        video_path = VIDEOS_DIR / filename
+        video_path = clip_path(filename)
+        if video_path is None:
+            return jsonify({"error": "Video not found"}), 404
         
-        if not video_path.exists():
+        if not video_path.is_file():
+            video_catalog.remove(filename)  # Drop a stale catalog entry, if any
             return jsonify({"error": "Video not found"}), 404
         
-        video_path.unlink()
+        delete_clip_files(filename)
         return jsonify({"message": "Video deleted successfully"})
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+def current_config():
+    """Settings exposed by /config (GET, and the POST response after an update)"""
+    return {
+        "confidence": CONFIDENCE_THRESHOLD,
+        "cooldown": COOLDOWN_SECONDS,
+        "batch_size": INFERENCE_BATCH_SIZE,
+        "batch_wait_ms": INFERENCE_BATCH_WAIT_MS,
+        "decode_reduced_factor": DECODE_REDUCED_FACTOR,
+        "motion_gating": MOTION_GATING,
+        "motion_threshold": MOTION_AREA_THRESHOLD,
+        "motion_max_skip_seconds": MOTION_MAX_SKIP_SECONDS,
+        "tracking": TRACKING_ENABLED,
+        "tracking_max_interval": TRACKING_MAX_INTERVAL,
+        "adaptive": ADAPTIVE_CONTROL,
+        "latency_target_ms": LATENCY_TARGET_MS,
+        "preroll_seconds": PREROLL_SECONDS,
+        "recording_mode": RECORDING_MODE
+    }
+
+
 @app.route('/config', methods=['GET', 'POST'])
 def config():
     """Get or update configuration"""
-    global CONFIDENCE_THRESHOLD, COOLDOWN_SECONDS
+    global CONFIDENCE_THRESHOLD, COOLDOWN_SECONDS, INFERENCE_BATCH_SIZE, INFERENCE_BATCH_WAIT_MS
+    global DECODE_REDUCED_FACTOR, MOTION_GATING, MOTION_AREA_THRESHOLD, MOTION_MAX_SKIP_SECONDS
+    global TRACKING_ENABLED, TRACKING_MAX_INTERVAL, ADAPTIVE_CONTROL, LATENCY_TARGET_MS
+    global PREROLL_SECONDS, RECORDING_MODE
     
     if request.method == 'POST':
         data = request.get_json()
@@ -728,17 +2873,54 @@ def config():
         if 'cooldown' in data:
             COOLDOWN_SECONDS = float(data['cooldown'])
         
-        return jsonify({
-            "message": "Configuration updated",
-            "confidence": CONFIDENCE_THRESHOLD,
-            "cooldown": COOLDOWN_SECONDS
-        })
+        if 'batch_size' in data:
+            INFERENCE_BATCH_SIZE = max(1, int(data['batch_size']))
+        
+        if 'batch_wait_ms' in data:
+            INFERENCE_BATCH_WAIT_MS = max(0.0, float(data['batch_wait_ms']))
+        
+        if 'decode_reduced_factor' in data:
+            factor = int(data['decode_reduced_factor'])
+            if factor not in DECODE_FLAGS:
+                return jsonify({"error": "decode_reduced_factor must be 1, 2, 4 or 8"}), 400
+            DECODE_REDUCED_FACTOR = factor
+        
+        if 'motion_gating' in data:
+            MOTION_GATING = bool(data['motion_gating'])
+        
+        if 'motion_threshold' in data:
+            MOTION_AREA_THRESHOLD = max(0.0, float(data['motion_threshold']))
+        
+        if 'motion_max_skip_seconds' in data:
+            MOTION_MAX_SKIP_SECONDS = max(0.0, float(data['motion_max_skip_seconds']))
+        
+        if 'tracking' in data:
+            TRACKING_ENABLED = bool(data['tracking'])
+            # Tracks may be stale after a pause - start again from a detector frame
+            for state in list_device_states():
+                state["tracker"].force_detect = True
+        
+        if 'tracking_max_interval' in data:
+            TRACKING_MAX_INTERVAL = max(TRACKING_MIN_INTERVAL, int(data['tracking_max_interval']))
+        
+        if 'adaptive' in data:
+            ADAPTIVE_CONTROL = bool(data['adaptive'])
+        
+        if 'latency_target_ms' in data:
+            LATENCY_TARGET_MS = max(10.0, float(data['latency_target_ms']))
+        
+        if 'preroll_seconds' in data:
+            PREROLL_SECONDS = max(0.0, float(data['preroll_seconds']))
+        
+        if 'recording_mode' in data:
+            if data['recording_mode'] not in ("reencode", "passthrough", "ffmpeg"):
+                return jsonify({"error": "recording_mode must be 'reencode', 'passthrough' or 'ffmpeg'"}), 400
+            RECORDING_MODE = data['recording_mode']  # Applies from the next clip
+        
+        return jsonify({"message": "Configuration updated", **current_config()})
     
     else:
-        return jsonify({
-            "confidence": CONFIDENCE_THRESHOLD,
-            "cooldown": COOLDOWN_SECONDS
-        })
+        return jsonify(current_config())
 
 
 # Global camera thread
@@ -756,6 +2938,22 @@ def main():
     # Load model
     load_model()
     
+    # Sync the video catalog with files added/removed while the server was down
+    added, removed, recovered = video_catalog.reconcile(VIDEOS_DIR)
+    print(f"🗂️  Video catalog: {video_catalog.count()} clips ({added} added, {removed} removed, "
+          f"{recovered} interrupted recordings recovered on startup)")
+    
+    # Byte quota / max age, checked now, after every saved clip and periodically
+    retention_wake.set()
+    threading.Thread(target=retention_worker, daemon=True).start()
+    
+    # Re-encode archived clips at low priority, paused while the live pipeline is busy
+    if COMPACTION_ENABLED:
+        if encoder_available(COMPACTION_ENCODER):
+            threading.Thread(target=compaction_worker, daemon=True).start()
+        else:
+            print(f"⚠️  Compaction disabled: ffmpeg with {COMPACTION_ENCODER} not found")
+    
     # ARDUINO MOTOR CONTROL - Commented out (see arduino_motor_control folder)
     # Uncomment this section and install pyserial to enable Arduino motor control
     # try:
@@ -780,10 +2978,6 @@ def main():
     #     print(f"⚠️  Arduino connection failed: {e}")
     #     print("   Motor control will be disabled")
     
-    # Start video writer thread (daemon so it exits with main program)
-    writer_thread = threading.Thread(target=video_writer_thread, daemon=True)
-    writer_thread.start()
-    
     # Start camera thread
     camera_thread = CameraThread()
     camera_thread.start()
@@ -797,34 +2991,54 @@ def main():
     local_ip = socket.gethostbyname(hostname)
     
     print("\n📱 iOS App Configuration:")
-    print(f"   Server URL: http://{local_ip}:5001")
-    print(f"   Live Stream: http://{local_ip}:5001/stream/live")
-    print(f"   MJPEG Stream: http://{local_ip}:5001/stream/mjpeg")
+    print(f"   Server URL: http://{local_ip}:{SERVER_PORT} ({SERVER_MODE})")
+    print(f"   Live Stream: http://{local_ip}:{SERVER_PORT}/stream/live")
+    print(f"   Live Frame (JPEG): http://{local_ip}:{SERVER_PORT}/stream/frame")
+    print(f"   MJPEG Stream: http://{local_ip}:{SERVER_PORT}/stream/mjpeg")
+    print(f"   Events (SSE): http://{local_ip}:{SERVER_PORT}/events")
     print(f"\n📂 PATHS:")
     print(f"   Model: {MODEL_PATH}")
     print(f"   Model exists: {MODEL_PATH.exists()}")
+    print(f"   Inference backend: {INFERENCE_BACKEND} ({MODEL_PATHS[INFERENCE_BACKEND]})")
     print(f"   Videos dir: {VIDEOS_DIR.absolute()}")
     print(f"   Videos dir exists: {VIDEOS_DIR.exists()}")
     print(f"\n🎯 Settings:")
     print(f"   Confidence threshold: {CONFIDENCE_THRESHOLD}")
     print(f"   Recording cooldown: {COOLDOWN_SECONDS} seconds")
+    print(f"   Inference batch: up to {INFERENCE_BATCH_SIZE} frames / {INFERENCE_BATCH_WAIT_MS} ms")
+    print(f"   JPEG decode: {DECODE_WORKERS} workers, 1/{DECODE_REDUCED_FACTOR} size")
+    print(f"   Motion gating: {'on' if MOTION_GATING else 'off'} (threshold {MOTION_AREA_THRESHOLD:.1%}, forced every {MOTION_MAX_SKIP_SECONDS}s)")
+    print(f"   Tracking: {'on' if TRACKING_ENABLED else 'off'} (detect every {TRACKING_MIN_INTERVAL}-{TRACKING_MAX_INTERVAL} frames)")
+    print(f"   Rate control: {'on' if ADAPTIVE_CONTROL else 'off'} (target {LATENCY_TARGET_MS} ms end-to-end)")
     print(f"   Camera: {'ESP32-S3' if use_esp32_camera else f'Webcam {CAMERA_ID}'}")
     print("\n🚀 Starting server...")
     print("="*70 + "\n")
     
     try:
-        # Run Flask server
-        app.run(
-            host='0.0.0.0',
-            port=5001,
-            debug=False,
-            threaded=True
-        )
+        if SERVER_MODE == "asgi":
+            # Event loop serves streams/ingest; camera and inference threads keep running as before
+            from asgi_server import run_asgi_server
+            run_asgi_server(sys.modules[__name__], host='0.0.0.0', port=SERVER_PORT)
+        else:
+            # Run Flask server
+            app.run(
+                host='0.0.0.0',
+                port=SERVER_PORT,
+                debug=False,
+                threaded=True
+            )
     finally:
         # Cleanup
         if camera_thread:
             camera_thread.stop()
-        stop_recording()
+        clips = [stop_recording(state) for state in list_device_states()]
+        for clip in clips:
+            if clip is not None:
+                clip["done"].wait(timeout=30)  # Writer threads flush their queues first
+        clip_compactor.stop()
+        decode_executor.shutdown(wait=False)
+        finalize_executor.shutdown(wait=True)  # Let pending faststart/thumbnail jobs finish
+        detection_log.close()
         print("\n👋 Server stopped")
 
 
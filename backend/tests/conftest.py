@@ -0,0 +1,23 @@
+"""Make the backend modules importable as top-level modules, as the server does; shared catalog helpers"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from video_catalog import VideoCatalog  # noqa: E402
+
+SUMMARY = {"max_humans": 1, "max_cats": 1, "detection_frames": 10}
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return VideoCatalog(tmp_path / "catalog.sqlite3")
+
+
+def add_clip(catalog, filename, started_at, size=1000, device="cam", trigger="ai", **kwargs):
+    """A finished 10 s clip of 100 frames"""
+    catalog.add_recording(filename, device, trigger, started_at, 640, 480, **kwargs)
+    catalog.finish_recording(filename, started_at + 10, 100, 0, size, SUMMARY)
@@ -0,0 +1,69 @@
+"""MjpegAviWriter: JPEG bytes in, playable MJPEG AVI out"""
+
+import cv2
+import numpy as np
+
+from avi_writer import MjpegAviWriter, jpeg_dimensions
+
+
+def jpeg(value, width=64, height=48, progressive=False):
+    params = [cv2.IMWRITE_JPEG_PROGRESSIVE, 1] if progressive else []
+    return cv2.imencode(".jpg", np.full((height, width, 3), value, np.uint8), params)[1].tobytes()
+
+
+def test_jpeg_dimensions():
+    assert jpeg_dimensions(jpeg(0, 64, 48)) == (64, 48)
+    assert jpeg_dimensions(jpeg(0, 33, 17, progressive=True)) == (33, 17)
+    assert jpeg_dimensions(b"\xff\xd8not a jpeg") is None
+
+
+def test_frames_play_back_in_order(tmp_path):
+    path = tmp_path / "clip.avi"
+    writer = MjpegAviWriter(path)
+    for i in range(20):
+        assert writer.write(jpeg(i * 10), 100.0 + i * 0.1)
+    writer.release()
+
+    assert (writer.width, writer.height, writer.frame_count) == (64, 48, 20)
+    assert abs(writer.fps - 10.0) < 1e-6
+
+    capture = cv2.VideoCapture(str(path))
+    assert capture.get(cv2.CAP_PROP_FRAME_COUNT) == 20
+    assert abs(capture.get(cv2.CAP_PROP_FPS) - 10.0) < 0.01
+    means = []
+    while True:
+        ok, frame = capture.read()
+        if not ok:
+            break
+        means.append(round(frame.mean() / 10))
+    capture.release()
+    assert means == list(range(20))
+
+
+def test_frames_not_newer_than_the_last_are_skipped(tmp_path):
+    writer = MjpegAviWriter(tmp_path / "clip.avi")
+
+    assert writer.write(jpeg(0), 1.0)
+    assert writer.write(jpeg(0), 2.0)
+    assert not writer.write(jpeg(0), 2.0)  # Already written (e.g. as pre-roll)
+    assert not writer.write(jpeg(0), 1.5)
+    writer.release()
+
+    assert writer.frame_count == 2
+
+
+def test_unreadable_first_frame_is_rejected(tmp_path):
+    writer = MjpegAviWriter(tmp_path / "clip.avi")
+
+    assert not writer.write(b"\xff\xd8\xff\xd9", 1.0)
+    assert writer.write(jpeg(0), 2.0)
+    writer.release()
+
+    assert writer.frame_count == 1
+
+
+def test_release_twice_is_harmless(tmp_path):
+    writer = MjpegAviWriter(tmp_path / "clip.avi")
+    writer.write(jpeg(0), 1.0)
+    writer.release()
+    writer.release()
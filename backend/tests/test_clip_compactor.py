@@ -0,0 +1,66 @@
+"""clip_compactor: which frames to keep and the ffmpeg command"""
+
+from pathlib import Path
+
+from clip_compactor import ClipCompactor, keep_ranges
+
+
+def ranges(detection_times, preroll_frames=0, frame_count=100, padding=1.0):
+    """10 s clip starting at t=100: 10 live frames per second after the pre-roll"""
+    return keep_ranges(detection_times, 100.0, 110.0, frame_count, preroll_frames, padding)
+
+
+def test_padding_around_one_detection():
+    assert ranges([105.0]) == [(40, 60)]
+    assert ranges([105.0], padding=0.5) == [(45, 55)]
+
+
+def test_separate_detections_stay_separate():
+    assert ranges([101.0, 108.0]) == [(0, 20), (70, 90)]
+
+
+def test_overlapping_and_adjacent_ranges_merge():
+    assert ranges([105.0, 106.0]) == [(40, 70)]
+    assert ranges([102.0, 104.125]) == [(10, 51)]  # (10, 30) + (31, 51) leave no gap
+    assert ranges([102.0, 104.25]) == [(10, 30), (32, 52)]  # Frame 31 is not kept
+    assert ranges([105.0, 105.2, 105.4]) == [(40, 64)]
+
+
+def test_ranges_are_clamped_to_the_clip():
+    assert ranges([100.2]) == [(0, 12)]
+    assert ranges([109.9]) == [(89, 99)]
+
+
+def test_preroll_frames_shift_the_live_frames():
+    # 20 pre-roll frames, then 100 live frames over the 10 s
+    assert ranges([105.0], preroll_frames=20, frame_count=120) == [(60, 80)]
+    assert ranges([100.0], preroll_frames=20, frame_count=120) == [(10, 30)]
+
+
+def test_whole_clip_is_kept_without_usable_timing():
+    assert ranges([]) is None
+    assert keep_ranges([105.0], 100.0, None, 100, 0, 1.0) is None
+    assert keep_ranges([105.0], 100.0, 100.0, 100, 0, 1.0) is None
+    assert ranges([105.0], preroll_frames=100) is None
+
+
+def test_command_cuts_and_retimes_kept_frames():
+    compactor = ClipCompactor(encoder="libx264", threads=2)
+
+    command = compactor.command(Path("in.avi"), Path("out.mp4"), keep=[(0, 10), (20, 30)], fps=9.5)
+
+    vf = command[command.index("-vf") + 1]
+    assert vf == "select='between(n,0,10)+between(n,20,30)',setpts=N/(9.5000*TB)"
+    assert command[command.index("-vsync") + 1] == "vfr"
+    assert command[command.index("-i") + 1] == "in.avi"
+    assert "-an" in command
+    assert "-tag:v" not in command
+    assert command[-3:] == ["-f", "mp4", "out.mp4"]
+    assert command[command.index("-movflags") + 1] == "+faststart"
+
+
+def test_command_without_cut_reencodes_everything():
+    command = ClipCompactor(encoder="libx265").command(Path("in.mp4"), Path("out.mp4"))
+
+    assert "-vf" not in command
+    assert command[command.index("-tag:v") + 1] == "hvc1"
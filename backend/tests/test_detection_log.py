@@ -0,0 +1,91 @@
+"""DetectionLog: batched writes and the /analytics aggregates"""
+
+import pytest
+
+from detection_log import DetectionLog
+
+
+def det(cls, conf=0.9, bbox=(0, 0, 10, 10)):
+    return {"class": cls, "confidence": conf, "bbox": list(bbox)}
+
+
+@pytest.fixture
+def log(tmp_path):
+    detection_log = DetectionLog(tmp_path / "detections.sqlite3", flush_seconds=60)
+    yield detection_log
+    detection_log.close()
+
+
+def test_log_only_queues_until_flush(log):
+    log.log("cam", 1, 100.0, [det("human")])
+
+    assert log.get_stats()["pending_frames"] == 1
+    assert log.flush() == 1
+    assert log.get_stats()["rows_written"] == 1
+
+
+def test_summary_counts_frames_and_interactions(log):
+    log.log("cam", 1, 100.0, [det("human", 0.8), det("cat", 0.6)])  # Interaction
+    log.log("cam", 2, 101.0, [det("human", 0.6), det("human", 0.4)])
+    log.log("cam", 3, 102.0, [det("cat", 0.9)])
+    log.log("other", 1, 100.0, [det("cat", 0.5)])  # Same timestamp, other camera
+
+    summary = log.summary()
+
+    assert summary["frames_with_detections"] == 4
+    assert summary["interaction_frames"] == 1
+    assert summary["classes"]["human"] == {"detections": 3, "frames": 2, "avg_confidence": 0.6}
+    assert summary["classes"]["cat"]["detections"] == 3
+    assert summary["classes"]["cat"]["frames"] == 3
+    assert (summary["first"], summary["last"]) == (100.0, 102.0)
+
+
+def test_summary_filters_by_device_and_time(log):
+    log.log("cam", 1, 100.0, [det("human"), det("cat")])
+    log.log("cam", 2, 200.0, [det("human")])
+    log.log("other", 1, 150.0, [det("cat")])
+
+    assert log.summary(device="cam")["frames_with_detections"] == 2
+    assert log.summary(device="unknown")["frames_with_detections"] == 0
+    windowed = log.summary(since=120.0, until=200.0)
+    assert windowed["frames_with_detections"] == 1
+    assert windowed["interaction_frames"] == 0
+
+
+def test_timeline_buckets(log):
+    log.log("cam", 1, 3600.0, [det("human", 0.5), det("cat", 0.7)])
+    log.log("cam", 2, 3700.0, [det("human", 0.9)])
+    log.log("cam", 3, 7300.0, [det("cat", 0.4)])
+
+    timeline = log.timeline(0, 10000, 3600)
+
+    assert timeline == [
+        {"start": 3600, "human_frames": 2, "cat_frames": 1, "interaction_frames": 1, "max_confidence": 0.9},
+        {"start": 7200, "human_frames": 0, "cat_frames": 1, "interaction_frames": 0, "max_confidence": 0.4}
+    ]
+
+
+def test_rows_newest_first_with_labels(log):
+    log.log("cam", 1, 100.0, [det("human", 0.91234, (1.04, 2, 3, 4))], source="tracker")
+    log.log("cam", 2, 101.0, [det("cat")])
+
+    rows = log.rows(limit=10)
+
+    assert [row["class"] for row in rows] == ["cat", "human"]
+    assert rows[1]["source"] == "tracker"
+    assert rows[1]["confidence"] == 0.912
+    assert rows[1]["bbox"] == [1.0, 2.0, 3.0, 4.0]
+    assert rows[1]["device"] == "cam"
+    assert len(log.rows(cls="human")) == 1
+
+
+def test_frame_times_are_distinct_and_in_range(log):
+    log.log("cam", 1, 100.0, [det("human"), det("cat")])  # Two rows, one frame
+    log.log("cam", 3, 102.5, [det("cat")])
+    log.log("cam", 2, 101.0, [det("human")])
+    log.log("cam", 4, 110.0, [det("human")])  # At `until`: excluded
+    log.log("other", 1, 105.0, [det("cat")])
+
+    assert log.frame_times(100.0, 110.0, "cam") == [100.0, 101.0, 102.5]
+    assert log.frame_times(101.0, 120.0) == [101.0, 102.5, 105.0, 110.0]
+    assert log.frame_times(100.0, 110.0, "unknown") == []
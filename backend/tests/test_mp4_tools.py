@@ -0,0 +1,87 @@
+"""mp4_tools: per-frame durations (stts rewrite) for VFR clips"""
+
+import struct
+
+import cv2
+import numpy as np
+import pytest
+
+from mp4_tools import build_stts, faststart, frame_durations, is_faststart, set_frame_times
+
+
+def write_clip(path, frames, fps=30):
+    """Clip with moov at the end and no B-frames, like the recorders write"""
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, (64, 48))
+    for i in range(frames):
+        writer.write(np.full((48, 64, 3), i * 8 % 256, np.uint8))
+    writer.release()
+    if not path.exists() or path.stat().st_size == 0:
+        pytest.skip("OpenCV was built without an MP4 writer")
+
+
+def frame_timestamps(path):
+    capture = cv2.VideoCapture(str(path))
+    times = []
+    while capture.grab():
+        times.append(capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0)
+    capture.release()
+    return times
+
+
+def test_frame_durations_round_on_the_running_total():
+    times = [0.0, 0.1, 0.2, 0.3]  # 0.1 is not exact in binary or in 1/90000 ticks
+    assert frame_durations(times, 90000) == [9000, 9000, 9000, 9000]
+    assert frame_durations([5.0, 5.0004, 5.1], 1000) == [1, 100, 100]  # Never 0
+    assert frame_durations([1.0], 1000) == [100]
+
+
+def test_build_stts_run_length_encodes():
+    atom = build_stts([10, 10, 10, 20, 10])
+    size, atom_type, _, count = struct.unpack_from(">I4sII", atom)
+    entries = [struct.unpack_from(">II", atom, 16 + 8 * i) for i in range(count)]
+
+    assert atom_type == b"stts" and size == len(atom)
+    assert entries == [(3, 10), (1, 20), (1, 10)]
+
+
+def test_set_frame_times_gives_each_frame_its_capture_time(tmp_path):
+    path = tmp_path / "clip.mp4"
+    write_clip(path, 6)
+    capture_times = [100.0, 100.1, 100.3, 100.35, 100.8, 101.0]
+
+    assert set_frame_times(path, capture_times)
+    assert [p.name for p in tmp_path.iterdir()] == ["clip.mp4"]  # Swapped in, no temp file left
+
+    played = frame_timestamps(path)
+    expected = [t - capture_times[0] for t in capture_times]
+    assert len(played) == 6
+    assert played == pytest.approx(expected, abs=0.002)
+
+
+def test_set_frame_times_then_faststart(tmp_path):
+    path = tmp_path / "clip.mp4"
+    write_clip(path, 4)
+    capture_times = [0.0, 0.5, 0.6, 1.5]
+
+    assert set_frame_times(path, capture_times)
+    assert faststart(path)
+
+    assert is_faststart(path)
+    assert frame_timestamps(path) == pytest.approx(capture_times, abs=0.002)
+
+
+def test_set_frame_times_refuses_a_sample_count_mismatch(tmp_path):
+    path = tmp_path / "clip.mp4"
+    write_clip(path, 5)
+    before = path.read_bytes()
+
+    assert not set_frame_times(path, [0.0, 0.1, 0.2])
+    assert path.read_bytes() == before
+
+
+def test_set_frame_times_needs_moov_at_the_end(tmp_path):
+    path = tmp_path / "clip.mp4"
+    write_clip(path, 3)
+    faststart(path)
+
+    assert not set_frame_times(path, [0.0, 0.1, 0.2])
@@ -0,0 +1,137 @@
+"""VideoCatalog: retention math, event segments and startup reconcile"""
+
+import cv2
+import numpy as np
+import pytest
+
+from conftest import add_clip
+
+DAY = 86400
+
+
+def add_clips(catalog, count, size=1000):
+    """clip_0 (oldest) .. clip_{count-1}, one day apart"""
+    for i in range(count):
+        add_clip(catalog, f"clip_{i}.mp4", i * DAY, size=size)
+
+
+def test_within_all_limits_deletes_nothing(catalog):
+    add_clips(catalog, 3)
+
+    assert catalog.retention_candidates(max_bytes=3000, max_age_seconds=10 * DAY, keep=3, now=3 * DAY) == []
+    assert catalog.retention_candidates() == []
+
+
+def test_quota_deletes_oldest_until_under(catalog):
+    add_clips(catalog, 5)
+
+    assert catalog.retention_candidates(max_bytes=2500) == ["clip_0.mp4", "clip_1.mp4", "clip_2.mp4"]
+    assert catalog.retention_candidates(max_bytes=3000) == ["clip_0.mp4", "clip_1.mp4"]
+
+
+def test_quota_counts_sizes_not_clips(catalog):
+    add_clip(catalog, "big.mp4", 0, size=9000)
+    add_clip(catalog, "small_1.mp4", DAY, size=100)
+    add_clip(catalog, "small_2.mp4", 2 * DAY, size=100)
+
+    assert catalog.retention_candidates(max_bytes=5000) == ["big.mp4"]
+
+
+def test_age_limit(catalog):
+    add_clips(catalog, 5)
+
+    candidates = catalog.retention_candidates(max_age_seconds=2 * DAY, now=4 * DAY + 1)
+
+    assert candidates == ["clip_0.mp4", "clip_1.mp4", "clip_2.mp4"]
+
+
+def test_age_limit_needs_now(catalog):
+    add_clips(catalog, 3)
+
+    assert catalog.retention_candidates(max_age_seconds=DAY) == []
+
+
+def test_keep_newest_count(catalog):
+    add_clips(catalog, 5)
+
+    assert catalog.retention_candidates(keep=2) == ["clip_0.mp4", "clip_1.mp4", "clip_2.mp4"]
+    assert catalog.retention_candidates(keep=0) == [f"clip_{i}.mp4" for i in range(5)]
+
+
+def test_limits_combine(catalog):
+    add_clips(catalog, 6)
+
+    # Age removes clip_0, the count clip_1, the quota clip_2
+    candidates = catalog.retention_candidates(max_bytes=3000, max_age_seconds=5 * DAY - 1, keep=4, now=5 * DAY)
+
+    assert candidates == ["clip_0.mp4", "clip_1.mp4", "clip_2.mp4"]
+
+
+def test_clips_still_recording_are_never_candidates(catalog):
+    catalog.add_recording("live.mp4", "cam", "ai", 0, 640, 480)
+    catalog.update("live.mp4", size=50000)
+    add_clips(catalog, 2)
+
+    candidates = catalog.retention_candidates(max_bytes=1000, keep=0)
+
+    assert "live.mp4" not in candidates
+    assert candidates == ["clip_0.mp4", "clip_1.mp4"]
+
+
+def test_list_by_event_returns_its_segments(catalog):
+    add_clip(catalog, "a_0.mp4", 1000.0, event_id="event_a", segment=0)
+    add_clip(catalog, "b_0.mp4", 1005.0, event_id="event_b", segment=0)
+    add_clip(catalog, "a_1.mp4", 1010.0, event_id="event_a", segment=1)
+
+    rows, cursor = catalog.list(event_id="event_a")
+
+    assert [(row["filename"], row["segment"]) for row in rows] == [("a_1.mp4", 1), ("a_0.mp4", 0)]
+    assert cursor is None
+
+
+def write_clip(path, frames=5):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), 10, (64, 48))
+    for _ in range(frames):
+        writer.write(np.zeros((48, 64, 3), np.uint8))
+    writer.release()
+    if not path.exists() or path.stat().st_size == 0:
+        pytest.skip("OpenCV was built without an MP4 writer")
+
+
+def test_reconcile_syncs_with_the_directory(tmp_path, catalog):
+    videos = tmp_path / "videos"
+    videos.mkdir()
+    write_clip(videos / "untracked.mp4")
+    write_clip(videos / "known.mp4")
+    add_clip(catalog, "known.mp4", 1000.0)
+    add_clip(catalog, "gone.mp4", 1001.0)
+    (videos / "notes.txt").write_text("not a clip")
+
+    added, removed, recovered = catalog.reconcile(videos)
+
+    assert (added, removed, recovered) == (1, 1, 0)
+    assert catalog.get("gone.mp4") is None
+    row = catalog.get("untracked.mp4")
+    assert row["status"] == "finished"
+    assert row["frame_count"] == 5
+    assert row["size"] == (videos / "untracked.mp4").stat().st_size
+
+
+def test_reconcile_recovers_or_deletes_interrupted_clips(tmp_path, catalog):
+    videos = tmp_path / "videos"
+    videos.mkdir()
+    write_clip(videos / "good.mp4")
+    (videos / "bad.mp4").write_bytes(b"\x00\x00\x00\x18ftypisom" + bytes(500))  # Crashed before the moov
+    catalog.add_recording("good.mp4", "cam", "ai", 1000.0, 64, 48)
+    catalog.add_recording("bad.mp4", "cam", "ai", 1001.0, 64, 48)
+
+    added, removed, recovered = catalog.reconcile(videos)
+
+    assert (added, removed, recovered) == (0, 1, 1)
+    assert catalog.get("bad.mp4") is None
+    assert not (videos / "bad.mp4").exists()
+    row = catalog.get("good.mp4")
+    assert row["status"] == "finished"
+    assert row["frame_count"] == 5
+    assert row["size"] == (videos / "good.mp4").stat().st_size
+    assert row["duration"] == pytest.approx(0.5, abs=0.01)
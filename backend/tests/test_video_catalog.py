@@ -0,0 +1,168 @@
+"""VideoCatalog: keyset pagination and filters"""
+
+import sqlite3
+
+from conftest import SUMMARY, add_clip
+from video_catalog import VideoCatalog, decode_cursor, encode_cursor
+
+
+def all_pages(catalog, limit, **filters):
+    pages = []
+    cursor = None
+    while True:
+        rows, cursor = catalog.list(limit=limit, cursor=cursor, **filters)
+        pages.append([row["filename"] for row in rows])
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    row = {"started_at": 1700000000.25, "filename": "interaction_a.mp4"}
+    assert decode_cursor(encode_cursor(row)) == (1700000000.25, "interaction_a.mp4")
+
+
+def test_pages_cover_every_clip_newest_first(catalog):
+    for i in range(7):
+        add_clip(catalog, f"clip_{i}.mp4", 1000.0 + i)
+
+    pages = all_pages(catalog, limit=3)
+
+    assert pages == [
+        ["clip_6.mp4", "clip_5.mp4", "clip_4.mp4"],
+        ["clip_3.mp4", "clip_2.mp4", "clip_1.mp4"],
+        ["clip_0.mp4"]
+    ]
+
+
+def test_exact_page_size_has_no_next_cursor(catalog):
+    for i in range(3):
+        add_clip(catalog, f"clip_{i}.mp4", 1000.0 + i)
+
+    rows, cursor = catalog.list(limit=3)
+
+    assert len(rows) == 3
+    assert cursor is None
+
+
+def test_equal_start_times_are_ordered_by_filename(catalog):
+    for name in ("b.mp4", "a.mp4", "c.mp4"):
+        add_clip(catalog, name, 1000.0)
+
+    assert all_pages(catalog, limit=2) == [["c.mp4", "b.mp4"], ["a.mp4"]]
+
+
+def test_pages_stay_stable_when_new_clips_arrive(catalog):
+    for i in range(4):
+        add_clip(catalog, f"clip_{i}.mp4", 1000.0 + i)
+
+    first, cursor = catalog.list(limit=2)
+    add_clip(catalog, "newer.mp4", 2000.0)
+    second, _ = catalog.list(limit=2, cursor=cursor)
+
+    assert [row["filename"] for row in first] == ["clip_3.mp4", "clip_2.mp4"]
+    assert [row["filename"] for row in second] == ["clip_1.mp4", "clip_0.mp4"]
+
+
+def test_filters(catalog):
+    add_clip(catalog, "ai_cam1.mp4", 1000.0, device="cam1", trigger="ai")
+    add_clip(catalog, "prox_cam1.mp4", 1001.0, device="cam1", trigger="proximity")
+    add_clip(catalog, "ai_cam2.mp4", 1002.0, device="cam2", trigger="ai")
+
+    def names(**filters):
+        return [row["filename"] for row in catalog.list(**filters)[0]]
+
+    assert names(trigger="ai") == ["ai_cam2.mp4", "ai_cam1.mp4"]
+    assert names(device="cam1") == ["prox_cam1.mp4", "ai_cam1.mp4"]
+    assert names(since=1001.0) == ["ai_cam2.mp4", "prox_cam1.mp4"]
+    assert names(until=1001.0) == ["ai_cam1.mp4"]
+
+
+def test_limit_is_clamped(catalog):
+    add_clip(catalog, "a.mp4", 1000.0)
+
+    rows, _ = catalog.list(limit=0)
+
+    assert len(rows) == 1
+
+
+def test_finish_recording_fills_in_the_row(catalog):
+    catalog.add_recording("a.mp4", "cam", "ai", 1000.0, 640, 480)
+    assert catalog.get("a.mp4")["status"] == "recording"
+
+    catalog.finish_recording("a.mp4", 1012.5, 250, 0, 4096, SUMMARY)
+
+    row = catalog.get("a.mp4")
+    assert row["status"] == "finished"
+    assert row["duration"] == 12.5
+    assert row["frame_count"] == 250
+    assert row["size"] == 4096
+    assert row["detection_frames"] == 10
+
+
+def test_finish_recording_keeps_dropped_frames(catalog):
+    catalog.add_recording("a.mp4", "cam", "ai", 1000.0, 640, 480)
+
+    catalog.finish_recording("a.mp4", 1010.0, 240, 7, 4096, SUMMARY)
+
+    row = catalog.get("a.mp4")
+    assert row["frame_count"] == 240
+    assert row["frames_dropped"] == 7
+
+
+def test_total_size_sums_every_clip(catalog):
+    assert catalog.total_size() == 0
+    add_clip(catalog, "a.mp4", 1000.0, size=1500)
+    add_clip(catalog, "b.mp4", 1001.0, size=2500)
+    catalog.add_recording("c.mp4", "cam", "ai", 1002.0, 640, 480)  # No size until it finishes
+
+    assert catalog.total_size() == 4000
+
+
+def test_older_catalogs_gain_the_new_columns(tmp_path):
+    path = tmp_path / "catalog.sqlite3"
+    with sqlite3.connect(str(path)) as db:
+        db.execute("CREATE TABLE videos (filename TEXT PRIMARY KEY, device TEXT, trigger TEXT, "
+                   "status TEXT NOT NULL DEFAULT 'finished', started_at REAL NOT NULL, ended_at REAL, "
+                   "duration REAL, frame_count INTEGER, size INTEGER, width INTEGER, height INTEGER, "
+                   "max_humans INTEGER DEFAULT 0, max_cats INTEGER DEFAULT 0, detection_frames INTEGER DEFAULT 0)")
+        db.execute("INSERT INTO videos (filename, started_at, size) VALUES ('old.mp4', 1000.0, 10)")
+    db.close()
+
+    catalog = VideoCatalog(path)
+
+    row = catalog.get("old.mp4")
+    assert row["frames_dropped"] == 0
+    assert row["segment"] == 0
+    assert row["compacted_at"] is None
+
+
+def due(catalog, ended_before, now=5000.0, limit=20):
+    return [row["filename"] for row in catalog.compaction_candidates(ended_before, now, 100.0, 3, limit)]
+
+
+def test_compaction_candidates(catalog):
+    add_clip(catalog, "old.mp4", 1000.0)          # Ends at 1010
+    add_clip(catalog, "done.mp4", 1001.0)
+    add_clip(catalog, "recent.mp4", 2000.0)
+    catalog.add_recording("live.mp4", "cam", "ai", 900.0, 640, 480)
+    catalog.update("done.mp4", compacted_at=1500.0)
+
+    assert due(catalog, 1500.0) == ["old.mp4"]
+    assert due(catalog, 1005.0) == []
+    assert due(catalog, 3000.0, limit=1) == ["old.mp4"]
+
+
+def test_failed_compaction_is_retried_with_backoff(catalog):
+    add_clip(catalog, "a.mp4", 1000.0)
+
+    assert catalog.compaction_failed("a.mp4", 4000.0) == 1
+    assert due(catalog, 3000.0, now=4099.0) == []
+    assert due(catalog, 3000.0, now=4100.0) == ["a.mp4"]
+
+    assert catalog.compaction_failed("a.mp4", 4100.0) == 2
+    assert due(catalog, 3000.0, now=4299.0) == []  # Twice the delay after the second failure
+    assert due(catalog, 3000.0, now=4300.0) == ["a.mp4"]
+
+    assert catalog.compaction_failed("a.mp4", 4300.0) == 3
+    assert due(catalog, 3000.0, now=10 ** 9) == []  # Out of attempts
+    assert catalog.get("a.mp4")["compacted_at"] is None
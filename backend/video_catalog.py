@@ -0,0 +1,306 @@
+"""
+Persistent Catalog of Recorded Videos (SQLite)
+- One row per clip: camera, trigger (ai / proximity), start/end time,
+  duration, frames written/dropped, size and a detection summary
+- Long interactions are split into segments; event_id + segment link the
+  files of one interaction
+- Updated by start_recording / stop_recording / deletions, so /videos and
+  the retention worker never scan or stat the videos directory
+- compacted_at marks clips the compaction worker has re-encoded (or skipped);
+  failed attempts are counted separately and retried with a backoff
+- reconcile() syncs with the directory once at startup (files added or
+  removed while the server was down, clips interrupted by a crash)
+"""
+
+import base64
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+import cv2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    filename TEXT PRIMARY KEY,
+    event_id TEXT,
+    segment INTEGER DEFAULT 0,
+    device TEXT,
+    trigger TEXT,
+    status TEXT NOT NULL DEFAULT 'finished',
+    started_at REAL NOT NULL,
+    ended_at REAL,
+    duration REAL,
+    frame_count INTEGER,
+    frames_dropped INTEGER DEFAULT 0,
+    size INTEGER,
+    width INTEGER,
+    height INTEGER,
+    max_humans INTEGER DEFAULT 0,
+    max_cats INTEGER DEFAULT 0,
+    detection_frames INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS videos_started ON videos (started_at DESC, filename DESC);
+CREATE INDEX IF NOT EXISTS videos_trigger ON videos (trigger, started_at DESC);
+CREATE INDEX IF NOT EXISTS videos_device ON videos (device, started_at DESC);
+"""
+
+# Columns added after the first release: (name, definition) - added to older catalogs on open
+MIGRATIONS = [
+    ("frames_dropped", "INTEGER DEFAULT 0"),
+    ("event_id", "TEXT"),
+    ("segment", "INTEGER DEFAULT 0"),
+    ("preroll_frames", "INTEGER DEFAULT 0"),
+    ("compacted_at", "REAL"),
+    ("compaction_attempts", "INTEGER DEFAULT 0"),
+    ("compaction_failed_at", "REAL")
+]
+
+MAX_PAGE_SIZE = 200
+VIDEO_PATTERNS = ("*.mp4", "*.avi")  # mp4v / H.264 clips and passthrough MJPEG clips
+
+
+def encode_cursor(row):
+    """Opaque cursor for the page after row (position in started_at DESC, filename DESC order)"""
+    raw = json.dumps([row["started_at"], row["filename"]]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(cursor):
+    started_at, filename = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    return float(started_at), str(filename)
+
+
+class VideoCatalog:
+    """Thread-safe SQLite catalog (one shared connection, serialised by a lock)"""
+
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        with self.lock, self.db:
+            self.db.execute("PRAGMA journal_mode=WAL")
+            self.db.execute("PRAGMA synchronous=NORMAL")
+            self.db.executescript(SCHEMA)
+            columns = {row["name"] for row in self.db.execute("PRAGMA table_info(videos)")}
+            for name, definition in MIGRATIONS:
+                if name not in columns:
+                    self.db.execute(f"ALTER TABLE videos ADD COLUMN {name} {definition}")
+            self.db.execute("CREATE INDEX IF NOT EXISTS videos_event ON videos (event_id, segment)")
+
+    def add_recording(self, filename, device, trigger, started_at, width, height, event_id=None, segment=0):
+        """Register a clip (or one segment of an event) when recording starts (status 'recording')"""
+        with self.lock, self.db:
+            self.db.execute(
+                "INSERT OR REPLACE INTO videos (filename, event_id, segment, device, trigger, status, "
+                "started_at, width, height) VALUES (?, ?, ?, ?, ?, 'recording', ?, ?, ?)",
+                (filename, event_id, segment, device, trigger, started_at, width, height)
+            )
+
+    def finish_recording(self, filename, ended_at, frame_count, frames_dropped, size, summary, preroll_frames=0):
+        """Fill in duration, frame counts, size and detection summary when recording stops"""
+        with self.lock, self.db:
+            self.db.execute(
+                "UPDATE videos SET status = 'finished', ended_at = ?, duration = ROUND(? - started_at, 2), "
+                "frame_count = ?, frames_dropped = ?, preroll_frames = ?, size = ?, max_humans = ?, "
+                "max_cats = ?, detection_frames = ? WHERE filename = ?",
+                (ended_at, ended_at, frame_count, frames_dropped, preroll_frames, size,
+                 summary["max_humans"], summary["max_cats"], summary["detection_frames"], filename)
+            )
+
+    def update(self, filename, **fields):
+        """Set arbitrary columns on one clip"""
+        if not fields:
+            return
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self.lock, self.db:
+            self.db.execute(f"UPDATE videos SET {columns} WHERE filename = ?", (*fields.values(), filename))
+
+    def rename(self, filename, new_filename, size):
+        """Point a clip's row at a replacement file (e.g. after transcoding)"""
+        with self.lock, self.db:
+            self.db.execute(
+                "UPDATE videos SET filename = ?, size = ? WHERE filename = ?", (new_filename, size, filename)
+            )
+
+    def remove(self, filename):
+        with self.lock, self.db:
+            self.db.execute("DELETE FROM videos WHERE filename = ?", (filename,))
+
+    def get(self, filename):
+        with self.lock:
+            row = self.db.execute("SELECT * FROM videos WHERE filename = ?", (filename,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, limit=50, cursor=None, trigger=None, device=None, since=None, until=None, event_id=None):
+        """
+        One page of clips, newest first. Returns (rows, next_cursor or None).
+        Uses keyset pagination on (started_at, filename), so pages stay stable
+        while new clips are added.
+        """
+        limit = max(1, min(MAX_PAGE_SIZE, int(limit)))
+        where = []
+        params = []
+        if cursor:
+            started_at, filename = decode_cursor(cursor)
+            where.append("(started_at < ? OR (started_at = ? AND filename < ?))")
+            params += [started_at, started_at, filename]
+        if trigger:
+            where.append("trigger = ?")
+            params.append(trigger)
+        if device:
+            where.append("device = ?")
+            params.append(device)
+        if event_id:
+            where.append("event_id = ?")
+            params.append(event_id)
+        if since is not None:
+            where.append("started_at >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("started_at < ?")
+            params.append(until)
+
+        query = "SELECT * FROM videos"
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY started_at DESC, filename DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.lock:
+            rows = [dict(row) for row in self.db.execute(query, params)]
+
+        next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    def count(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM videos").fetchone()[0]
+
+    def total_size(self):
+        with self.lock:
+            return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM videos").fetchone()[0]
+
+    def retention_candidates(self, max_bytes=None, max_age_seconds=None, keep=None, now=None):
+        """
+        Finished clips to delete, oldest first: older than max_age_seconds, beyond
+        the newest `keep`, or while the catalog total is above max_bytes. Clips
+        still recording are never returned (their size is not final yet).
+        """
+        with self.lock:
+            total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM videos").fetchone()[0]
+            rows = self.db.execute(
+                "SELECT filename, size, started_at FROM videos WHERE status = 'finished' "
+                "ORDER BY started_at, filename"
+            ).fetchall()
+
+        oldest_allowed = (now - max_age_seconds) if max_age_seconds is not None and now is not None else None
+        candidates = []
+        for index, row in enumerate(rows):
+            expired = oldest_allowed is not None and row["started_at"] < oldest_allowed
+            over_count = keep is not None and len(rows) - index > keep
+            over_quota = max_bytes is not None and total > max_bytes
+            if not (expired or over_count or over_quota):
+                break  # Everything newer is within all limits too
+            candidates.append(row["filename"])
+            total -= row["size"] or 0
+        return candidates
+
+    def compaction_candidates(self, ended_before, now, retry_seconds, max_attempts, limit=20):
+        """
+        Finished clips not compacted yet that ended before the given time, oldest
+        first. A clip whose compaction failed is due again retry_seconds after the
+        failure (doubling with each further failure) until max_attempts.
+        """
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT * FROM videos WHERE status = 'finished' AND compacted_at IS NULL "
+                "AND COALESCE(ended_at, started_at) < ? AND COALESCE(compaction_attempts, 0) < ? "
+                "AND (compaction_failed_at IS NULL "
+                "OR compaction_failed_at + ? * (1 << (compaction_attempts - 1)) <= ?) "
+                "ORDER BY started_at, filename LIMIT ?", (ended_before, max_attempts, retry_seconds, now, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def compaction_failed(self, filename, failed_at):
+        """Record a failed compaction attempt; returns the number of attempts so far"""
+        with self.lock, self.db:
+            self.db.execute(
+                "UPDATE videos SET compaction_attempts = COALESCE(compaction_attempts, 0) + 1, "
+                "compaction_failed_at = ? WHERE filename = ?", (failed_at, filename)
+            )
+            row = self.db.execute(
+                "SELECT compaction_attempts FROM videos WHERE filename = ?", (filename,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def reconcile(self, videos_dir):
+        """
+        Sync with the directory: add untracked .mp4/.avi files, drop rows whose
+        file is gone, settle clips left recording. Returns (added, removed, recovered).
+        """
+        videos_dir = Path(videos_dir)
+        on_disk = {path.name: path for pattern in VIDEO_PATTERNS for path in videos_dir.glob(pattern)}
+        with self.lock:
+            known = {row["filename"] for row in self.db.execute("SELECT filename FROM videos")}
+
+        added = 0
+        for filename in sorted(set(on_disk) - known):
+            path = on_disk[filename]
+            stat = path.stat()
+            frame_count, duration, width, height = probe_video(path)
+            with self.lock, self.db:
+                self.db.execute(
+                    "INSERT OR IGNORE INTO videos (filename, status, started_at, ended_at, duration, "
+                    "frame_count, size, width, height) VALUES (?, 'finished', ?, ?, ?, ?, ?, ?, ?)",
+                    (filename, stat.st_ctime, stat.st_ctime + (duration or 0), duration,
+                     frame_count, stat.st_size, width, height)
+                )
+            added += 1
+
+        missing = known - set(on_disk)
+        with self.lock, self.db:
+            self.db.executemany("DELETE FROM videos WHERE filename = ?", [(name,) for name in missing])
+            interrupted = [row["filename"] for row in self.db.execute(
+                "SELECT filename FROM videos WHERE status = 'recording'"
+            )]
+
+        # Clips left 'recording' by a crash: keep them if they play, with real size/length;
+        # files whose writer never finished the header (mp4v without moov, AVI without
+        # its patched header) cannot be read and are deleted
+        recovered = 0
+        for filename in interrupted:
+            path = on_disk[filename]
+            stat = path.stat()
+            frame_count, duration, width, height = probe_video(path)
+            with self.lock, self.db:
+                if not frame_count:
+                    self.db.execute("DELETE FROM videos WHERE filename = ?", (filename,))
+                    path.unlink(missing_ok=True)
+                    missing.add(filename)
+                    continue
+                self.db.execute(
+                    "UPDATE videos SET status = 'finished', ended_at = ?, "
+                    "duration = COALESCE(?, ROUND(? - started_at, 2)), frame_count = ?, size = ?, "
+                    "width = COALESCE(width, ?), height = COALESCE(height, ?) WHERE filename = ?",
+                    (stat.st_mtime, duration, stat.st_mtime, frame_count, stat.st_size, width, height, filename)
+                )
+            recovered += 1
+        return added, len(missing), recovered
+
+
+def probe_video(path):
+    """(frame_count, duration seconds, width, height) from the container header"""
+    capture = cv2.VideoCapture(str(path))
+    try:
+        if not capture.isOpened():
+            return None, None, None, None
+        frame_count = int(capture.get(cv2.CAP_PROP_FRAME_COUNT)) or None
+        fps = capture.get(cv2.CAP_PROP_FPS)
+        duration = round(frame_count / fps, 2) if frame_count and fps else None
+        width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)) or None
+        height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) or None
+        return frame_count, duration, width, height
+    finally:
+        capture.release()
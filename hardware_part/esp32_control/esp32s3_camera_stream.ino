@@ -281,7 +281,10 @@ void sendFrameToMac() {
   
   http.begin(url);
   http.addHeader("Content-Type", "image/jpeg");
-  http.addHeader("X-Device", "ESP32-S3");
+  // Unique per board so the backend keeps a separate stream/recorder for each camera
+  String deviceId = "ESP32-S3-" + WiFi.macAddress();
+  deviceId.replace(":", "");
+  http.addHeader("X-Device", deviceId);
   http.setTimeout(3000);
   
   int httpCode = http.POST(fb->buf, fb->len);
@@ -32,8 +32,12 @@ class NetworkManager: ObservableObject {
     }
     
     // MARK: - Fetch Live Stream Frame
+    // ETag of the last frame received; the server answers 304 while it is still current
+    private var lastFrameETag: String?
+    
     func fetchLiveFrame(completion: @escaping (UIImage?) -> Void) {
-        guard let url = URL(string: "\(baseURL)/stream/live") else {
+        // Raw JPEG with detections/state in headers (no base64 JSON)
+        guard let url = URL(string: "\(baseURL)/stream/frame") else {
             completion(nil)
             return
         }
@@ -41,72 +45,75 @@ class NetworkManager: ObservableObject {
         var request = URLRequest(url: url)
         request.httpMethod = "GET"
         request.timeoutInterval = 2
+        request.cachePolicy = .reloadIgnoringLocalCacheData
+        if let etag = lastFrameETag {
+            request.setValue(etag, forHTTPHeaderField: "If-None-Match")
+        }
         
         URLSession.shared.dataTask(with: request) { [weak self] data, response, error in
-            guard let self = self, let data = data, error == nil else {
+            guard let self = self, error == nil,
+                  let httpResponse = response as? HTTPURLResponse else {
                 DispatchQueue.main.async {
                     completion(nil)
                 }
                 return
             }
             
-            do {
-                let decoder = JSONDecoder()
-                let streamResponse = try decoder.decode(StreamResponse.self, from: data)
-                
-                // Decode base64 image
-                if let imageData = Data(base64Encoded: streamResponse.frame) {
-                    let image = UIImage(data: imageData)
-                    
-                    DispatchQueue.main.async {
-                        self.detections = streamResponse.detections
-                        self.isRecording = streamResponse.isRecording
-                        self.currentVideo = streamResponse.currentVideo
-                        
-                        // Handle proximity alert
-                        let wasAlert = self.proximityAlert
-                        self.proximityAlert = streamResponse.proximityAlert ?? false
-                        self.beaconDistance = streamResponse.beaconDistance ?? 999.0
-                        
-                        // Trigger notification if alert just activated
-                        if self.proximityAlert && !wasAlert {
-                            self.sendProximityNotification()
-                        }
-                        
-                        completion(image)
-                    }
-                } else {
+            // 304: frame unchanged since last poll, keep showing the current image
+            // (the state headers still come with it: recording/proximity change on their own)
+            guard httpResponse.statusCode == 200 || httpResponse.statusCode == 304 else {
+                DispatchQueue.main.async {
+                    completion(nil)
+                }
+                return
+            }
+            let image: UIImage?
+            if httpResponse.statusCode == 200 {
+                guard let data = data, let decoded = UIImage(data: data) else {
                     DispatchQueue.main.async {
                         completion(nil)
                     }
+                    return
                 }
-            } catch {
-                print("Decoding error: \(error)")
-                DispatchQueue.main.async {
-                    completion(nil)
+                image = decoded
+            } else {
+                image = nil
+            }
+            
+            let etag = httpResponse.value(forHTTPHeaderField: "ETag")
+            var detections: [Detection] = []
+            if let detectionsHeader = httpResponse.value(forHTTPHeaderField: "X-Detections"),
+               let detectionsData = detectionsHeader.data(using: .utf8) {
+                detections = (try? JSONDecoder().decode([Detection].self, from: detectionsData)) ?? []
+            }
+            let isRecording = httpResponse.value(forHTTPHeaderField: "X-Recording") == "1"
+            let currentVideo = httpResponse.value(forHTTPHeaderField: "X-Current-Video")
+            let proximityAlert = httpResponse.value(forHTTPHeaderField: "X-Proximity-Alert") == "1"
+            let beaconDistance = Double(httpResponse.value(forHTTPHeaderField: "X-Beacon-Distance") ?? "") ?? 999.0
+            
+            DispatchQueue.main.async {
+                if image != nil {
+                    self.lastFrameETag = etag
+                }
+                self.detections = detections
+                self.isRecording = isRecording
+                self.currentVideo = currentVideo
+                
+                // Handle proximity alert
+                let wasAlert = self.proximityAlert
+                self.proximityAlert = proximityAlert
+                self.beaconDistance = beaconDistance
+                
+                // Trigger notification if alert just activated
+                if self.proximityAlert && !wasAlert {
+                    self.sendProximityNotification()
                 }
+                
+                completion(image)
             }
         }.resume()
     }
     
-    struct StreamResponse: Codable {
-        let frame: String
-        let detections: [Detection]
-        let isRecording: Bool
-        let currentVideo: String?
-        let proximityAlert: Bool?
-        let beaconDistance: Double?
-        let timestamp: String
-        
-        enum CodingKeys: String, CodingKey {
-            case frame, detections, timestamp
-            case isRecording = "is_recording"
-            case currentVideo = "current_video"
-            case proximityAlert = "proximity_alert"
-            case beaconDistance = "beacon_distance"
-        }
-    }
-    
     // MARK: - Detection Models
     struct Detection: Codable, Identifiable {
         let id = UUID()
@@ -348,6 +355,11 @@ class NetworkManager: ObservableObject {
         return URL(string: "\(baseURL)/videos/\(filename)")
     }
     
+    // MARK: - Get Thumbnail URL (poster JPEG rendered by the backend)
+    func getThumbnailURL(filename: String) -> URL? {
+        return URL(string: "\(baseURL)/videos/\(filename)/thumb")
+    }
+    
     // MARK: - Proximity Notification
     func sendProximityNotification() {
         let content = UNMutableNotificationContent()
@@ -52,7 +52,7 @@ struct VideosView: View {
                     // Video list
                     List {
                         ForEach(networkManager.videos) { video in
-                            VideoRow(video: video)
+                            VideoRow(video: video, thumbnailURL: networkManager.getThumbnailURL(filename: video.filename))
                                 .contentShape(Rectangle())
                                 .onTapGesture {
                                     playVideo(video)
@@ -139,15 +139,26 @@ struct VideosView: View {
 // MARK: - Video Row
 struct VideoRow: View {
     let video: NetworkManager.VideoInfo
+    let thumbnailURL: URL?
     
     var body: some View {
         HStack(spacing: 15) {
-            // Thumbnail
+            // Thumbnail (poster JPEG, a few KB instead of the whole clip)
             ZStack {
                 RoundedRectangle(cornerRadius: 8)
                     .fill(Color.gray.opacity(0.2))
                     .frame(width: 80, height: 60)
                 
+                AsyncImage(url: thumbnailURL) { image in
+                    image
+                        .resizable()
+                        .aspectRatio(contentMode: .fill)
+                } placeholder: {
+                    Color.clear
+                }
+                .frame(width: 80, height: 60)
+                .clipShape(RoundedRectangle(cornerRadius: 8))
+                
                 Image(systemName: "play.circle.fill")
                     .font(.system(size: 30))
                     .foregroundColor(.white)
@@ -180,6 +191,7 @@ struct VideoRow: View {
         return filename
             .replacingOccurrences(of: "interaction_", with: "")
             .replacingOccurrences(of: ".mp4", with: "")
+            .replacingOccurrences(of: ".avi", with: "")
             .replacingOccurrences(of: "_", with: " ")
     }
     